@@ -0,0 +1,201 @@
+"""
+ARMAZENAMENTO TIPADO - DATASETS GERADOS
+
+Camada de armazenamento colunar (Arrow/Parquet) para os datasets trocados entre os coletores e a análise.
+Cada dataset tem um esquema explícito: categorias para colunas repetitivas (`origem`, `destino`, `Estado`),
+float32 onde a precisão declarada permite (validado na gravação, com volta automática para float64) e
+inteiros estreitos. A leitura usa memory map e pode selecionar colunas; o CSV continua disponível como
+exportação opcional e como fallback de leitura quando não há Parquet.
+
+Autor: Lucas Abreu - lucasabreuzip
+GitBuh: https://github.com/lucasabreuzip
+Linkedin: https://www.linkedin.com/in/lucasabreuzip/
+Versão: 2.0
+Data: 09/2025
+"""
+
+import os
+from typing import Dict, Iterable, List, Optional
+
+import numpy as np
+import pandas as pd
+
+DATASETS_DIR = "datasets_gerados"
+EXPORTAR_CSV = os.getenv("EXPORTAR_CSV", "1") != "0"
+
+# Tipo de cada coluna: 'categoria', 'int32', 'int64', 'float64' ou ('float32', casas decimais).
+# Colunas terminadas em '*' valem como prefixo (ex.: Distancia_<Cidade>); colunas fora do esquema mantêm o tipo.
+COLUNAS_CUSTOS = {
+    'populacao': 'float64', 'pib_total': 'float64', 'pib_per_capita': 'float64',
+    'mercado_potencial_anual': 'float64', 'densidade_demografica': 'float64',
+    'servicos': 'float64', 'agropecuaria': 'float64',
+    'renda_mensal': ('float32', 2), 'ipca_regional': ('float32', 2), 'custo_construcao': ('float32', 2),
+    'preco_venda': ('float32', 2), 'area_territorial': ('float32', 2),
+    'industria': ('float32', 0), 'emprego_formal': ('float32', 0),
+    'latitude': ('float32', 4), 'longitude': ('float32', 4),
+    'codigo_municipio': 'int32', 'codigo_estado': 'int32', 'regiao_metropolitana': 'int32',
+}
+
+ESQUEMAS: Dict[str, Dict] = {
+    'custos': {
+        'arquivo': 'dataset_custos_imobiliario',
+        'encoding_csv': 'utf-8-sig',
+        'colunas': COLUNAS_CUSTOS,
+    },
+    # Triagem em lote (registro de candidatos): dataset próprio, nunca lido pela análise
+    'custos_lotes': {
+        'arquivo': 'dataset_custos_lotes',
+        'encoding_csv': 'utf-8-sig',
+        'colunas': COLUNAS_CUSTOS,
+    },
+    'demografia': {
+        'arquivo': 'dataset_demografica_vizinhos_recife_salvador',
+        'encoding_csv': 'utf-8-sig',
+        'colunas': {
+            'Estado': 'categoria', 'Codigo_IBGE': 'int32', 'Populacao': 'int64',
+            'PIB_Per_Capita': 'float64', 'Renda_Mensal': 'float64', 'Consumo_Bilhoes': 'float64',
+            'Score_Atratividade': 'float64', 'Distancia_*': 'float64',
+        },
+    },
+    'rotas': {
+        'arquivo': 'dataset_rotas_nordeste',
+        'encoding_csv': 'utf-8',
+        'colunas': {
+            'origem': 'categoria', 'destino': 'categoria',
+            'distancia_km': ('float32', 2), 'tempo_horas': ('float32', 2), 'velocidade_media_kmh': ('float32', 2),
+            'custo_combustivel': ('float32', 2), 'custo_pedagio': ('float32', 2), 'custo_total_estimado': ('float32', 2),
+        },
+    },
+}
+
+def _tipo_coluna(esquema: Dict, coluna: str):
+    colunas = esquema['colunas']
+    if coluna in colunas:
+        return colunas[coluna]
+    for padrao, tipo in colunas.items():
+        if padrao.endswith('*') and coluna.startswith(padrao[:-1]):
+            return tipo
+    return None
+
+def arquivo_parquet(nome: str, diretorio: str = DATASETS_DIR) -> str:
+    return os.path.join(diretorio, ESQUEMAS[nome]['arquivo'] + '.parquet')
+
+def arquivo_csv(nome: str, diretorio: str = DATASETS_DIR) -> str:
+    return os.path.join(diretorio, ESQUEMAS[nome]['arquivo'] + '.csv')
+
+#float32 só quando o valor volta idêntico após arredondar às casas declaradas (senão mantém float64)
+def _cabe_em_float32(valores: pd.Series, casas: int) -> bool:
+    originais = valores.to_numpy(dtype='float64', na_value=np.nan)
+    reduzidos = np.round(originais.astype('float32').astype('float64'), casas)
+    return bool(np.array_equal(reduzidos, originais, equal_nan=True))
+
+#Inteiro só quando todos os valores são inteiros e cabem no tipo (senão mantém float64, sem truncar)
+def _cabe_em_inteiro(valores: pd.Series, tipo: str) -> bool:
+    if not pd.api.types.is_numeric_dtype(valores) or valores.isna().any():
+        return False
+    if valores.empty:
+        return True
+    limites = np.iinfo(tipo)
+    return bool((valores == valores.round()).all() and valores.min() >= limites.min and valores.max() <= limites.max)
+
+#Códigos gravados como texto ('2901') viram números, como na releitura do CSV; texto não numérico fica como está
+def _numerico(valores: pd.Series) -> pd.Series:
+    if pd.api.types.is_numeric_dtype(valores):
+        return valores
+    convertidos = pd.to_numeric(valores, errors='coerce')
+    return convertidos if convertidos.notna().sum() == valores.notna().sum() else valores
+
+#Converte o DataFrame para os tipos de armazenamento do esquema
+def aplicar_esquema(nome: str, df: pd.DataFrame) -> pd.DataFrame:
+    esquema = ESQUEMAS[nome]
+    convertidas = {}
+    for coluna in df.columns:
+        tipo = _tipo_coluna(esquema, coluna)
+        serie = _numerico(df[coluna]) if tipo in ('int32', 'int64') else df[coluna]
+        if tipo == 'categoria':
+            convertidas[coluna] = serie.astype('category')
+        elif tipo in ('int32', 'int64') and _cabe_em_inteiro(serie, tipo):
+            convertidas[coluna] = serie.astype(tipo)
+        elif tipo in ('int32', 'int64') and pd.api.types.is_numeric_dtype(serie):
+            convertidas[coluna] = serie.astype('float64')
+        elif tipo == 'float64':
+            convertidas[coluna] = serie.astype('float64')
+        elif isinstance(tipo, tuple):
+            convertidas[coluna] = serie.astype('float32' if _cabe_em_float32(serie, tipo[1]) else 'float64')
+        else:
+            convertidas[coluna] = serie
+    return pd.DataFrame(convertidas, index=df.index)
+
+#Tipos de cálculo: float32 volta a float64 arredondado às casas declaradas (idêntico ao valor do CSV)
+#e inteiros estreitos voltam a int64; categorias são mantidas
+def tipos_calculo(nome: str, df: pd.DataFrame) -> pd.DataFrame:
+    esquema = ESQUEMAS[nome]
+    df = df.copy()
+    for coluna in df.columns:
+        tipo = _tipo_coluna(esquema, coluna)
+        if isinstance(tipo, tuple) and df[coluna].dtype == 'float32':
+            df[coluna] = np.round(df[coluna].to_numpy(dtype='float64'), tipo[1])
+        elif tipo == 'int32' and df[coluna].dtype == 'int32':
+            df[coluna] = df[coluna].astype('int64')
+    return df
+
+def gravar_dataset(nome: str, df: pd.DataFrame, diretorio: str = DATASETS_DIR,
+                   exportar_csv: Optional[bool] = None) -> str:
+    """Grava o dataset em Parquet tipado (escrita atômica) e, opcionalmente, exporta o CSV. Retorna o Parquet."""
+    os.makedirs(diretorio, exist_ok=True)
+    arquivo = arquivo_parquet(nome, diretorio)
+    temporario = arquivo + ".tmp"
+    aplicar_esquema(nome, df).to_parquet(temporario, index=False, engine='pyarrow')
+    os.replace(temporario, arquivo)
+
+    if EXPORTAR_CSV if exportar_csv is None else exportar_csv:
+        df.to_csv(arquivo_csv(nome, diretorio), index=False, encoding=ESQUEMAS[nome]['encoding_csv'])
+    return arquivo
+
+#Arquivo lido no diretório: sempre o Parquet quando existe; o CSV é só exportação e fallback
+#(CSV editado à mão só vale depois de reconvertido com `python armazenamento_datasets.py`)
+def localizar_dataset(nome: str, diretorios: Iterable[str] = ('.', DATASETS_DIR)) -> Optional[str]:
+    for diretorio in diretorios:
+        parquet, csv = arquivo_parquet(nome, diretorio), arquivo_csv(nome, diretorio)
+        if os.path.exists(parquet):
+            return parquet
+        if os.path.exists(csv):
+            return csv
+    return None
+
+def carregar_dataset(nome: str, diretorios: Iterable[str] = ('.', DATASETS_DIR), colunas: Optional[List[str]] = None,
+                     calculo: bool = False) -> Optional[pd.DataFrame]:
+    """Lê o dataset (Parquet com memory map, ou CSV como fallback) já nos tipos do esquema.
+
+    Com `calculo=True` devolve os tipos de cálculo (float64/int64), numericamente idênticos à leitura do CSV.
+    Retorna None quando o dataset não existe em nenhum dos diretórios.
+    """
+    arquivo = localizar_dataset(nome, diretorios)
+    if arquivo is None:
+        return None
+    if arquivo.endswith('.parquet'):
+        import pyarrow.parquet as pq
+        df = pq.read_table(arquivo, columns=colunas, memory_map=True).to_pandas()
+    else:
+        df = aplicar_esquema(nome, pd.read_csv(arquivo, usecols=colunas))
+    return tipos_calculo(nome, df) if calculo else df
+
+#Converte os CSVs existentes em Parquet tipado (sem reescrever os CSVs)
+def converter_csvs(diretorio: str = DATASETS_DIR) -> Dict[str, str]:
+    convertidos = {}
+    for nome in ESQUEMAS:
+        csv = arquivo_csv(nome, diretorio)
+        if os.path.exists(csv):
+            convertidos[nome] = gravar_dataset(nome, pd.read_csv(csv), diretorio, exportar_csv=False)
+    return convertidos
+
+
+if __name__ == "__main__":
+    print("=" * 80)
+    print("🗄️ Conversão dos datasets CSV para Parquet tipado")
+    print("=" * 80)
+    for nome, arquivo in converter_csvs().items():
+        tamanho_csv = os.path.getsize(arquivo_csv(nome)) / 1024
+        tamanho_parquet = os.path.getsize(arquivo) / 1024
+        memoria = carregar_dataset(nome, (DATASETS_DIR,)).memory_usage(deep=True).sum() / 1024
+        print(f"   ✓ {nome}: {arquivo} | CSV {tamanho_csv:.1f} KB → Parquet {tamanho_parquet:.1f} KB | memória {memoria:.1f} KB")
@@ -0,0 +1,195 @@
+"""
+BENCHMARK DA ANÁLISE - DADOS SINTÉTICOS EM ESCALA
+
+Gera datasets sintéticos coerentes (custos, demografia e rotas derivados das mesmas coordenadas) em múltiplos da
+base atual (2 cidades, 16 rotas, 13 estados) e mede cada etapa da análise completa: carga e validação, features,
+custos, logística, mercado, ensemble, consolidação, otimização e decisão. Registra, pelo perfil por etapa do
+analisador (PerfilEtapas), tempo de parede, CPU e pico de memória (tracemalloc) e a variação em relação à última
+medição da mesma escala, acumulando os resultados em `resultados_benchmark/analise.jsonl`.
+
+Autor: Lucas Abreu - lucasabreuzip
+GitBuh: https://github.com/lucasabreuzip
+Linkedin: https://www.linkedin.com/in/lucasabreuzip/
+Versão: 2.0
+Data: 09/2025
+"""
+
+import io
+import os
+import sys
+import json
+import time
+import argparse
+import tempfile
+import contextlib
+from datetime import datetime
+
+import numpy as np
+import pandas as pd
+
+import ia_analise as ia
+from armazenamento_datasets import arquivo_parquet, gravar_dataset, localizar_dataset
+
+RESULTADOS_DIR = "resultados_benchmark"
+ESCALAS = [10, 100, 1000, 10000]
+BASE = {'cidades': 2, 'rotas_por_cidade': 8, 'pontos_demanda': 13}
+MAX_CANDIDATOS = 50  # candidatos avaliados por padrão; as demais cidades entram só como origens/destinos
+FATOR_RODOVIARIO = 1.25  # distância rodoviária / distância em linha reta
+
+#Distância em km (haversine) entre arrays de coordenadas, com broadcasting
+def _distancia_km(lat1, lon1, lat2, lon2):
+    lat1, lon1, lat2, lon2 = map(np.radians, (lat1, lon1, lat2, lon2))
+    a = np.sin((lat2 - lat1) / 2) ** 2 + np.cos(lat1) * np.cos(lat2) * np.sin((lon2 - lon1) / 2) ** 2
+    return 6371 * 2 * np.arcsin(np.sqrt(a)) * FATOR_RODOVIARIO
+
+#Cidades e pontos de demanda sorteados no Nordeste; distâncias, rotas e mercado derivados das coordenadas
+def gerar_datasets(escala: int, diretorio: str, n_candidatos: int, semente: int = 42, formato: str = 'parquet'):
+    rng = np.random.default_rng(semente)
+    n_cidades = BASE['cidades'] * escala
+    n_pontos = BASE['pontos_demanda'] * escala
+    ufs = list(ia.ESTADO_POR_UF)
+    estados = list(ia.ESTADO_POR_UF.values())
+
+    # Custos: uma linha por cidade
+    nomes = [f"Cidade{i:05d}" for i in range(n_cidades)]
+    lat, lon = rng.uniform(-18, -2, n_cidades), rng.uniform(-48, -34, n_cidades)
+    populacao = np.round(rng.lognormal(13, 1.2, n_cidades))
+    pib_per_capita = rng.uniform(12000, 60000, n_cidades)
+    renda = np.round(rng.uniform(1500, 4000, n_cidades), 2)
+    area = np.round(rng.uniform(50, 8000, n_cidades), 2)
+    custos = pd.DataFrame({
+        'populacao': populacao, 'pib_total': populacao * pib_per_capita, 'renda_mensal': renda,
+        'ipca_regional': np.round(rng.uniform(2, 6, n_cidades), 2),
+        'custo_construcao': np.round(rng.uniform(1400, 2200, n_cidades), 2),
+        'preco_venda': np.round(rng.uniform(3, 8, n_cidades), 2), 'area_territorial': area,
+        'pib_per_capita': pib_per_capita, 'mercado_potencial_anual': populacao * renda * 12 * 0.7,
+        'densidade_demografica': populacao / area, 'cidade': nomes, 'uf': rng.choice(ufs, n_cidades),
+        'latitude': np.round(lat, 4), 'longitude': np.round(lon, 4),
+    })
+
+    # Demografia: pontos de demanda (estados/municípios) com distância a cada candidato
+    candidatos = nomes[:n_candidatos]
+    lat_p, lon_p = rng.uniform(-18, -2, n_pontos), rng.uniform(-48, -34, n_pontos)
+    pop_p = np.round(rng.lognormal(12, 1.5, n_pontos)).astype(np.int64)
+    renda_p = rng.uniform(1200, 3500, n_pontos)
+    demografia = pd.DataFrame({
+        'Estado': rng.choice(estados, n_pontos), 'Codigo_IBGE': np.arange(n_pontos) + 1, 'Populacao': pop_p,
+        'PIB_Per_Capita': rng.uniform(10000, 50000, n_pontos), 'Renda_Mensal': renda_p,
+        'Consumo_Bilhoes': pop_p * renda_p * 12 / 1e9, 'Score_Atratividade': rng.uniform(40, 90, n_pontos),
+    })
+    distancias = _distancia_km(lat_p[:, None], lon_p[:, None], lat[None, :n_candidatos], lon[None, :n_candidatos])
+    demografia = demografia.join(pd.DataFrame(np.round(distancias).astype(np.int64),
+                                              columns=[f'Distancia_{c}' for c in candidatos]))
+
+    # Rotas: destinos sorteados entre as demais cidades
+    origem = np.repeat(np.arange(n_cidades), BASE['rotas_por_cidade'])
+    destino = (origem + rng.integers(1, n_cidades, len(origem))) % n_cidades
+    distancia = np.round(_distancia_km(lat[origem], lon[origem], lat[destino], lon[destino]), 2)
+    velocidade = np.round(rng.uniform(60, 85, len(origem)), 2)
+    combustivel, pedagio = np.round(distancia * 0.4583, 2), np.round(distancia * 0.15, 2)
+    rotas = pd.DataFrame({
+        'origem': np.array(nomes)[origem], 'destino': np.array(nomes)[destino], 'distancia_km': distancia,
+        'tempo_horas': np.round(distancia / velocidade, 2), 'velocidade_media_kmh': velocidade,
+        'custo_combustivel': combustivel, 'custo_pedagio': pedagio, 'custo_total_estimado': np.round(combustivel + pedagio, 2),
+    })
+
+    datasets = {'custos': custos, 'demografia': demografia, 'rotas': rotas}
+    # Só o formato medido fica no diretório, e a análise precisa de fato lê-lo
+    for nome, df in datasets.items():
+        gravar_dataset(nome, df, diretorio, exportar_csv=(formato == 'csv'))
+        if formato == 'csv':
+            os.remove(arquivo_parquet(nome, diretorio))
+        lido = localizar_dataset(nome, (diretorio,))
+        assert lido.endswith('.' + formato), f"{nome}: benchmark em {formato} leria {lido}"
+    return candidatos, {nome: len(df) for nome, df in datasets.items()}
+
+#Uma execução da análise completa sobre o diretório sintético, medida pelo perfil por etapa do analisador
+def _executar(diretorio, candidatos, medir_memoria: bool):
+    analisador = ia.AnalisadorMagalu(candidatos=candidatos, cache_modelos=None, cache_etapas=None,
+                                     medir_memoria=medir_memoria)
+    with contextlib.redirect_stdout(io.StringIO()):
+        # carga inclui a validação de sanidade, que já monta o feature store
+        with analisador.perf.medir('carga'):
+            datasets = analisador.carregar_e_validar_datasets((diretorio,))
+        saidas = analisador.executar_etapas(datasets)
+    return analisador.perf, saidas['decisao']['cidade_recomendada']
+
+#Última medição registrada para a mesma escala, número de candidatos e formato (base da comparação)
+def _anterior(escala, n_candidatos, formato):
+    arquivo = os.path.join(RESULTADOS_DIR, "analise.jsonl")
+    if not os.path.exists(arquivo):
+        return None
+    anterior = None
+    with open(arquivo, encoding='utf-8') as f:
+        for linha in f:
+            for resultado in json.loads(linha)['resultados']:
+                if (resultado['escala'], resultado['candidatos'], resultado.get('formato')) == (escala, n_candidatos, formato):
+                    anterior = resultado
+    return anterior
+
+def medir_escala(escala, n_candidatos=None, repeticoes=1, formato='parquet', semente=42):
+    n_candidatos = n_candidatos or min(BASE['cidades'] * escala, MAX_CANDIDATOS)
+    with tempfile.TemporaryDirectory() as diretorio:
+        inicio = time.perf_counter()
+        candidatos, linhas = gerar_datasets(escala, diretorio, n_candidatos, semente, formato)
+        geracao = time.perf_counter() - inicio
+
+        # Tempos sem tracemalloc (melhor de N); memória numa execução separada com tracemalloc
+        execucoes = [_executar(diretorio, candidatos, medir_memoria=False)[0] for _ in range(repeticoes)]
+        memoria, recomendacao = _executar(diretorio, candidatos, medir_memoria=True)
+
+    etapas = {nome: {'tempo_s': round(min(perf.etapas[nome]['tempo_s'] for perf in execucoes), 4),
+                     'cpu_s': round(min(perf.etapas[nome]['cpu_s'] for perf in execucoes), 4),
+                     'pico_mb': round(memoria.etapas[nome]['pico_memoria_mb'], 2)}
+              for nome in memoria.etapas}
+    pico_total = memoria.pico_total_mb
+    resultado = {
+        'escala': escala, 'candidatos': n_candidatos, 'formato': formato, 'linhas': linhas,
+        'geracao_s': round(geracao, 4), 'total_s': round(sum(e['tempo_s'] for e in etapas.values()), 4),
+        'pico_total_mb': round(pico_total, 2), 'etapas': etapas, 'recomendacao': recomendacao,
+    }
+    _apresentar(resultado, _anterior(escala, n_candidatos, formato))
+    return resultado
+
+def _apresentar(resultado, anterior):
+    variacao = lambda atual, antes: f" ({(atual / antes - 1) * 100:+.0f}%)" if antes else ""
+    linhas = ", ".join(f"{nome} {n}" for nome, n in resultado['linhas'].items())
+    print(f"\n📏 Escala {resultado['escala']}x | {resultado['candidatos']} candidatos | {linhas}")
+    for nome, etapa in resultado['etapas'].items():
+        antes = anterior['etapas'].get(nome, {}).get('tempo_s') if anterior else None
+        print(f"   {nome:<13} {etapa['tempo_s']:8.3f}s{variacao(etapa['tempo_s'], antes):<8} CPU {etapa['cpu_s']:8.3f}s"
+              f" | pico {etapa['pico_mb']:8.1f} MB")
+    antes = anterior['total_s'] if anterior else None
+    print(f"   {'total':<13} {resultado['total_s']:8.3f}s{variacao(resultado['total_s'], antes):<8} "
+          f"{'':<14} | pico {resultado['pico_total_mb']:8.1f} MB | recomendação: {resultado['recomendacao']}")
+
+def executar_benchmark(escalas=ESCALAS, n_candidatos=None, repeticoes=1, formato='parquet', semente=42):
+    resultados = [medir_escala(escala, n_candidatos, repeticoes, formato, semente) for escala in escalas]
+    registro = {
+        'timestamp': datetime.now().isoformat(timespec='seconds'),
+        'parametros': {'repeticoes': repeticoes, 'formato': formato, 'semente': semente,
+                       'python': sys.version.split()[0]},
+        'resultados': resultados,
+    }
+    os.makedirs(RESULTADOS_DIR, exist_ok=True)
+    with open(os.path.join(RESULTADOS_DIR, "analise.jsonl"), 'a', encoding='utf-8') as f:
+        f.write(json.dumps(registro, ensure_ascii=False) + "\n")
+    return registro
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Benchmark da análise com datasets sintéticos em escala")
+    parser.add_argument("--escalas", default=",".join(map(str, ESCALAS)),
+                        help="múltiplos da base (2 cidades, 16 rotas, 13 estados), separados por vírgula")
+    parser.add_argument("--candidatos", type=int, help=f"candidatos avaliados (padrão: 2 x escala, até {MAX_CANDIDATOS})")
+    parser.add_argument("--repeticoes", type=int, default=1, help="execuções cronometradas por escala (vale a menor)")
+    parser.add_argument("--formato", choices=['parquet', 'csv'], default='parquet', help="formato lido pela análise")
+    parser.add_argument("--semente", type=int, default=42)
+    args = parser.parse_args()
+
+    print("=" * 80)
+    print("🏁 Benchmark da Análise - Dados Sintéticos")
+    print("=" * 80)
+    executar_benchmark([int(e) for e in args.escalas.split(',')], args.candidatos, args.repeticoes, args.formato,
+                       args.semente)
+    print(f"\n💾 Resultados: {os.path.join(RESULTADOS_DIR, 'analise.jsonl')}")
@@ -0,0 +1,102 @@
+"""
+BENCHMARK DE COLETA - APIs IBGE
+
+Mede offline o caminho de coleta dos dois coletores IBGE (`main()` de dados_consumo_estados_visinhos e
+`executar_coleta()` de dados_custos_imobiliarios) contra o servidor local de replay. Reporta requisições,
+requisições/segundo e tempo ponta a ponta, e acumula os resultados em `resultados_benchmark/coleta.jsonl`.
+
+Autor: Lucas Abreu - lucasabreuzip
+GitBuh: https://github.com/lucasabreuzip
+Linkedin: https://www.linkedin.com/in/lucasabreuzip/
+Versão: 2.0
+Data: 09/2025
+"""
+
+import os
+import io
+import json
+import time
+import shutil
+import argparse
+import tempfile
+import contextlib
+from datetime import datetime
+
+from sidra_replay import ServidorSidra, FIXTURES_DIR
+
+RESULTADOS_DIR = "resultados_benchmark"
+
+#Executa uma função de coleta contra o servidor e mede tempo e throughput
+def medir(nome, funcao, servidor, verbose=False):
+    servidor.zerar_estatisticas()
+    inicio = time.perf_counter()
+    with contextlib.redirect_stdout(io.StringIO()) if not verbose else contextlib.nullcontext():
+        funcao()
+    duracao = time.perf_counter() - inicio
+
+    stats = dict(servidor.estatisticas)
+    resultado = {
+        'etapa': nome,
+        'tempo_total_s': round(duracao, 4),
+        'requisicoes': stats['requisicoes'],
+        'requisicoes_por_s': round(stats['requisicoes'] / duracao, 2) if duracao > 0 else None,
+        'kb_transferidos': round(stats['bytes'] / 1024, 1),
+        'servidor': stats,
+    }
+    print(f"⏱️ {nome}: {duracao:.2f}s | {stats['requisicoes']} req | "
+          f"{resultado['requisicoes_por_s']} req/s | {resultado['kb_transferidos']} KB")
+    return resultado
+
+def executar_benchmark(fixtures=FIXTURES_DIR, latencia=0.0, taxa_falhas=0.0, sintetico=True, verbose=False, execucoes=1,
+                       paralelo=False):
+    with ServidorSidra('reproduzir', fixtures, latencia=latencia, taxa_falhas=taxa_falhas,
+                       sintetico=sintetico) as servidor, tempfile.TemporaryDirectory() as saida:
+        import dados_consumo_estados_visinhos as consumo
+        import dados_custos_imobiliarios as custos
+
+        # Coletores apontados para o servidor local e gravando em diretório temporário
+        shutil.copy(os.path.join(consumo.DATASETS_DIR, "dataset_rotas_nordeste.csv"), saida)
+        for modulo in (consumo, custos):
+            modulo.SIDRA_URL = servidor.url
+            modulo.DATASETS_DIR = saida
+            modulo.IBGE_SERVICOS_URL = servidor.url
+
+        # Execuções repetidas no mesmo diretório medem o ganho do histórico incremental
+        resultados = []
+        for n in range(1, execucoes + 1):
+            consumo.IBGEApiClient._historico = None  # como em um processo novo
+            coleta_custos = lambda: custos.executar_coleta(paralelo=paralelo)
+            for nome, funcao in [('consumo.main', consumo.main), ('custos.executar_coleta', coleta_custos)]:
+                resultado = medir(f"{nome} #{n}", funcao, servidor, verbose)
+                resultado['execucao'] = n
+                resultados.append(resultado)
+
+    registro = {
+        'timestamp': datetime.now().isoformat(timespec='seconds'),
+        'parametros': {'latencia': latencia, 'taxa_falhas': taxa_falhas, 'sintetico': sintetico, 'execucoes': execucoes,
+                       'paralelo': paralelo},
+        'resultados': resultados,
+    }
+    os.makedirs(RESULTADOS_DIR, exist_ok=True)
+    with open(os.path.join(RESULTADOS_DIR, "coleta.jsonl"), 'a', encoding='utf-8') as f:
+        f.write(json.dumps(registro, ensure_ascii=False) + "\n")
+    return registro
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Benchmark offline dos coletores IBGE")
+    parser.add_argument("--fixtures", default=FIXTURES_DIR)
+    parser.add_argument("--latencia", type=float, default=0.05, help="latência simulada por requisição (s)")
+    parser.add_argument("--taxa-falhas", type=float, default=0.0)
+    parser.add_argument("--sem-sintetico", action="store_true", help="usa apenas fixtures gravadas")
+    parser.add_argument("--verbose", action="store_true", help="mostra a saída dos coletores")
+    parser.add_argument("--paralelo", action="store_true", help="executar_coleta em modo paralelo")
+    parser.add_argument("--execucoes", type=int, default=2, help="execuções seguidas (a partir da 2ª usa o histórico local)")
+    args = parser.parse_args()
+
+    print("=" * 80)
+    print("🏁 Benchmark de Coleta - APIs IBGE (replay local)")
+    print("=" * 80)
+    executar_benchmark(args.fixtures, args.latencia, args.taxa_falhas, not args.sem_sintetico, args.verbose, args.execucoes,
+                       args.paralelo)
+    print(f"\n💾 Resultados: {os.path.join(RESULTADOS_DIR, 'coleta.jsonl')}")
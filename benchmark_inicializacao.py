@@ -0,0 +1,107 @@
+"""
+BENCHMARK DE INICIALIZAÇÃO - ia_analise
+
+Mede, em processos novos, o custo de inicialização das invocações leves e completas de ia_analise: import do
+módulo, construção do AnalisadorMagalu, `--resultado`, `--etapas custos` e a análise completa com cache quente.
+Registra tempo de parede (mínimo/mediana), tempo total de import (`-X importtime`) e quais
+dependências pesadas foram carregadas. Acumula os resultados em `resultados_benchmark/inicializacao.jsonl`.
+
+Autor: Lucas Abreu - lucasabreuzip
+GitBuh: https://github.com/lucasabreuzip
+Linkedin: https://www.linkedin.com/in/lucasabreuzip/
+Versão: 2.0
+Data: 09/2025
+"""
+
+import os
+import sys
+import json
+import time
+import argparse
+import tempfile
+import statistics
+import subprocess
+from datetime import datetime
+
+RESULTADOS_DIR = "resultados_benchmark"
+MODULOS_PESADOS = ['sklearn', 'skfuzzy', 'scipy', 'joblib', 'pandas']
+
+def cenarios(saida: str, completo_sem_cache: bool):
+    ia = [sys.executable, "ia_analise.py"]
+    lista = [
+        ('import ia_analise', [sys.executable, "-c", "import ia_analise"]),
+        ('AnalisadorMagalu()', [sys.executable, "-c", "import ia_analise; ia_analise.AnalisadorMagalu()"]),
+        ('cli --resultado', ia + ["--resultado"]),
+        ('cli --etapas custos', ia + ["--etapas", "custos", "--sem-cache"]),
+        ('cli completo (cache quente)', ia + ["--saida", saida]),
+    ]
+    if completo_sem_cache:
+        lista.append(('cli completo --sem-cache', ia + ["--saida", saida, "--sem-cache"]))
+    return lista
+
+#A partir da saída de -X importtime: tempo total de import (módulos de topo) e tempo cumulativo de cada
+#dependência pesada carregada em qualquer nível (entrada mais externa do pacote)
+def tempos_importacao(comando):
+    proc = subprocess.run([comando[0], "-X", "importtime", *comando[1:]], capture_output=True, text=True)
+    total, pesados = 0.0, {}
+    for linha in proc.stderr.splitlines():
+        if not linha.startswith("import time:") or "cumulative" in linha:
+            continue
+        _, cumulativo, nome = linha[len("import time:"):].split("|")
+        segundos = int(cumulativo) / 1e6
+        if not nome.startswith("  "):  # nível de topo
+            total += segundos
+        raiz = nome.strip().split(".")[0]
+        if raiz in MODULOS_PESADOS:
+            pesados[raiz] = max(pesados.get(raiz, 0), segundos)
+    return total, pesados
+
+def medir(nome, comando, repeticoes):
+    duracoes = []
+    for _ in range(repeticoes):
+        inicio = time.perf_counter()
+        proc = subprocess.run(comando, capture_output=True, text=True)
+        duracoes.append(time.perf_counter() - inicio)
+        if proc.returncode != 0:
+            raise RuntimeError(f"{nome} falhou: {proc.stderr[-500:]}")
+    importacao, pesados = tempos_importacao(comando)
+    resultado = {
+        'cenario': nome,
+        'tempo_min_s': round(min(duracoes), 4),
+        'tempo_mediana_s': round(statistics.median(duracoes), 4),
+        'importacao_s': round(importacao, 4),
+        'modulos_pesados': {m: round(pesados[m], 4) for m in MODULOS_PESADOS if m in pesados},
+    }
+    pesados = ", ".join(f"{m} {t:.2f}s" for m, t in resultado['modulos_pesados'].items()) or "nenhum"
+    print(f"⏱️ {nome}: {resultado['tempo_mediana_s']:.2f}s (mín {resultado['tempo_min_s']:.2f}s) | "
+          f"imports {resultado['importacao_s']:.2f}s | pesados: {pesados}")
+    return resultado
+
+def executar_benchmark(repeticoes=3, completo_sem_cache=False):
+    with tempfile.TemporaryDirectory() as temporario:
+        saida = os.path.join(temporario, "resultado.json")
+        subprocess.run([sys.executable, "ia_analise.py", "--saida", saida], capture_output=True)  # aquece os caches
+        resultados = [medir(nome, comando, repeticoes) for nome, comando in cenarios(saida, completo_sem_cache)]
+
+    registro = {
+        'timestamp': datetime.now().isoformat(timespec='seconds'),
+        'parametros': {'repeticoes': repeticoes, 'completo_sem_cache': completo_sem_cache, 'python': sys.version.split()[0]},
+        'resultados': resultados,
+    }
+    os.makedirs(RESULTADOS_DIR, exist_ok=True)
+    with open(os.path.join(RESULTADOS_DIR, "inicializacao.jsonl"), 'a', encoding='utf-8') as f:
+        f.write(json.dumps(registro, ensure_ascii=False) + "\n")
+    return registro
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Benchmark de inicialização do ia_analise")
+    parser.add_argument("--repeticoes", type=int, default=3)
+    parser.add_argument("--completo-sem-cache", action="store_true", help="inclui a análise completa sem caches (lenta)")
+    args = parser.parse_args()
+
+    print("=" * 80)
+    print("🏁 Benchmark de Inicialização - ia_analise")
+    print("=" * 80)
+    executar_benchmark(args.repeticoes, args.completo_sem_cache)
+    print(f"\n💾 Resultados: {os.path.join(RESULTADOS_DIR, 'inicializacao.jsonl')}")
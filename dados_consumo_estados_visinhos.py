@@ -13,32 +13,32 @@ Data: 09/2025
 
 import requests
 import pandas as pd
+import numpy as np
 import time
 import os
 from datetime import datetime
 
+from armazenamento_datasets import carregar_dataset, gravar_dataset
+from historico_ibge import HistoricoSidra
+from matriz_distancias import CAPITAIS_ESTADOS, ESTADOS_VIZINHOS, MatrizDistancias
+from sidra_decoder import decodificar
+
 DATASETS_DIR = "datasets_gerados"
 os.makedirs(DATASETS_DIR, exist_ok=True)
 
+# Endpoints IBGE (sobrescrevíveis para apontar ao servidor de replay local)
+SIDRA_URL = os.getenv("SIDRA_URL", "https://apisidra.ibge.gov.br")
+IBGE_SERVICOS_URL = os.getenv("IBGE_SERVICOS_URL", "https://servicodados.ibge.gov.br")
+
 # =============================================================================
 # CONFIGURAÇÕES E CONSTANTES
 # =============================================================================
 
-ESTADOS_VIZINHOS = {
-    "Pernambuco": {"codigo": 26, "capital": "Recife", "distancia_recife": 0, "distancia_salvador": 800},
-    "Bahia": {"codigo": 29, "capital": "Salvador", "distancia_recife": 800, "distancia_salvador": 0},
-    "Paraíba": {"codigo": 25, "capital": "João Pessoa", "distancia_recife": 120, "distancia_salvador": 920},
-    "Ceará": {"codigo": 23, "capital": "Fortaleza", "distancia_recife": 800, "distancia_salvador": 1400},
-    "Alagoas": {"codigo": 27, "capital": "Maceió", "distancia_recife": 285, "distancia_salvador": 632},
-    "Piauí": {"codigo": 22, "capital": "Teresina", "distancia_recife": 1050, "distancia_salvador": 1200},
-    "Sergipe": {"codigo": 28, "capital": "Aracaju", "distancia_recife": 632, "distancia_salvador": 356},
-    "Minas Gerais": {"codigo": 31, "capital": "Belo Horizonte", "distancia_recife": 1200, "distancia_salvador": 1372},
-    "Espírito Santo": {"codigo": 32, "capital": "Vitória", "distancia_recife": 1350, "distancia_salvador": 1200},
-    "Goiás": {"codigo": 52, "capital": "Goiânia", "distancia_recife": 1600, "distancia_salvador": 1450},
-    "Tocantins": {"codigo": 17, "capital": "Palmas", "distancia_recife": 1400, "distancia_salvador": 1100},
-    "Maranhão": {"codigo": 21, "capital": "São Luís", "distancia_recife": 1100, "distancia_salvador": 1050},
-    "Rio Grande do Norte": {"codigo": 24, "capital": "Natal", "distancia_recife": 300, "distancia_salvador": 1100},
-}
+# ESTADOS_VIZINHOS, CAPITAIS_ESTADOS e MatrizDistancias ficam em matriz_distancias.py (importável sem a coleta)
+
+# Modo municípios (n6): lotes paginados gravados em Parquet particionado por estado
+MUNICIPIOS_DIR = os.path.join(DATASETS_DIR, "dataset_demografica_municipios")
+TAMANHO_LOTE_MUNICIPIOS = 100
 
 RM_CODES = {29: "2901", 26: "2601", 23: "2301"}  # Salvador, Recife, Fortaleza
 FATORES_REGIONAIS = {29: 0.95, 26: 0.88, 23: 0.85, 21: 0.75, 25: 0.82, 24: 0.87, 27: 0.79, 28: 0.84, 22: 0.72}
@@ -50,50 +50,91 @@ FATORES_REGIONAIS = {29: 0.95, 26: 0.88, 23: 0.85, 21: 0.75, 25: 0.82, 24: 0.87,
 class IBGEApiClient:
     
     @staticmethod
-    def _fetch_api(url, timeout=20):
+    def _fetch_tabela(url, timeout=30):
+        """Resposta SIDRA com vários territórios → Series {código do território: valor}"""
+        try:
+            response = requests.get(url, timeout=timeout)
+            if response.status_code == 200:
+                df = decodificar(response.json())
+                return pd.Series(df['valor'].to_numpy(), index=df['territorio'].astype(int).to_numpy())
+        except:
+            pass
+        return None
+    
+    @staticmethod
+    def listar_municipios(codigo_estado, timeout=30):  #Municípios do estado (API de localidades)
+        url = f"{IBGE_SERVICOS_URL}/api/v1/localidades/estados/{codigo_estado}/municipios"
         try:
             response = requests.get(url, timeout=timeout)
             if response.status_code == 200:
-                data = response.json()
-                for item in data[1:]:  # Pula header
-                    if item.get('V') and item['V'] not in ['Valor', '..', '-', '...']:
-                        return item['V']
+                df = pd.DataFrame(response.json())[['id', 'nome']]
+                df.columns = ['codigo_municipio', 'municipio']
+                return df.sort_values('codigo_municipio', ignore_index=True)
         except:
             pass
         return None
     
+    @classmethod
+    def get_populacao_municipios(cls, codigos):  #População de um lote de municípios (Tabela 6579)
+        lista = ",".join(str(c) for c in codigos)
+        return cls._fetch_tabela(f"{SIDRA_URL}/values/t/6579/n6/{lista}/v/9324/p/last%201")
+    
+    @classmethod
+    def get_pib_municipios(cls, codigos):  #PIB de um lote de municípios (Tabela 5938)
+        lista = ",".join(str(c) for c in codigos)
+        serie = cls._fetch_tabela(f"{SIDRA_URL}/values/t/5938/n6/{lista}/v/37/p/last%201")
+        return serie * 1000 if serie is not None else None
+    
+    _historico = None
+    
+    @classmethod
+    def historico(cls):  #Histórico local incremental (só baixa períodos novos)
+        diretorio = os.path.join(DATASETS_DIR, "historico_ibge")
+        atual = cls._historico
+        if atual is None or (atual.diretorio, atual.sidra_url, atual.servicos_url) != (diretorio, SIDRA_URL, IBGE_SERVICOS_URL):
+            cls._historico = HistoricoSidra(diretorio, sidra_url=SIDRA_URL, servicos_url=IBGE_SERVICOS_URL)
+        return cls._historico
+    
+    @classmethod
+    def get_serie(cls, tabela, nivel, territorio, variavel):  #Série temporal completa do histórico
+        return cls.historico().serie(tabela, nivel, territorio, variavel)
+    
+    @classmethod
+    def get_serie_pib(cls, codigo_estado):  #PIB estadual ao longo dos anos (R$)
+        return cls.get_serie(5938, 3, codigo_estado, 37) * 1000
+    
+    @classmethod
+    def get_serie_ipca(cls, codigo_estado):  #IPCA mensal da região metropolitana (%)
+        rm_codigo = RM_CODES.get(codigo_estado)
+        return cls.get_serie(7060, 7, rm_codigo, 69) if rm_codigo else None
+    
     @classmethod
     def get_populacao(cls, codigo_estado, nome_estado):         #População por estado (Tabela 6579)
-        for ano in [2025, 2024, 2023]:
-            url = f"https://apisidra.ibge.gov.br/values/t/6579/n3/{codigo_estado}/v/9324/p/{ano}"
-            result = cls._fetch_api(url)
-            if result:
-                pop = int(result)
-                print(f"✅ População {nome_estado}: {pop:,} hab ({ano})")
-                return pop
+        ultimo = cls.historico().ultimo_valor(6579, 3, codigo_estado, 9324)
+        if ultimo:
+            ano, valor = ultimo
+            pop = int(valor)
+            print(f"✅ População {nome_estado}: {pop:,} hab ({ano})")
+            return pop
         return None
     
     @classmethod
     def get_pib(cls, codigo_estado, nome_estado):         #PIB por estado (Tabela 5938)
-
-        for ano in [2021, 2020]:
-            url = f"https://apisidra.ibge.gov.br/values/t/5938/n3/{codigo_estado}/v/37/p/{ano}"
-            result = cls._fetch_api(url)
-            if result:
-                pib = float(result) * 1000
-                print(f"✅ PIB {nome_estado}: R$ {pib:,.0f} ({ano})")
-                return pib
+        ultimo = cls.historico().ultimo_valor(5938, 3, codigo_estado, 37)
+        if ultimo:
+            ano, valor = ultimo
+            pib = valor * 1000
+            print(f"✅ PIB {nome_estado}: R$ {pib:,.0f} ({ano})")
+            return pib
         return None
     
     @classmethod
     def get_renda_nacional(cls):  #Rendimento médio nacional via PNAD (Tabela 6387)
-        for periodo in ["202304", "202303", "202302"]:
-            url = f"https://apisidra.ibge.gov.br/values/t/6387/n1/1/v/5935/p/{periodo}"
-            result = cls._fetch_api(url)
-            if result:
-                renda = float(result)
-                print(f"✅ Renda Nacional: R$ {renda:,.0f} ({periodo})")
-                return renda
+        ultimo = cls.historico().ultimo_valor(6387, 1, 1, 5935)
+        if ultimo:
+            periodo, renda = ultimo
+            print(f"✅ Renda Nacional: R$ {renda:,.0f} ({periodo})")
+            return renda
         return 3234
     
     @classmethod
@@ -102,60 +143,51 @@ class IBGEApiClient:
         if not rm_codigo:
             return None
         
-        for periodo in ["202311", "202310", "202309"]:
-            url = f"https://apisidra.ibge.gov.br/values/t/7060/n7/{rm_codigo}/v/69/p/{periodo}"
-            result = cls._fetch_api(url)
-            if result:
-                ipca = float(result)
-                print(f"✅ IPCA {nome_estado}: {ipca}% ({periodo})")
-                return ipca
+        ultimo = cls.historico().ultimo_valor(7060, 7, rm_codigo, 69)
+        if ultimo:
+            periodo, ipca = ultimo
+            print(f"✅ IPCA {nome_estado}: {ipca}% ({periodo})")
+            return ipca
         return None
 
 # =============================================================================
 # FUNÇÕES DE PROCESSAMENTO
 # =============================================================================
 
-#Carrega distâncias reais do CSV gerado pelo script de malha viária
+#Carrega distâncias reais do dataset (Parquet ou CSV) gerado pelo script de malha viária
 def carregar_distancias_reais():
-    arquivo = os.path.join(DATASETS_DIR, "dataset_rotas_nordeste.csv")
-    distancias = {}
+    rotas = carregar_dataset('rotas', (DATASETS_DIR,), colunas=['origem', 'destino', 'distancia_km', 'tempo_horas'],
+                             calculo=True)
     
-    if os.path.exists(arquivo):
+    if rotas is not None:
         try:
-            df = pd.read_csv(arquivo)
-            capitais_estados = {"Salvador": "Bahia", "Recife": "Pernambuco", "Aracaju": "Sergipe",
-                              "Maceió": "Alagoas", "João Pessoa": "Paraíba", "Natal": "Rio Grande do Norte",
-                              "Fortaleza": "Ceará", "Teresina": "Piauí", "São Luís": "Maranhão",
-                              "Belo Horizonte": "Minas Gerais", "Vitória": "Espírito Santo",
-                              "Goiânia": "Goiás", "Palmas": "Tocantins"}
-            
-            for _, row in df.iterrows():
-                origem = capitais_estados.get(row['origem'], row['origem'])
-                destino = capitais_estados.get(row['destino'], row['destino'])
-                dist = row['distancia_km']
-                
-                if origem not in distancias: distancias[origem] = {}
-                if destino not in distancias: distancias[destino] = {}
-                distancias[origem][destino] = distancias[destino][origem] = dist
-            
-            print(f"✅ Distâncias reais carregadas: {len(df)} rotas encontradas")
+            matriz = MatrizDistancias.do_dataframe(rotas)
+            pares = int(np.count_nonzero(~np.isnan(matriz.distancias)))
+            print(f"✅ Distâncias reais carregadas: {len(matriz)} estados, {pares} pares origem-destino")
+            return matriz
         except Exception as e:
             print(f"⚠️ Erro ao carregar distâncias: {e}")
     
-    return distancias
+    return MatrizDistancias.vazia()
 
 #Atualiza configuração com distâncias reais
-def atualizar_distancias(estados_config, distancias_reais):
+def atualizar_distancias(estados_config, matriz):
     estados_atualizados = {}
+    estados = list(estados_config.keys())
+    bases = {"recife": "Pernambuco", "salvador": "Bahia"}
+    
+    # Uma consulta vetorizada por base para todos os estados
+    recorte = matriz.recorte(list(bases.values()), estados)
     
     for estado, config in estados_config.items():
         novo_config = config.copy()
         tem_dados_reais = False
         
         # Atualizar distâncias para Recife e Salvador
-        for base, campo in [("Pernambuco", "recife"), ("Bahia", "salvador")]:
-            if base in distancias_reais and estado in distancias_reais[base]:
-                novo_config[f'distancia_{campo}'] = round(distancias_reais[base][estado])
+        for campo, base in bases.items():
+            dist = recorte.at[base, estado]
+            if not np.isnan(dist):
+                novo_config[f'distancia_{campo}'] = round(dist)
                 novo_config[f'fonte_distancia_{campo}'] = 'API_Real'
                 tem_dados_reais = True
         
@@ -165,51 +197,79 @@ def atualizar_distancias(estados_config, distancias_reais):
     
     return estados_atualizados
 
-#Calcula renda regional baseada em fatores oficiais
-def calcular_renda_regional(renda_nacional, codigo_estado, nome_estado, pib_per_capita):
-    fator_regional = FATORES_REGIONAIS.get(codigo_estado, 0.8)
-    fator_pib = min(pib_per_capita / 50000, 1.2)
-    fator_final = (fator_regional * 0.7) + (fator_pib * 0.3)
-    renda = renda_nacional * fator_final
-    print(f"✅ Renda {nome_estado}: R$ {renda:,.0f}")
-    return renda
+# Distribuição por classe (A, B, C, D, E) para os perfis alto, médio e baixo
+DISTRIBUICAO_CLASSES = np.array([
+    [0.04, 0.16, 0.42, 0.28, 0.10],
+    [0.02, 0.11, 0.37, 0.35, 0.15],
+    [0.01, 0.07, 0.30, 0.40, 0.22],
+])
+RENDAS_CLASSE = [26400, 13200, 5280, 2640, 858]  # A, B, C, D, E
+PROPENSOES_CONSUMO = [0.85, 0.80, 0.75, 0.70, 0.65]
 
-#Calcula consumo por classes socioeconômicas
-def calcular_consumo_classes(renda_media, populacao, pib_per_capita):
+# Faixas de distância até Recife (km, limite superior inclusivo) e pontos de proximidade
+FAIXAS_PROXIMIDADE = [300, 600, 1000, 1400]
+PONTOS_PROXIMIDADE = np.array([15, 12, 8, 4, 1])
 
-    fator_renda = renda_media / 3100
-    fator_pib = min(pib_per_capita / 40000, 1.5)
+#Renda regional vetorizada: uma linha por estado/município
+def calcular_renda_regional_vetorizado(renda_nacional, codigos_estado, pib_per_capita):
+    fator_regional = pd.Series(np.asarray(codigos_estado)).map(FATORES_REGIONAIS).fillna(0.8).to_numpy(dtype=float)
+    fator_pib = np.minimum(np.asarray(pib_per_capita, dtype=float) / 50000, 1.2)
+    fator_final = (fator_regional * 0.7) + (fator_pib * 0.3)
+    return renda_nacional * fator_final
+
+#Consumo por classes vetorizado: perfil escolhido com np.select e soma por classe
+def calcular_consumo_classes_vetorizado(renda_media, populacao, pib_per_capita):
+    renda_media = np.asarray(renda_media, dtype=float)
+    populacao = np.asarray(populacao, dtype=float)
     
-    if fator_renda > 1.2 and fator_pib > 1.1:
-        dist = {'A': 0.04, 'B': 0.16, 'C': 0.42, 'D': 0.28, 'E': 0.10}
-    elif fator_renda > 0.9:
-        dist = {'A': 0.02, 'B': 0.11, 'C': 0.37, 'D': 0.35, 'E': 0.15}
-    else:
-        dist = {'A': 0.01, 'B': 0.07, 'C': 0.30, 'D': 0.40, 'E': 0.22}
+    fator_renda = renda_media / 3100
+    fator_pib = np.minimum(np.asarray(pib_per_capita, dtype=float) / 40000, 1.5)
     
-    rendas_classe = [26400, 13200, 5280, 2640, 858]  # A, B, C, D, E
-    propensoes = [0.85, 0.80, 0.75, 0.70, 0.65]
+    perfil = np.select([(fator_renda > 1.2) & (fator_pib > 1.1), fator_renda > 0.9], [0, 1], default=2)
+    dist = DISTRIBUICAO_CLASSES[perfil]
     
-    consumo_total = sum(populacao * perc * renda * prop * 12 / 1e9 
-                       for perc, renda, prop in zip(dist.values(), rendas_classe, propensoes))
+    # Acumula classe a classe na mesma ordem da versão escalar (resultados idênticos)
+    consumo_total = np.zeros(len(populacao))
+    for k, (renda, prop) in enumerate(zip(RENDAS_CLASSE, PROPENSOES_CONSUMO)):
+        consumo_total = consumo_total + populacao * dist[:, k] * renda * prop * 12 / 1e9
     return consumo_total
 
-#Calcula score de atratividade de mercado
-def calcular_score_atratividade(dados):
-
-    pop_score = min((dados['populacao'] / 8000000) * 25, 25)
-    renda_score = min((dados['renda_mensal'] / 3100) * 25, 25)
+#Score de atratividade vetorizado: faixas de distância via np.digitize
+def calcular_score_atratividade_vetorizado(populacao, renda_mensal, distancia_recife):
+    pop_score = np.minimum((np.asarray(populacao, dtype=float) / 8000000) * 25, 25)
+    renda_score = np.minimum((np.asarray(renda_mensal, dtype=float) / 3100) * 25, 25)
     classe_score = 10  # Simplificado
     
-    dist_recife = dados.get('distancia_recife', 999)
-    if dist_recife <= 300: prox_score = 15
-    elif dist_recife <= 600: prox_score = 12
-    elif dist_recife <= 1000: prox_score = 8
-    elif dist_recife <= 1400: prox_score = 4
-    else: prox_score = 1
+    dist_recife = np.nan_to_num(np.asarray(distancia_recife, dtype=float), nan=999)
+    prox_score = PONTOS_PROXIMIDADE[np.digitize(dist_recife, FAIXAS_PROXIMIDADE, right=True)]
     
     return pop_score + renda_score + classe_score + prox_score
 
+#Calcula renda regional baseada em fatores oficiais
+def calcular_renda_regional(renda_nacional, codigo_estado, nome_estado, pib_per_capita):
+    renda = float(calcular_renda_regional_vetorizado(renda_nacional, [codigo_estado], [pib_per_capita])[0])
+    print(f"✅ Renda {nome_estado}: R$ {renda:,.0f}")
+    return renda
+
+#Calcula consumo por classes socioeconômicas
+def calcular_consumo_classes(renda_media, populacao, pib_per_capita):
+    return float(calcular_consumo_classes_vetorizado([renda_media], [populacao], [pib_per_capita])[0])
+
+#Calcula score de atratividade de mercado
+def calcular_score_atratividade(dados):
+    return float(calcular_score_atratividade_vetorizado([dados['populacao']], [dados['renda_mensal']],
+                                                        [dados.get('distancia_recife', 999)])[0])
+
+#Pontua um DataFrame inteiro (estados ou municípios) de uma vez
+def pontuar_dataframe(df, renda_nacional, coluna_estado='codigo_ibge'):
+    df = df.copy()
+    df['pib_per_capita'] = df['pib_total'] / df['populacao']
+    df['renda_mensal'] = calcular_renda_regional_vetorizado(renda_nacional, df[coluna_estado], df['pib_per_capita'])
+    df['consumo_bilhoes'] = calcular_consumo_classes_vetorizado(df['renda_mensal'], df['populacao'], df['pib_per_capita'])
+    distancia = df['distancia_recife'] if 'distancia_recife' in df else np.full(len(df), np.nan)
+    df['score_atratividade'] = calcular_score_atratividade_vetorizado(df['populacao'], df['renda_mensal'], distancia)
+    return df
+
 #Processa um estado completo
 def processar_estado(estado_nome, config, api_client):
 
@@ -249,6 +309,73 @@ def processar_estado(estado_nome, config, api_client):
     print(f"✅ {estado_nome}: Pop {populacao:,} | PIB/cap R${pib_per_capita:,.0f} | Renda R${renda_mensal:,.0f} | Score {resultado['score_atratividade']:.1f}")
     return resultado
 
+#Processa um lote de municípios e grava sua partição Parquet (gravação atômica)
+#Só municípios com população e PIB entram no arquivo; os demais seguem pendentes para a próxima execução
+def processar_lote_municipios(lote, config, api_client, renda_nacional, diretorio):
+    populacao = api_client.get_populacao_municipios(lote['codigo_municipio'])
+    pib_total = api_client.get_pib_municipios(lote['codigo_municipio'])
+    if populacao is None or pib_total is None:
+        return None
+    
+    df = lote.assign(
+        codigo_estado=config['codigo'],
+        populacao=lote['codigo_municipio'].map(populacao),
+        pib_total=lote['codigo_municipio'].map(pib_total),
+        # Distância rodoviária aproximada pela capital do estado (registrado no dataset)
+        distancia_recife=config['distancia_recife'],
+        distancia_salvador=config['distancia_salvador'],
+        distancia_aproximada=True,
+    ).dropna(subset=['populacao', 'pib_total'])
+    if df.empty:
+        return 0
+    
+    df = pontuar_dataframe(df, renda_nacional, coluna_estado='codigo_estado')
+    
+    # Arquivo nomeado pelos códigos gravados; o temporário começa com '.' para o leitor do dataset ignorá-lo
+    nome = f"municipios_{df['codigo_municipio'].iloc[0]}_{df['codigo_municipio'].iloc[-1]}.parquet"
+    arquivo, temporario = os.path.join(diretorio, nome), os.path.join(diretorio, f".{nome}.tmp")
+    df.drop(columns='codigo_estado').to_parquet(temporario, index=False)
+    os.replace(temporario, arquivo)
+    return len(df)
+
+#Códigos de municípios já gravados na partição do estado (retomada independe do tamanho do lote)
+def municipios_gravados(diretorio):
+    if not any(a.endswith('.parquet') and not a.startswith(('.', '_')) for a in os.listdir(diretorio)):
+        return set()
+    return set(pd.read_parquet(diretorio, columns=['codigo_municipio'])['codigo_municipio'])
+
+#Coleta municípios de um estado em lotes; municípios já gravados são pulados (retomada)
+def processar_municipios_estado(estado_nome, config, api_client, renda_nacional, tamanho_lote=TAMANHO_LOTE_MUNICIPIOS):
+    municipios = api_client.listar_municipios(config['codigo'])
+    if municipios is None or municipios.empty:
+        print(f"⚠️ {estado_nome}: lista de municípios indisponível")
+        return 0
+    
+    diretorio = os.path.join(MUNICIPIOS_DIR, f"codigo_estado={config['codigo']}")
+    os.makedirs(diretorio, exist_ok=True)
+    
+    pendentes = municipios[~municipios['codigo_municipio'].isin(municipios_gravados(diretorio))]
+    total_lotes = (len(pendentes) + tamanho_lote - 1) // tamanho_lote
+    gravados = 0
+    
+    for n in range(total_lotes):
+        lote = pendentes.iloc[n * tamanho_lote:(n + 1) * tamanho_lote]
+        linhas = processar_lote_municipios(lote, config, api_client, renda_nacional, diretorio)
+        if linhas is None:
+            print(f"⚠️ {estado_nome}: lote {n + 1}/{total_lotes} falhou (será refeito na próxima execução)")
+        else:
+            gravados += linhas
+            faltantes = len(lote) - linhas
+            aviso = f" | {faltantes} sem dados (pendentes)" if faltantes else ""
+            print(f"✅ {estado_nome}: lote {n + 1}/{total_lotes} | {linhas} municípios{aviso}")
+        time.sleep(0.5)  # Rate limiting
+    
+    return gravados
+
+#Lê o dataset municipal particionado (colunas opcionais para limitar memória)
+def carregar_municipios(colunas=None):
+    return pd.read_parquet(MUNICIPIOS_DIR, columns=colunas)
+
 # =============================================================================
 # FUNÇÃO PRINCIPAL
 # =============================================================================
@@ -294,14 +421,46 @@ def main():
             })
         
         df = pd.DataFrame(dados_csv)
-        arquivo_csv = os.path.join(DATASETS_DIR, f"dataset_demografica_vizinhos_recife_salvador.csv")
-        df.to_csv(arquivo_csv, index=False, encoding='utf-8-sig')
-        print(f"\n💾 Dataset: {arquivo_csv}")
+        arquivo = gravar_dataset('demografia', df, DATASETS_DIR)
+        print(f"\n💾 Dataset: {arquivo}")
         print(f"✅ {len(resultados)} estados processados | API IBGE")
     else:
         print("❌ Erro: Nenhum estado processado")
     
     return resultados
 
+#Executa a coleta municipal (n6) em lotes, retomável após interrupção
+def main_municipios(tamanho_lote=TAMANHO_LOTE_MUNICIPIOS):
+    print("=" * 80)
+    print("🚀 Análise Demográfica - Municípios dos Estados Vizinhos")
+    print("=" * 80)
+    print(f"⏰ Início: {datetime.now().strftime('%d/%m/%Y %H:%M:%S')}")
+    print(f"📡 Coletando municípios via APIs IBGE em lotes de {tamanho_lote}\n")
+    
+    print("🛣️ CARREGANDO DISTÂNCIAS REAIS...")
+    estados_config = atualizar_distancias(ESTADOS_VIZINHOS, carregar_distancias_reais())
+    
+    api_client = IBGEApiClient()
+    renda_nacional = api_client.get_renda_nacional()
+    
+    print("\n📍 PROCESSANDO MUNICÍPIOS:")
+    total = 0
+    for estado_nome, config in estados_config.items():
+        total += processar_municipios_estado(estado_nome, config, api_client, renda_nacional, tamanho_lote)
+    
+    print(f"\n💾 Dataset: {MUNICIPIOS_DIR}")
+    print(f"✅ {total} municípios gravados nesta execução | API IBGE")
+    return total
+
 if __name__ == "__main__":
-    main()
\ No newline at end of file
+    import argparse
+    
+    parser = argparse.ArgumentParser(description="Análise demográfica dos estados vizinhos (IBGE)")
+    parser.add_argument("--municipios", action="store_true", help="coleta por município (n6) em Parquet particionado")
+    parser.add_argument("--tamanho-lote", type=int, default=TAMANHO_LOTE_MUNICIPIOS, help="municípios por requisição SIDRA")
+    args = parser.parse_args()
+    
+    if args.municipios:
+        main_municipios(args.tamanho_lote)
+    else:
+        main()
\ No newline at end of file
@@ -10,43 +10,185 @@ Linkedin: https://www.linkedin.com/in/lucasabreuzip/
 Versão: 2.0
 Data: 09/2025
 """
-import requests, json, time, os, pandas as pd
+import requests, json, time, os, re, threading, pandas as pd
+from concurrent.futures import ThreadPoolExecutor, as_completed
 from datetime import datetime
-from typing import Any, Dict, Optional
+from typing import Any, Dict, List, Optional, Tuple
+
+from armazenamento_datasets import gravar_dataset
+from historico_ibge import HistoricoSidra
+from sidra_decoder import decodificar, ultimo_valido
 
 # Configuração ultra-compacta
 DATASETS_DIR = "datasets_gerados"
 os.makedirs(DATASETS_DIR, exist_ok=True)
+SIDRA_URL = os.getenv('SIDRA_URL', 'https://apisidra.ibge.gov.br')  # sobrescrevível para replay local
+IBGE_SERVICOS_URL = os.getenv('IBGE_SERVICOS_URL', 'https://servicodados.ibge.gov.br')
 
 CONFIG = {
     'Salvador': {'municipio': 2927408, 'estado': 29, 'uf': 'BA', 'rm': '2901', 'coords': (-12.9714, -38.5014)},
     'Recife': {'municipio': 2611606, 'estado': 26, 'uf': 'PE', 'rm': '2601', 'coords': (-8.0476, -34.8770)}
 }
 
+# Registro de candidatos em escala: territórios por requisição SIDRA em lote
+TAMANHO_LOTE_SIDRA = 100
+UF_POR_CODIGO = {11: 'RO', 12: 'AC', 13: 'AM', 14: 'RR', 15: 'PA', 16: 'AP', 17: 'TO', 21: 'MA', 22: 'PI', 23: 'CE',
+                 24: 'RN', 25: 'PB', 26: 'PE', 27: 'AL', 28: 'SE', 29: 'BA', 31: 'MG', 32: 'ES', 33: 'RJ', 35: 'SP',
+                 41: 'PR', 42: 'SC', 43: 'RS', 50: 'MS', 51: 'MT', 52: 'GO', 53: 'DF'}
+# Região metropolitana com IPCA (Tabela 7060, n7) usada como referência de preços da UF
+RM_IPCA_POR_UF = {'PA': '1501', 'CE': '2301', 'PE': '2601', 'BA': '2901', 'MG': '3101', 'ES': '3201',
+                  'RJ': '3301', 'SP': '3501', 'PR': '4101', 'RS': '4301'}
+
 # APIs consolidadas - formato: nome: [URLs, parser, multiplicador]
 APIS = {
-    'populacao': (['https://apisidra.ibge.gov.br/values/t/6579/n6/{municipio}/v/9324/p/last%201'], 'sidra', 1),
-    'pib_total': (['https://apisidra.ibge.gov.br/values/t/5938/n6/{municipio}/v/37/p/last%201'], 'sidra', 1000),
-    'renda_mensal': (['https://apisidra.ibge.gov.br/values/t/7416/n3/{estado}/v/4705/p/last%201'], 'renda', 1),
-    'ipca_regional': (['https://apisidra.ibge.gov.br/values/t/7060/n7/{rm}/v/69/p/last%201'], 'sidra', 1),
-    'custo_construcao': (['https://apisidra.ibge.gov.br/values/t/2296/n3/{estado}/v/48/p/last%201'], 'sidra', 1),
-    'preco_venda': (['https://apisidra.ibge.gov.br/values/t/2296/n3/{estado}/v/1198/p/last%201'], 'sidra', 1),
-    'area_territorial': (['https://apisidra.ibge.gov.br/values/t/1301/n6/{municipio}/v/616/p/last%201'], 'sidra', 1),
-    'industria': (['https://apisidra.ibge.gov.br/values/t/5938/n6/{municipio}/v/518/p/last%201'], 'sidra', 1000),
-    'servicos': (['https://apisidra.ibge.gov.br/values/t/5938/n6/{municipio}/v/513/p/last%201'], 'sidra', 1000),
-    'agropecuaria': (['https://apisidra.ibge.gov.br/values/t/5938/n6/{municipio}/v/517/p/last%201'], 'sidra', 1000),
-    'emprego_formal': (['https://apisidra.ibge.gov.br/values/t/6413/n6/{municipio}/v/10441/p/last%201'], 'sidra', 1)
+    'populacao': (['{sidra}/values/t/6579/n6/{municipio}/v/9324/p/last%201'], 'sidra', 1),
+    'pib_total': (['{sidra}/values/t/5938/n6/{municipio}/v/37/p/last%201'], 'sidra', 1000),
+    'renda_mensal': (['{sidra}/values/t/7416/n3/{estado}/v/4705/p/last%201'], 'renda', 1),
+    'ipca_regional': (['{sidra}/values/t/7060/n7/{rm}/v/69/p/last%201'], 'sidra', 1),
+    'custo_construcao': (['{sidra}/values/t/2296/n3/{estado}/v/48/p/last%201'], 'sidra', 1),
+    'preco_venda': (['{sidra}/values/t/2296/n3/{estado}/v/1198/p/last%201'], 'sidra', 1),
+    'area_territorial': (['{sidra}/values/t/1301/n6/{municipio}/v/616/p/last%201'], 'sidra', 1),
+    'industria': (['{sidra}/values/t/5938/n6/{municipio}/v/518/p/last%201'], 'sidra', 1000),
+    'servicos': (['{sidra}/values/t/5938/n6/{municipio}/v/513/p/last%201'], 'sidra', 1000),
+    'agropecuaria': (['{sidra}/values/t/5938/n6/{municipio}/v/517/p/last%201'], 'sidra', 1000),
+    'emprego_formal': (['{sidra}/values/t/6413/n6/{municipio}/v/10441/p/last%201'], 'sidra', 1)
+}
+
+# Tabela, nível, território e variável de uma URL SIDRA (usado pelo histórico incremental)
+PADRAO_SIDRA = re.compile(r'/values/t/(\d+)/n(\d+)/([^/]+)/v/(\d+)/p/')
+
+# Campos derivados - formato: nome: (entradas, cálculo, formato da saída)
+DERIVADOS = {
+    'pib_per_capita': (('pib_total', 'populacao'), lambda d: d['pib_total'] / d['populacao'],
+                       lambda v: f"PIB per Capita: R$ {v:,.2f}"),
+    'mercado_potencial_anual': (('populacao', 'renda_mensal'), lambda d: d['populacao'] * d['renda_mensal'] * 12 * 0.7,
+                                lambda v: f"Potencial de Mercado: R$ {v/1000000000:,.2f} bilhões"),
+    'densidade_demografica': (('area_territorial', 'populacao'), lambda d: d['populacao'] / d['area_territorial'],
+                              lambda v: f"Densidade Demográfica: {v:,.1f} hab/km²"),
 }
 
+def _configurar_candidato(municipio, nome_uf=None, rm=None, coords=(None, None)) -> Dict[str, Any]:
+    municipio = int(municipio)
+    estado = municipio // 100000
+    uf = nome_uf or UF_POR_CODIGO.get(estado)
+    return {'municipio': municipio, 'estado': estado, 'uf': uf, 'rm': rm or RM_IPCA_POR_UF.get(uf), 'coords': coords}
+
+def carregar_candidatos(arquivo: Optional[str] = None, ufs: Optional[List[str]] = None) -> Dict[str, Dict[str, Any]]:
+    """Candidatos no formato de CONFIG, a partir de um arquivo CSV/JSON (colunas cidade, municipio e opcionalmente
+    uf, rm, latitude, longitude) ou da lista de municípios das UFs na API de localidades do IBGE"""
+    candidatos = {}
+
+    def registrar(nome, cfg):
+        chave = nome if nome not in candidatos else f"{nome} ({cfg['uf']})"  # homônimos em UFs diferentes
+        candidatos[chave] = cfg
+
+    if arquivo:
+        df = pd.read_json(arquivo) if arquivo.endswith('.json') else pd.read_csv(arquivo)
+        df = df.astype(object).where(df.notna(), None)
+        for linha in df.to_dict('records'):
+            coords = (linha.get('latitude'), linha.get('longitude'))
+            rm = str(int(float(linha['rm']))) if linha.get('rm') is not None else None
+            registrar(linha['cidade'], _configurar_candidato(linha['municipio'], linha.get('uf'), rm, coords))
+
+    codigos_uf = {sigla: codigo for codigo, sigla in UF_POR_CODIGO.items()}
+    for uf in ufs or []:
+        codigo = codigos_uf.get(str(uf).upper(), uf)
+        try:
+            resp = requests.get(f"{IBGE_SERVICOS_URL}/api/v1/localidades/estados/{codigo}/municipios", timeout=30)
+            municipios = resp.json() if resp.status_code == 200 else []
+        except Exception:
+            municipios = []
+        if not municipios:
+            print(f"⚠️ Sem municípios para a UF {uf}")
+        for municipio in municipios:
+            registrar(municipio['nome'], _configurar_candidato(municipio['id']))
+
+    return candidatos
+
+class LimitadorTaxa:
+    """Limite global de requisições por segundo, compartilhado entre threads"""
+    def __init__(self, req_por_segundo: float):
+        self.intervalo = 1.0 / req_por_segundo
+        self._proxima = time.monotonic()
+        self._lock = threading.Lock()
+
+    def aguardar(self) -> None:
+        with self._lock:
+            agora = time.monotonic()
+            espera = self._proxima - agora
+            self._proxima = max(agora, self._proxima) + self.intervalo
+        if espera > 0:
+            time.sleep(espera)
+
+class CheckpointColeta:
+    """Manifesto append-only (JSONL) com o status de cada (cidade, indicador): uma linha por resultado,
+    gravada assim que coletado. Ao reabrir, a última linha de cada célula prevalece."""
+    def __init__(self, arquivo: str):
+        self.arquivo = arquivo
+        self._lock = threading.Lock()
+        self.celulas: Dict[Tuple[str, str], Dict[str, Any]] = {}
+        if os.path.exists(arquivo):
+            with open(arquivo, 'r', encoding='utf-8') as f:
+                for linha in f:
+                    try:
+                        registro = json.loads(linha)
+                    except ValueError:
+                        continue  # linha truncada por interrupção do processo
+                    self.celulas[(registro['cidade'], registro['indicador'])] = registro
+
+    def concluido(self, cidade: str, indicador: str) -> bool:
+        return self.celulas.get((cidade, indicador), {}).get('status') == 'ok'
+
+    def valor(self, cidade: str, indicador: str) -> Optional[float]:
+        return self.celulas.get((cidade, indicador), {}).get('valor')
+
+    def registrar(self, cidade: str, indicador: str, valor: Optional[float]) -> None:
+        with self._lock:
+            anterior = self.celulas.get((cidade, indicador), {})
+            registro = {'cidade': cidade, 'indicador': indicador, 'status': 'ok' if valor is not None else 'falha',
+                        'valor': valor, 'tentativas': anterior.get('tentativas', 0) + 1,
+                        'atualizado_em': datetime.now().strftime('%Y-%m-%d %H:%M:%S')}
+            self.celulas[(cidade, indicador)] = registro
+            with open(self.arquivo, 'a', encoding='utf-8') as f:
+                f.write(json.dumps(registro, ensure_ascii=False) + "\n")
+
+    def pendentes(self, cidades: List[str], indicadores: List[str]) -> List[Tuple[str, str]]:
+        return [(c, i) for c in cidades for i in indicadores if not self.concluido(c, i)]
+
+    def remover(self) -> None:
+        with self._lock:
+            self.celulas.clear()
+            if os.path.exists(self.arquivo):
+                os.remove(self.arquivo)
+
 class ColetorUltraOtimizado:
-    def __init__(self):
+    def __init__(self, req_por_segundo: Optional[float] = None, conexoes_por_host: int = 4,
+                 candidatos: Optional[Dict[str, Dict[str, Any]]] = None, checkpoint: Optional[CheckpointColeta] = None):
+        self.candidatos = candidatos or CONFIG
+        self.checkpoint = checkpoint
         self.session = requests.Session()
         self.session.headers.update({'User-Agent': 'Magalu-Ultra/1.0', 'Accept': 'application/json'})
+        # Pool bloqueante: no máximo `conexoes_por_host` conexões simultâneas por host
+        adaptador = requests.adapters.HTTPAdapter(pool_maxsize=conexoes_por_host, pool_block=True)
+        self.session.mount('https://', adaptador)
+        self.session.mount('http://', adaptador)
+        self.limitador = LimitadorTaxa(req_por_segundo) if req_por_segundo else None
         self.timeout = 12
+        self._historico = None
+
+    def historico(self) -> HistoricoSidra:
+        """Histórico local incremental: só períodos mais novos que os armazenados são baixados"""
+        diretorio = os.path.join(DATASETS_DIR, 'historico_ibge')
+        atual = self._historico
+        if atual is None or (atual.diretorio, atual.sidra_url, atual.servicos_url) != (diretorio, SIDRA_URL, IBGE_SERVICOS_URL):
+            self._historico = HistoricoSidra(diretorio, buscar=self.fetch_api, sidra_url=SIDRA_URL, servicos_url=IBGE_SERVICOS_URL)
+        return self._historico
 
     def fetch_api(self, url: str) -> Optional[Any]:
         """Método unificado para todas as chamadas de API com retry automático"""
         for tentativa in range(3):
+            if self.limitador:
+                self.limitador.aguardar()
             try:
                 resp = self.session.get(url, timeout=self.timeout)
                 if resp.status_code == 200:
@@ -59,49 +201,39 @@ class ColetorUltraOtimizado:
                 time.sleep(0.8 * (tentativa + 1))
         return None
 
-    def parse_universal(self, data: Any, parser_tipo: str, multiplicador: float = 1) -> Optional[float]:
-        """Parser unificado inteligente para todos os formatos de resposta"""
-        if not data:
+    def parse_universal(self, data: Any, parser_tipo: str, multiplicador: float = 1,
+                        variavel: Optional[str] = None) -> Optional[float]:
+        """Parser unificado: decodifica a resposta (qualquer formato IBGE) e seleciona o valor válido mais recente,
+        opcionalmente de uma variável de uma resposta com várias"""
+        ultimo = ultimo_valido(decodificar(data), variavel=variavel)
+        if ultimo is None:
             return None
-        try:
-            # SIDRA padrão - busca valor em estruturas aninhadas
-            if parser_tipo == 'sidra':
-                if isinstance(data, list):
-                    # Formato lista com cabeçalho
-                    for item in data[1:] if len(data) > 1 else data:
-                        if isinstance(item, dict):
-                            valor = item.get('V')
-                            if valor and valor not in ['...', '-', '']:
-                                return float(valor) * multiplicador
-                    # Formato servicodados com séries
-                    for item in data:
-                        if isinstance(item, dict):
-                            # Busca em série
-                            if 'serie' in item and isinstance(item['serie'], dict):
-                                for periodo in sorted(item['serie'].keys(), reverse=True):
-                                    valor = item['serie'][periodo]
-                                    if valor and valor not in ['...', '-', '']:
-                                        return float(valor) * multiplicador
-                            # Busca em resultados
-                            if 'resultados' in item:
-                                for resultado in item['resultados']:
-                                    for serie_obj in resultado.get('series', []):
-                                        serie_data = serie_obj.get('serie', {})
-                                        for periodo in sorted(serie_data.keys(), reverse=True):
-                                            valor = serie_data[periodo]
-                                            if valor and valor not in ['...', '-', '']:
-                                                return float(valor) * multiplicador
-            
-            # Renda - converte domiciliar para individual
-            elif parser_tipo == 'renda':
-                if isinstance(data, list) and len(data) > 1:
-                    for item in data[1:]:
-                        valor = item.get('V')
-                        if valor and valor not in ['...', '-', '']:
-                            return float(valor) * 2.1  # Fator de conversão domiciliar
-        except Exception:
-            pass
-        return None
+        # Renda - converte domiciliar para individual
+        return ultimo[1] * (2.1 if parser_tipo == 'renda' else multiplicador)
+
+    def _exibir(self, nome: str, valor: float) -> None:
+        """Formatar saída conforme o tipo"""
+        if nome == 'populacao':
+            print(f"✅ População: {valor:,.0f} hab")
+        elif nome == 'pib_total':
+            print(f"✅ PIB Total: R$ {valor/1000000000:,.2f} bilhões")
+        elif nome == 'renda_mensal':
+            print(f"✅ Renda Mensal: R$ {valor:,.0f}")
+        elif nome == 'ipca_regional':
+            print(f"✅ IPCA Regional: {valor:.2f}%")
+        elif nome == 'custo_construcao':
+            print(f"✅ Custo Construção/m²: R$ {valor:,.2f}")
+        elif nome == 'preco_venda':
+            print(f"✅ Preço Venda/m²: R$ {valor:,.2f}")
+        elif nome == 'area_territorial':
+            print(f"✅ Área Territorial: {valor:,.2f} km²")
+        elif nome in ['industria', 'servicos', 'agropecuaria']:
+            if valor >= 1000000000:
+                print(f"✅ {nome.title()}: R$ {valor/1000000000:,.2f} bilhões")
+            else:
+                print(f"✅ {nome.title()}: R$ {valor/1000000:,.1f} milhões")
+        elif nome == 'emprego_formal':
+            print(f"✅ Emprego Formal: {valor:,.0f} postos")
 
     def coletar_indicador(self, nome: str, contexto: Dict[str, Any]) -> Optional[float]:
         """Coleta um indicador específico usando configuração unificada"""
@@ -111,92 +243,267 @@ class ColetorUltraOtimizado:
         urls, parser, multiplicador = APIS[nome]
         for url_template in urls:
             try:
-                url = url_template.format(**contexto)
-                data = self.fetch_api(url)
-                valor = self.parse_universal(data, parser, multiplicador)
+                url = url_template.format(sidra=SIDRA_URL, **contexto)
+                sidra = PADRAO_SIDRA.search(url)
+                if sidra:
+                    ultimo = self.historico().ultimo_valor(*sidra.groups())
+                    valor = ultimo[1] * (2.1 if parser == 'renda' else multiplicador) if ultimo else None
+                else:
+                    valor = self.parse_universal(self.fetch_api(url), parser, multiplicador)
                 if valor is not None:
-                    # Formatar saída conforme o tipo
-                    if nome == 'populacao':
-                        print(f"✅ População: {valor:,.0f} hab")
-                    elif nome == 'pib_total':
-                        print(f"✅ PIB Total: R$ {valor/1000000000:,.2f} bilhões")
-                    elif nome == 'renda_mensal':
-                        print(f"✅ Renda Mensal: R$ {valor:,.0f}")
-                    elif nome == 'ipca_regional':
-                        print(f"✅ IPCA Regional: {valor:.2f}%")
-                    elif nome == 'custo_construcao':
-                        print(f"✅ Custo Construção/m²: R$ {valor:,.2f}")
-                    elif nome == 'preco_venda':
-                        print(f"✅ Preço Venda/m²: R$ {valor:,.2f}")
-                    elif nome == 'area_territorial':
-                        print(f"✅ Área Territorial: {valor:,.2f} km²")
-                    elif nome in ['industria', 'servicos', 'agropecuaria']:
-                        if valor >= 1000000000:
-                            print(f"✅ {nome.title()}: R$ {valor/1000000000:,.2f} bilhões")
-                        else:
-                            print(f"✅ {nome.title()}: R$ {valor/1000000:,.1f} milhões")
-                    elif nome == 'emprego_formal':
-                        print(f"✅ Emprego Formal: {valor:,.0f} postos")
+                    self._exibir(nome, valor)
                     return valor
             except KeyError:
                 continue
             time.sleep(0.3)
         return None
 
+    def agrupar_indicadores(self, contexto: Dict[str, Any]) -> List[Tuple[Optional[Tuple[str, str, str]], List[str]]]:
+        """Agrupa indicadores pela mesma tabela/nível/território: uma requisição SIDRA por grupo"""
+        grupos: Dict[Any, List[str]] = {}
+        for nome, (urls, _, _) in APIS.items():
+            sidra = PADRAO_SIDRA.search(urls[0].format(sidra=SIDRA_URL, **contexto))
+            # URLs fora do padrão SIDRA ficam sob a chave None e são coletadas uma a uma
+            grupos.setdefault(sidra.groups()[:3] if sidra else None, []).append(nome)
+        return list(grupos.items())
+
+    def coletar_grupo(self, chave: Optional[Tuple[str, str, str]], nomes: List[str],
+                      contexto: Dict[str, Any]) -> Dict[str, Optional[float]]:
+        """Uma requisição com todas as variáveis do grupo; o histórico separa os valores por variável"""
+        if chave is None:
+            return {nome: self.coletar_indicador(nome, contexto) for nome in nomes}
+        
+        tabela, nivel, territorio = chave
+        variaveis = {nome: PADRAO_SIDRA.search(APIS[nome][0][0].format(sidra=SIDRA_URL, **contexto)).group(4)
+                     for nome in nomes}
+        historico = self.historico()
+        historico.atualizar(tabela, nivel, [territorio], list(variaveis.values()))
+        
+        resultado = {}
+        for nome, variavel in variaveis.items():
+            _, parser, multiplicador = APIS[nome]
+            ultimo = historico.ultimo_valor(tabela, nivel, territorio, variavel, atualizar=False)
+            resultado[nome] = ultimo[1] * (2.1 if parser == 'renda' else multiplicador) if ultimo else None
+            if resultado[nome] is not None:
+                self._exibir(nome, resultado[nome])
+        return resultado
+
+    def coletar_pendentes(self, cidade: str, chave: Optional[Tuple[str, str, str]], nomes: List[str],
+                          contexto: Dict[str, Any]) -> Dict[str, Optional[float]]:
+        """Reaproveita as células já concluídas no checkpoint e coleta só o restante do grupo"""
+        if self.checkpoint is None:
+            return self.coletar_grupo(chave, nomes, contexto)
+        
+        dados = {nome: self.checkpoint.valor(cidade, nome) for nome in nomes if self.checkpoint.concluido(cidade, nome)}
+        if dados:
+            print(f"♻️ [{cidade}] {', '.join(dados)}: retomado(s) do checkpoint")
+        pendentes = [nome for nome in nomes if nome not in dados]
+        if pendentes:
+            for nome, valor in self.coletar_grupo(chave, pendentes, contexto).items():
+                self.checkpoint.registrar(cidade, nome, valor)
+                dados[nome] = valor
+        return dados
+
+    def coletar_serie(self, nome: str, contexto: Dict[str, Any]) -> Optional[pd.Series]:
+        """Série temporal de um indicador (índice = período), a partir do histórico local"""
+        urls, parser, multiplicador = APIS[nome]
+        sidra = PADRAO_SIDRA.search(urls[0].format(sidra=SIDRA_URL, **contexto))
+        if not sidra:
+            return None
+        return self.historico().serie(*sidra.groups()) * (2.1 if parser == 'renda' else multiplicador)
+
+    def _calcular_derivados(self, dados: Dict[str, Any], prefixo: str = '') -> None:
+        """Calcula cada campo derivado uma única vez, assim que suas entradas estiverem disponíveis"""
+        for campo, (entradas, calculo, formato) in DERIVADOS.items():
+            if campo not in dados and all(dados.get(e) for e in entradas):
+                dados[campo] = calculo(dados)
+                print(f"✅ {prefixo}{formato(dados[campo])}")
+
+    def _contexto(self, cidade: str) -> Dict[str, Any]:
+        cfg = self.candidatos[cidade]
+        return {'municipio': cfg['municipio'], 'estado': cfg['estado'], 'rm': cfg['rm']}
+
+    def _metadados(self, cidade: str) -> Dict[str, Any]:
+        cfg = self.candidatos[cidade]
+        return {
+            'cidade': cidade, 'uf': cfg['uf'], 'codigo_municipio': cfg['municipio'],
+            'codigo_estado': cfg['estado'], 'regiao_metropolitana': cfg['rm'],
+            'latitude': cfg['coords'][0], 'longitude': cfg['coords'][1],
+            'data_coleta': datetime.now().strftime('%Y-%m-%d %H:%M:%S'),
+            'fonte_dados': 'IBGE Oficiais'
+        }
+
+    def _finalizar_cidade(self, cidade: str, dados: Dict[str, Any]) -> Dict[str, Any]:
+        """Ordena colunas (base, derivados, metadados) independente da ordem de chegada"""
+        registro = {k: dados.get(k) for k in APIS}
+        registro.update({k: dados.get(k) for k in DERIVADOS})  # colunas estáveis mesmo com falhas
+        registro.update(self._metadados(cidade))
+        
+        formatar = lambda campo: f"{registro[campo]:,.0f}" if registro.get(campo) is not None else "n/d"
+        print(f"✅ {cidade}: Pop {formatar('populacao')} | PIB/cap R${formatar('pib_per_capita')} | Renda R${formatar('renda_mensal')}")
+        
+        return registro
+
     def processar_cidade(self, cidade: str) -> Dict[str, Any]:
         """Processa uma cidade completa com todos os indicadores"""
-        cfg = CONFIG[cidade]
-        contexto = {'municipio': cfg['municipio'], 'estado': cfg['estado'], 'rm': cfg['rm']}
+        contexto = self._contexto(cidade)
         
-        print(f"\n📊 Processando {cidade} (Código IBGE: {cfg['municipio']})")
+        print(f"\n📊 Processando {cidade} (Código IBGE: {contexto['municipio']})")
         
-        # Coleta todos os indicadores base
-        dados = {f'{k}': self.coletar_indicador(k, contexto) for k in APIS.keys()}
+        # Coleta todos os indicadores base (uma requisição por tabela/território)
+        dados = {}
+        for chave, nomes in self.agrupar_indicadores(contexto):
+            dados.update(self.coletar_pendentes(cidade, chave, nomes, contexto))
         
         # Cálculos derivados
-        if dados['pib_total'] and dados['populacao']:
-            dados['pib_per_capita'] = dados['pib_total'] / dados['populacao']
-            print(f"✅ PIB per Capita: R$ {dados['pib_per_capita']:,.2f}")
+        self._calcular_derivados(dados)
         
-        if dados['populacao'] and dados['renda_mensal']:
-            dados['mercado_potencial_anual'] = dados['populacao'] * dados['renda_mensal'] * 12 * 0.7
-            print(f"✅ Potencial de Mercado: R$ {dados['mercado_potencial_anual']/1000000000:,.2f} bilhões")
+        return self._finalizar_cidade(cidade, dados)
+
+    def processar_cidades_paralelo(self, cidades: List[str], max_workers: int = 8) -> List[Dict[str, Any]]:
+        """Coleta todos os indicadores de todas as cidades em paralelo (limite global de taxa no fetch_api)"""
+        self.historico()  # cria o histórico antes de disparar as threads
+        dados = {cidade: {} for cidade in cidades}
         
-        if dados['area_territorial'] and dados['populacao']:
-            dados['densidade_demografica'] = dados['populacao'] / dados['area_territorial']
-            print(f"✅ Densidade Demográfica: {dados['densidade_demografica']:,.1f} hab/km²")
+        with ThreadPoolExecutor(max_workers=max_workers) as executor:
+            tarefas = {}
+            for cidade in cidades:
+                contexto = self._contexto(cidade)
+                for chave, nomes in self.agrupar_indicadores(contexto):
+                    tarefas[executor.submit(self.coletar_pendentes, cidade, chave, nomes, contexto)] = cidade
+            
+            for futuro in as_completed(tarefas):
+                cidade = tarefas[futuro]
+                dados[cidade].update(futuro.result())
+                self._calcular_derivados(dados[cidade], prefixo=f"[{cidade}] ")
         
-        # Metadados
-        dados.update({
-            'cidade': cidade, 'uf': cfg['uf'], 'codigo_municipio': cfg['municipio'],
-            'codigo_estado': cfg['estado'], 'regiao_metropolitana': cfg['rm'],
-            'latitude': cfg['coords'][0], 'longitude': cfg['coords'][1],
-            'data_coleta': datetime.now().strftime('%Y-%m-%d %H:%M:%S'),
-            'fonte_dados': 'IBGE Oficiais'
-        })
+        return [self._finalizar_cidade(cidade, dados[cidade]) for cidade in cidades]
+
+    @staticmethod
+    def _chave_lote(tarefa) -> Tuple[str, str]:
+        """Célula do checkpoint de um lote: (territórios do lote, tabela/nível)"""
+        tabela, nivel, codigos, _ = tarefa
+        return f"{codigos[0]}..{codigos[-1]} ({len(codigos)})", f"t{tabela}_n{nivel}"
+
+    def coletar_lotes(self, tamanho_lote: int = TAMANHO_LOTE_SIDRA, max_workers: int = 1) -> pd.DataFrame:
+        """Coleta todos os candidatos com requisições SIDRA em lote: cada requisição cobre até `tamanho_lote`
+        territórios e todas as variáveis da tabela, então o total de requisições cresce com o número de lotes"""
+        cidades = list(self.candidatos)
+        historico = self.historico()
         
-        print(f"✅ {cidade}: Pop {dados['populacao']:,.0f} | PIB/cap R${dados['pib_per_capita']:,.0f} | Renda R${dados['renda_mensal']:,.0f}")
+        # Grupos (tabela, nível, campo de território) -> {indicador: variável}
+        grupos: Dict[Tuple[str, str, str], Dict[str, str]] = {}
+        for nome, (urls, _, _) in APIS.items():
+            sidra = PADRAO_SIDRA.search(urls[0])
+            if sidra:
+                tabela, nivel, territorio, variavel = sidra.groups()
+                grupos.setdefault((tabela, nivel, territorio.strip('{}')), {})[nome] = variavel
         
-        return dados
+        territorios = {campo: pd.Series([self.candidatos[c][campo] for c in cidades], index=cidades, dtype=object)
+                       for campo in {campo for _, _, campo in grupos}}
+        tarefas = []
+        for (tabela, nivel, campo), variaveis in grupos.items():
+            codigos = sorted({str(t) for t in territorios[campo].dropna()})
+            for i in range(0, len(codigos), tamanho_lote):
+                tarefas.append((tabela, nivel, codigos[i:i + tamanho_lote], list(variaveis.values())))
+        print(f"📦 {len(cidades)} candidatos | {len(tarefas)} requisições em lote ({tamanho_lote} territórios por lote)")
+        
+        # Checkpoint por lote: retomada após interrupção não repete lotes concluídos
+        if self.checkpoint is not None:
+            concluidos = [tarefa for tarefa in tarefas if self.checkpoint.concluido(*self._chave_lote(tarefa))]
+            if concluidos:
+                print(f"♻️ {len(concluidos)}/{len(tarefas)} lotes retomados do checkpoint")
+                tarefas = [tarefa for tarefa in tarefas if tarefa not in concluidos]
+        
+        def atualizar_lote(tarefa):
+            linhas = historico.atualizar(*tarefa)
+            if self.checkpoint is not None:
+                self.checkpoint.registrar(*self._chave_lote(tarefa), linhas)
+        
+        with ThreadPoolExecutor(max_workers=max_workers) as executor:
+            list(executor.map(atualizar_lote, tarefas))
+        
+        # Último valor válido por território/variável, alinhado aos candidatos
+        df = pd.DataFrame(index=pd.Index(cidades, name='cidade'))
+        for (tabela, nivel, campo), variaveis in grupos.items():
+            valores = historico.carregar(tabela, nivel).dropna(subset=['valor'])
+            ultimos = valores.sort_values('periodo').groupby(['variavel', 'territorio'])['valor'].last()
+            chaves = territorios[campo].map(lambda t: str(t) if t is not None else None)
+            for nome, variavel in variaveis.items():
+                _, parser, multiplicador = APIS[nome]
+                serie = ultimos.xs(variavel) if variavel in ultimos.index.get_level_values(0) else pd.Series(dtype=float)
+                df[nome] = chaves.map(serie).astype(float) * (2.1 if parser == 'renda' else multiplicador)
+        
+        df = df[[nome for nome in APIS if nome in df]]
+        for nome in APIS:
+            if nome not in df:  # URLs fora do padrão SIDRA: coleta individual
+                df[nome] = [self.coletar_pendentes(c, None, [nome], self._contexto(c))[nome] for c in cidades]
+        for campo, (entradas, calculo, _) in DERIVADOS.items():
+            df[campo] = calculo(df)
+        
+        metadados = pd.DataFrame([self._metadados(c) for c in cidades], index=df.index)
+        df = pd.concat([df, metadados.drop(columns='cidade')], axis=1).reset_index()
+        colunas = list(APIS) + list(DERIVADOS) + list(metadados.columns)
+        print(f"✅ {df['populacao'].notna().sum()}/{len(df)} candidatos com população | "
+              f"{df[list(APIS)].notna().mean().mean():.0%} dos indicadores preenchidos")
+        return df[colunas]
 
-def executar_coleta():
+def executar_coleta(paralelo: bool = False, max_workers: int = 8, req_por_segundo: float = 10.0, conexoes_por_host: int = 4,
+                    candidatos: Optional[Dict[str, Dict[str, Any]]] = None, lote: bool = False,
+                    tamanho_lote: int = TAMANHO_LOTE_SIDRA, retomar: bool = True):
     """Função principal ultra-compacta"""
+    candidatos = candidatos or CONFIG
     print("=" * 80)
     print("🚀 Coletor Ultra-Otimizado - Dados Custos Imobiliários")
     print("=" * 80)
     print(f"⏰ Início: {datetime.now().strftime('%d/%m/%Y %H:%M:%S')}")
     print("📡 Coletando dados imobiliários via APIs IBGE\n")
     
-    coletor = ColetorUltraOtimizado()
-    registros = []
-    
     print("📍 PROCESSANDO CIDADES:")
-    print(f"Analisando {len(CONFIG)} cidades para análise imobiliária...")
+    print(f"Analisando {len(candidatos)} cidades para análise imobiliária...")
+    
+    if lote:
+        # Muitos candidatos: requisições SIDRA em lote e saída colunar (Parquet), com checkpoint por lote
+        checkpoint = CheckpointColeta(os.path.join(DATASETS_DIR, 'checkpoint_custos_lotes.jsonl'))
+        if not retomar:
+            checkpoint.remover()
+        coletor = ColetorUltraOtimizado(req_por_segundo=req_por_segundo if paralelo else None,
+                                        conexoes_por_host=conexoes_por_host, candidatos=candidatos, checkpoint=checkpoint)
+        df = coletor.coletar_lotes(tamanho_lote, max_workers if paralelo else 1)
+        # Dataset próprio da triagem: não substitui a entrada da análise (dataset 'custos')
+        arquivo = gravar_dataset('custos_lotes', df, DATASETS_DIR, exportar_csv=False)
+        print(f"\n💾 Dataset: {arquivo}")
+        print(f"✅ {len(df)} cidades processadas | {len(df.columns)} colunas | APIs IBGE")
+        
+        falhas = [registro for registro in checkpoint.celulas.values() if registro['status'] != 'ok']
+        if falhas:
+            print(f"⚠️ {len(falhas)} lotes/células com falha (ex.: {falhas[0]['cidade']}/{falhas[0]['indicador']}); "
+                  f"execute novamente para coletar só estes ({checkpoint.arquivo})")
+        else:
+            checkpoint.remover()  # coleta completa: a próxima execução começa do zero
+        return arquivo
     
-    for cidade in CONFIG.keys():
-        dados = coletor.processar_cidade(cidade)
-        registros.append(dados)
-        time.sleep(0.8)
+    # Checkpoint por (cidade, indicador): reexecuções coletam apenas as células pendentes ou com falha
+    checkpoint = CheckpointColeta(os.path.join(DATASETS_DIR, 'checkpoint_custos.jsonl'))
+    if not retomar:
+        checkpoint.remover()
+    elif checkpoint.celulas:
+        pendentes = len(checkpoint.pendentes(list(candidatos), list(APIS)))
+        print(f"♻️ Retomando checkpoint: {len(candidatos) * len(APIS) - pendentes} células concluídas, {pendentes} pendentes")
+    
+    if paralelo:
+        # Todas as cidades e indicadores de uma vez, sob limite global de requisições/s
+        print(f"⚡ Modo paralelo: {max_workers} threads | {req_por_segundo} req/s | {conexoes_por_host} conexões por host")
+        coletor = ColetorUltraOtimizado(req_por_segundo=req_por_segundo, conexoes_por_host=conexoes_por_host,
+                                        candidatos=candidatos, checkpoint=checkpoint)
+        registros = coletor.processar_cidades_paralelo(list(candidatos.keys()), max_workers)
+    else:
+        coletor = ColetorUltraOtimizado(candidatos=candidatos, checkpoint=checkpoint)
+        registros = []
+        for cidade in candidatos.keys():
+            dados = coletor.processar_cidade(cidade)
+            registros.append(dados)
+            time.sleep(0.8)
     
     if not registros:
         print("❌ Erro: Nenhuma cidade processada")
@@ -204,13 +511,34 @@ def executar_coleta():
     
     # Gerar dataset
     df = pd.DataFrame(registros)
-    timestamp = datetime.now().strftime('%Y%m%d_%H%M')
-    arquivo = os.path.join(DATASETS_DIR, f'dataset_custos_imobiliario.csv')
-    df.to_csv(arquivo, index=False, encoding='utf-8-sig')
+    arquivo = gravar_dataset('custos', df, DATASETS_DIR)
     
     print(f"\n💾 Dataset: {arquivo}")
     print(f"✅ {len(registros)} cidades processadas | {len(df.columns)} colunas | APIs IBGE")
+    
+    pendentes = checkpoint.pendentes(list(candidatos), list(APIS))
+    if pendentes:
+        print(f"⚠️ {len(pendentes)} células sem valor (ex.: {pendentes[0][0]}/{pendentes[0][1]}); "
+              f"execute novamente para coletar só estas ({checkpoint.arquivo})")
+    else:
+        checkpoint.remover()  # coleta completa: a próxima execução começa do zero
     return arquivo
 
 if __name__ == '__main__':
-    executar_coleta()
\ No newline at end of file
+    import argparse
+    
+    parser = argparse.ArgumentParser(description="Coleta de custos imobiliários via APIs IBGE")
+    parser.add_argument('--paralelo', action='store_true', help='coleta todos os indicadores em paralelo')
+    parser.add_argument('--threads', type=int, default=8)
+    parser.add_argument('--req-por-segundo', type=float, default=10.0, help='limite global de requisições (modo paralelo)')
+    parser.add_argument('--conexoes-por-host', type=int, default=4)
+    parser.add_argument('--candidatos', help='arquivo CSV/JSON com cidade, municipio [, uf, rm, latitude, longitude]')
+    parser.add_argument('--ufs', nargs='+', help='todos os municípios destas UFs (API de localidades), ex.: BA PE')
+    parser.add_argument('--lote', action='store_true', help='requisições em lote e saída Parquet (padrão com --candidatos/--ufs)')
+    parser.add_argument('--tamanho-lote', type=int, default=TAMANHO_LOTE_SIDRA, help='territórios por requisição SIDRA')
+    parser.add_argument('--reiniciar', action='store_true', help='descarta o checkpoint e coleta todas as células')
+    args = parser.parse_args()
+    
+    candidatos = carregar_candidatos(args.candidatos, args.ufs) if (args.candidatos or args.ufs) else None
+    executar_coleta(args.paralelo, args.threads, args.req_por_segundo, args.conexoes_por_host,
+                    candidatos, args.lote or candidatos is not None, args.tamanho_lote, not args.reiniciar)
@@ -24,6 +24,8 @@ from typing import Dict, List, Tuple, Optional
 import sys
 from dotenv import load_dotenv
 
+from armazenamento_datasets import gravar_dataset
+
 # ==============================================================
 # CONFIGURAÇÕES GLOBAIS E CONSTANTES
 # ==============================================================
@@ -603,14 +605,13 @@ async def main_async():
     if todos_dados:
         df_consolidado = pd.concat(todos_dados, ignore_index=True)
         
-        # Salvar CSV consolidado
+        # Salvar dataset consolidado (Parquet tipado + CSV opcional)
         datasets_dir = CONFIG_MANAGER.get('diretorios', 'datasets')
-        arquivo_consolidado = os.path.join(datasets_dir, "dataset_rotas_nordeste.csv")
         try:
-            df_consolidado.to_csv(arquivo_consolidado, index=False)
-            logger.debug(f"💾 Arquivo CSV único salvo como: {arquivo_consolidado}")
+            arquivo_consolidado = gravar_dataset('rotas', df_consolidado, datasets_dir)
+            logger.debug(f"💾 Dataset consolidado salvo como: {arquivo_consolidado}")
         except Exception as e:
-            logger.error(f"❌ Erro ao salvar arquivo CSV: {e}")
+            logger.error(f"❌ Erro ao salvar dataset consolidado: {e}")
     else:
         logger.error("❌ Nenhum dado foi processado com sucesso")
 
@@ -0,0 +1,171 @@
+"""
+HISTÓRICO INCREMENTAL - SÉRIES IBGE
+
+Armazena localmente, em Parquet, o histórico de cada indicador SIDRA por tabela, variável, território e período.
+A cada execução consulta apenas a lista de períodos da tabela (metadados) e baixa somente os períodos posteriores
+ao último já consultado de cada território/variável (registrado à parte do último valor válido), permitindo séries
+temporais (PIB, IPCA, população...) com poucos KB transferidos.
+
+Autor: Lucas Abreu - lucasabreuzip
+GitBuh: https://github.com/lucasabreuzip
+Linkedin: https://www.linkedin.com/in/lucasabreuzip/
+Versão: 2.0
+Data: 09/2025
+"""
+
+import os
+import threading
+from typing import Any, Callable, Dict, Iterable, List, Optional, Tuple
+
+import pandas as pd
+import requests
+
+from sidra_decoder import decodificar, vazio
+
+SIDRA_URL = os.getenv('SIDRA_URL', 'https://apisidra.ibge.gov.br')
+IBGE_SERVICOS_URL = os.getenv('IBGE_SERVICOS_URL', 'https://servicodados.ibge.gov.br')
+
+HISTORICO_DIR = os.path.join("datasets_gerados", "historico_ibge")
+PERIODOS_POR_REQUISICAO = 40
+
+def _buscar_json(url: str, timeout: int = 20) -> Optional[Any]:
+    try:
+        resp = requests.get(url, timeout=timeout)
+        if resp.status_code == 200:
+            return resp.json()
+    except Exception:
+        pass
+    return None
+
+class HistoricoSidra:
+
+    def __init__(self, diretorio: str = HISTORICO_DIR, buscar: Callable[[str], Optional[Any]] = _buscar_json,
+                 sidra_url: Optional[str] = None, servicos_url: Optional[str] = None):
+        self.diretorio = diretorio
+        self.buscar = buscar
+        self.sidra_url = sidra_url or SIDRA_URL
+        self.servicos_url = servicos_url or IBGE_SERVICOS_URL
+        self._periodos: Dict[str, List[str]] = {}
+        self._locks_periodos: Dict[str, threading.Lock] = {}
+        self._lock = threading.Lock()
+        os.makedirs(diretorio, exist_ok=True)
+
+    def _arquivo(self, tabela, nivel) -> str:
+        return os.path.join(self.diretorio, f"t{tabela}_n{nivel}.parquet")
+
+    def carregar(self, tabela, nivel) -> pd.DataFrame:
+        arquivo = self._arquivo(tabela, nivel)
+        if not os.path.exists(arquivo):
+            return vazio()
+        return pd.read_parquet(arquivo)
+
+    def _gravar(self, tabela, nivel, df: pd.DataFrame) -> None:
+        arquivo = self._arquivo(tabela, nivel)
+        temporario = arquivo + ".tmp"
+        df.to_parquet(temporario, index=False)
+        os.replace(temporario, arquivo)
+
+    #Períodos publicados da tabela (metadados do agregado, poucos KB); cacheado por execução
+    def periodos_disponiveis(self, tabela) -> Optional[List[str]]:
+        tabela = str(tabela)
+        with self._lock:
+            lock_tabela = self._locks_periodos.setdefault(tabela, threading.Lock())
+        with lock_tabela:  # threads concorrentes na mesma tabela fazem uma única consulta
+            if tabela not in self._periodos:
+                data = self.buscar(f"{self.servicos_url}/api/v3/agregados/{tabela}/periodos")
+                if not isinstance(data, list):
+                    return None
+                self._periodos[tabela] = sorted(str(p['id']) for p in data if 'id' in p)
+        return self._periodos[tabela]
+
+    #Último período com valor válido para cada (territorio, variavel) já armazenado
+    def _ultimos_validos(self, df: pd.DataFrame) -> Dict[Tuple[str, str], str]:
+        validos = df.dropna(subset=['valor'])
+        return validos.groupby(['territorio', 'variavel'])['periodo'].max().to_dict()
+
+    def _arquivo_verificados(self, tabela, nivel) -> str:
+        return os.path.join(self.diretorio, f"t{tabela}_n{nivel}_verificados.parquet")
+
+    #Último período já consultado para cada (territorio, variavel), tenha vindo valor válido ou não
+    def _verificados(self, tabela, nivel) -> Dict[Tuple[str, str], str]:
+        arquivo = self._arquivo_verificados(tabela, nivel)
+        if not os.path.exists(arquivo):
+            return {}
+        df = pd.read_parquet(arquivo)
+        return dict(zip(zip(df['territorio'], df['variavel']), df['periodo']))
+
+    def _gravar_verificados(self, tabela, nivel, verificados: Dict[Tuple[str, str], str]) -> None:
+        arquivo = self._arquivo_verificados(tabela, nivel)
+        df = pd.DataFrame([(t, v, p) for (t, v), p in sorted(verificados.items())],
+                          columns=['territorio', 'variavel', 'periodo'])
+        temporario = arquivo + ".tmp"
+        df.to_parquet(temporario, index=False)
+        os.replace(temporario, arquivo)
+
+    def atualizar(self, tabela, nivel, territorios: Iterable, variaveis: Iterable) -> Optional[int]:
+        """Baixa, por território/variável, apenas os períodos posteriores ao último já consultado e os anexa.
+        Retorna linhas novas, ou None se alguma requisição falhou (o que faltou fica para a próxima execução)."""
+        territorios = [str(t) for t in territorios]
+        variaveis = [str(v) for v in variaveis]
+
+        with self._lock:
+            historico = self.carregar(tabela, nivel)
+            verificados = self._verificados(tabela, nivel)
+        ultimos = self._ultimos_validos(historico)
+        # Corte por chave: último período consultado (históricos anteriores a este registro: último valor válido).
+        # Chaves com o mesmo corte compartilham as requisições; chave nova ou sem dados não arrasta as demais
+        grupos: Dict[str, List[Tuple[str, str]]] = {}
+        for chave in ((t, v) for t in territorios for v in variaveis):
+            grupos.setdefault(verificados.get(chave, ultimos.get(chave, '')), []).append(chave)
+
+        disponiveis = self.periodos_disponiveis(tabela)
+        novos, consultados, falhou = [], {}, False
+        for corte, chaves in sorted(grupos.items()):
+            if disponiveis is None:
+                faltantes = ['last 1'] if not corte else []  # sem metadados: só o mais recente na primeira vez
+            else:
+                faltantes = [p for p in disponiveis if p > corte]
+            grupo_territorios = list(dict.fromkeys(t for t, _ in chaves))
+            grupo_variaveis = list(dict.fromkeys(v for _, v in chaves))
+            for i in range(0, len(faltantes), PERIODOS_POR_REQUISICAO):
+                bloco = faltantes[i:i + PERIODOS_POR_REQUISICAO]
+                url = (f"{self.sidra_url}/values/t/{tabela}/n{nivel}/{','.join(grupo_territorios)}"
+                       f"/v/{','.join(grupo_variaveis)}/p/{','.join(bloco).replace(' ', '%20')}")
+                data = self.buscar(url)
+                if data is None:
+                    falhou = True
+                    break  # este bloco e os seguintes ficam para a próxima execução
+                novos.append(decodificar(data))
+                if disponiveis is not None:
+                    consultados.update((chave, bloco[-1]) for chave in chaves)
+
+        novos = pd.concat(novos, ignore_index=True) if novos else vazio()
+        if novos.empty and not consultados:
+            return None if falhou else 0
+
+        with self._lock:
+            if not novos.empty:
+                historico = self.carregar(tabela, nivel)
+                combinado = pd.concat([historico, novos], ignore_index=True) if not historico.empty else novos
+                combinado = (combinado.drop_duplicates(subset=['territorio', 'variavel', 'periodo'], keep='last')
+                                      .sort_values(['territorio', 'variavel', 'periodo'], ignore_index=True))
+                self._gravar(tabela, nivel, combinado)
+            if consultados:
+                # Relido sob o lock: lotes concorrentes da mesma tabela gravam o mesmo registro
+                self._gravar_verificados(tabela, nivel, {**self._verificados(tabela, nivel), **consultados})
+        return None if falhou else len(novos)
+
+    #Série temporal de um indicador/território (índice = período)
+    def serie(self, tabela, nivel, territorio, variavel, atualizar: bool = True) -> pd.Series:
+        if atualizar:
+            self.atualizar(tabela, nivel, [territorio], [variavel])
+        df = self.carregar(tabela, nivel)
+        df = df[(df['territorio'] == str(territorio)) & (df['variavel'] == str(variavel))]
+        return pd.Series(df['valor'].to_numpy(), index=pd.Index(df['periodo'], name='periodo'), name=f"t{tabela}_v{variavel}")
+
+    #Valor mais recente disponível: (periodo, valor) ou None
+    def ultimo_valor(self, tabela, nivel, territorio, variavel, atualizar: bool = True) -> Optional[Tuple[str, float]]:
+        serie = self.serie(tabela, nivel, territorio, variavel, atualizar).dropna()
+        if serie.empty:
+            return None
+        return serie.index[-1], float(serie.iloc[-1])
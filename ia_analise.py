@@ -14,113 +14,674 @@ Data: 09/2025
 import pandas as pd
 import numpy as np
 from pathlib import Path
-from typing import Dict, List, Any
-from dataclasses import dataclass
+from typing import Dict, List, Any, Optional, Callable, Tuple
+from dataclasses import dataclass, field, asdict
 import warnings
 from datetime import datetime
 import json
-# Machine Learning
-from sklearn.tree import DecisionTreeRegressor
-from sklearn.preprocessing import MinMaxScaler, StandardScaler, RobustScaler
-from sklearn.neural_network import MLPRegressor
-from sklearn.ensemble import RandomForestRegressor, GradientBoostingRegressor
-from sklearn.model_selection import cross_val_score
-# Fuzzy Logic
-import skfuzzy as fuzz
-from skfuzzy import control as ctrl
-# Otimização
-from scipy.optimize import differential_evolution
+import hashlib
+import inspect
+import os
+import importlib
+import time
+import tracemalloc
+import contextlib
+from importlib import metadata
+from functools import cached_property
+from matriz_distancias import CAPITAIS_ESTADOS, MatrizDistancias  # só numpy/pandas, sem efeitos na importação
+# Machine Learning (scikit-learn, joblib), Fuzzy Logic (scikit-fuzzy) e Otimização (scipy) são importados
+# sob demanda nas etapas que os usam: carregar um resultado ou rodar só custos não paga pela pilha de ML
 
 warnings.filterwarnings('ignore')
 
+CIDADES = ['Recife', 'Salvador']  # candidatos padrão
+ESTADO_POR_UF = {'AC': 'Acre', 'AL': 'Alagoas', 'AP': 'Amapá', 'AM': 'Amazonas', 'BA': 'Bahia', 'CE': 'Ceará',
+                 'DF': 'Distrito Federal', 'ES': 'Espírito Santo', 'GO': 'Goiás', 'MA': 'Maranhão', 'MT': 'Mato Grosso',
+                 'MS': 'Mato Grosso do Sul', 'MG': 'Minas Gerais', 'PA': 'Pará', 'PB': 'Paraíba', 'PR': 'Paraná',
+                 'PE': 'Pernambuco', 'PI': 'Piauí', 'RJ': 'Rio de Janeiro', 'RN': 'Rio Grande do Norte',
+                 'RS': 'Rio Grande do Sul', 'RO': 'Rondônia', 'RR': 'Roraima', 'SC': 'Santa Catarina', 'SP': 'São Paulo',
+                 'SE': 'Sergipe', 'TO': 'Tocantins'}
+
+# Colunas do feature store usadas pelo ensemble, na ordem das features do modelo
+FEATURES_ML = ['custo_construcao', 'pib_per_capita', 'populacao', 'mercado_potencial_anual', 'densidade_demografica',
+               'distancia_media', 'distancia_std', 'tempo_medio', 'custo_logistica_medio', 'num_rotas',
+               'populacao_500km', 'consumo_500km']
+
+# Sistema fuzzy logístico: universos, funções de pertinência triangulares e regras Mamdani
+FUZZY_UNIVERSOS = {
+    'distancia': np.arange(0, 1500, 1),
+    'tempo': np.arange(0, 25, 0.1),
+    'custo': np.arange(0, 1500, 1),
+    'eficiencia': np.arange(0, 101, 1),
+}
+FUZZY_TERMOS = {
+    #Membership functions mais sensíveis
+    'distancia': {'excelente': [0, 150, 350], 'boa': [300, 500, 700], 'regular': [650, 850, 1050], 'ruim': [1000, 1250, 1500]},
+    'tempo': {'muito_rapido': [0, 0, 4], 'rapido': [3, 6, 9], 'medio': [8, 12, 16], 'lento': [15, 20, 25]},
+    'custo': {'muito_baixo': [0, 0, 250], 'baixo': [200, 400, 600], 'medio': [550, 750, 950], 'alto': [900, 1200, 1500]},
+    'eficiencia': {'muito_baixa': [0, 0, 20], 'baixa': [15, 30, 45], 'media': [40, 55, 70], 'alta': [65, 80, 90],
+                   'muito_alta': [85, 100, 100]},
+}
+#Regras mais detalhadas - formato: (operador, antecedentes, termo de eficiência)
+FUZZY_REGRAS = [
+    ('e', [('distancia', 'excelente'), ('tempo', 'muito_rapido'), ('custo', 'muito_baixo')], 'muito_alta'),
+    ('e', [('distancia', 'excelente'), ('tempo', 'rapido'), ('custo', 'baixo')], 'alta'),
+    ('e', [('distancia', 'excelente'), ('custo', 'baixo')], 'alta'),
+    ('e', [('distancia', 'boa'), ('tempo', 'rapido'), ('custo', 'baixo')], 'alta'),
+    ('e', [('distancia', 'boa'), ('tempo', 'medio'), ('custo', 'medio')], 'media'),
+    ('e', [('distancia', 'boa'), ('custo', 'muito_baixo')], 'alta'),
+    ('e', [('distancia', 'regular'), ('tempo', 'medio')], 'media'),
+    ('e', [('distancia', 'regular'), ('custo', 'alto')], 'baixa'),
+    ('e', [('distancia', 'ruim'), ('tempo', 'lento')], 'muito_baixa'),
+    ('ou', [('distancia', 'ruim'), ('custo', 'alto')], 'baixa'),
+    ('e', [('tempo', 'lento'), ('custo', 'alto')], 'muito_baixa'),
+    ('e', [('distancia', 'excelente')], 'alta'),
+    ('e', [('tempo', 'muito_rapido')], 'alta'),
+]
+
+class MotorFuzzy:
+    """Sistema fuzzy Mamdani compilado em arrays: pertinências amostradas uma única vez, regras como mínimo/máximo
+    elemento a elemento e centróide vetorizado. Avalia N entradas numa chamada, reproduzindo o ControlSystem do
+    skfuzzy (entradas limitadas ao universo, E=fmin, OU=fmax, acumulação fmax, universo de saída reamostrado nos
+    pontos de corte). Quando nenhuma regra dispara a saída é 0, onde o skfuzzy levanta erro."""
+    
+    def __init__(self, universos=FUZZY_UNIVERSOS, termos=FUZZY_TERMOS, regras=FUZZY_REGRAS, saida='eficiencia'):
+        self.universos = universos
+        self.termos = termos
+        self.regras = regras
+        self.saida = saida
+        self.entradas = [var for var in termos if var != saida]
+        import skfuzzy as fuzz
+        self.pertinencias = {(var, termo): fuzz.trimf(universos[var], abc)
+                             for var in termos for termo, abc in termos[var].items()}
+    
+    def avaliar(self, **entradas) -> np.ndarray:
+        """Saída defuzzificada para cada posição dos arrays de entrada (ex.: distancia=..., tempo=..., custo=...)"""
+        # Fuzzificação
+        graus = {}
+        for var in self.entradas:
+            universo = self.universos[var]
+            x = np.clip(np.asarray(entradas[var], dtype=float), universo.min(), universo.max())
+            for termo in self.termos[var]:
+                graus[(var, termo)] = np.interp(x, universo, self.pertinencias[(var, termo)])
+        
+        # Ativação das regras e acumulação por termo de saída
+        cortes = {termo: np.zeros_like(x) for termo in self.termos[self.saida]}
+        for operador, antecedentes, consequente in self.regras:
+            reduzir = np.minimum.reduce if operador == 'e' else np.maximum.reduce
+            cortes[consequente] = np.maximum(cortes[consequente], reduzir([graus[a] for a in antecedentes]))
+        
+        # Universo de saída + pontos onde cada triângulo cruza seu nível de corte; nos pontos do universo a
+        # pertinência já está amostrada, só os pontos de corte precisam de interpolação
+        universo = self.universos[self.saida]
+        termos_saida = list(self.termos[self.saida])
+        cruzamentos = []
+        for termo, (a, b, c) in self.termos[self.saida].items():
+            if b > a:
+                cruzamentos.append(a + cortes[termo] * (b - a))
+            if c > b:
+                cruzamentos.append(c - cortes[termo] * (c - b))
+        cruzamentos = np.stack(cruzamentos, axis=-1)
+        
+        agregar = lambda pertinencia: np.maximum.reduce([
+            np.minimum(cortes[t][..., None], pertinencia(self.pertinencias[(self.saida, t)])) for t in termos_saida
+        ])
+        xs = np.concatenate([np.broadcast_to(universo, x.shape + universo.shape), cruzamentos], axis=-1)
+        ys = np.concatenate([agregar(lambda mf: mf), agregar(lambda mf: np.interp(cruzamentos, universo, mf))], axis=-1)
+        ordem = np.argsort(xs, axis=-1, kind='stable')
+        xs, ys = np.take_along_axis(xs, ordem, axis=-1), np.take_along_axis(ys, ordem, axis=-1)
+        
+        # Centróide da função linear por partes (trapézios; pontos repetidos têm largura zero)
+        x1, dx = xs[..., :-1], np.diff(xs, axis=-1)
+        y1, y2 = ys[..., :-1], ys[..., 1:]
+        area = 0.5 * dx * (y1 + y2)
+        momento = area * x1 + dx ** 2 * (y1 + 2 * y2) / 6
+        return momento.sum(axis=-1) / np.fmax(area.sum(axis=-1), np.finfo(float).eps)
+
+#Normalização por coluna entre candidatos (linhas): 'max' → x/máx, 'min' → mín/x (menor é melhor),
+#'soma' → participação x/Σx. Generaliza as normalizações par a par da análise Recife x Salvador.
+def normalizar_colunas(valores, modo: str = 'max') -> np.ndarray:
+    valores = np.asarray(valores, dtype=float)
+    if modo == 'min':
+        return np.nanmin(valores, axis=0) / valores
+    referencia = np.nanmax(valores, axis=0) if modo == 'max' else np.nansum(valores, axis=0)
+    neutro = 0.5 if modo == 'max' else 1 / len(valores)
+    return np.where(referencia > 0, valores / np.where(referencia > 0, referencia, 1), neutro)
+
+#Leitura/gravação atômica dos caches em disco (joblib); arquivo ausente ou ilegível → None
+def _carregar_joblib(arquivo: str) -> Optional[Any]:
+    if not os.path.exists(arquivo):
+        return None
+    import joblib
+    try:
+        return joblib.load(arquivo)
+    except Exception as e:
+        print(f"   Aviso: cache ilegível, recalculando ({os.path.basename(arquivo)}: {e})")
+        return None
+
+def _gravar_joblib(arquivo: str, objeto: Any) -> None:
+    os.makedirs(os.path.dirname(arquivo) or '.', exist_ok=True)
+    import joblib
+    temporario = arquivo + ".tmp"
+    joblib.dump(objeto, temporario)
+    os.replace(temporario, arquivo)
+
+#Pesos dos componentes de custo e dos raios de mercado
+PESOS_CUSTOS = {'custo': 0.30, 'roi': 0.25, 'pib': 0.15, 'mercado': 0.20, 'densidade': 0.10}
+PESOS_RAIO = {300: 0.35, 500: 0.35, 800: 0.20, 1200: 0.10}
+GRADE_CAPTACAO_KM = np.arange(10, 3001, 10)  # curva de captação contínua por candidato
+
+#Componentes normalizados do score de custos. Arrays (candidatos,) ou (candidatos, cenários): a normalização
+#é sempre entre candidatos (eixo 0), o que permite avaliar lotes de cenários do Monte Carlo de uma vez
+def componentes_custos(custo, preco_venda, pib_per_capita, mercado_potencial, densidade):
+    custo = np.asarray(custo, dtype=float)
+    roi = np.asarray(preco_venda, dtype=float) * 1000 / custo
+    componentes = {
+        'custo': normalizar_colunas(custo, 'min'),  # invertido - menor é melhor
+        'roi': normalizar_colunas(roi, 'max'),
+        'pib': normalizar_colunas(pib_per_capita, 'max'),
+        'mercado': normalizar_colunas(mercado_potencial, 'max'),
+        #Densidade ótima não é nem muito alta nem muito baixa (2000 pessoas/km²)
+        'densidade': np.clip(1 - np.abs(np.asarray(densidade, dtype=float) - 2000) / 2000, 0, 1),
+    }
+    return componentes, roi
+
+#Score de mercado a partir de população e consumo por raio, arrays (candidatos, raios[, cenários]):
+#participação de cada candidato por raio, população (40%) + consumo (60%), ponderada pelos raios
+def score_mercado(populacao, consumo) -> np.ndarray:
+    score_raio = normalizar_colunas(populacao, 'soma') * 0.4 + normalizar_colunas(consumo, 'soma') * 0.6
+    return np.moveaxis(score_raio, 1, -1) @ np.array(list(PESOS_RAIO.values()))
+
+#Curvas de captação: pontos de demanda (estados ou municípios) ordenados por distância a cada candidato uma única vez,
+#com somas acumuladas das colunas; qualquer grade de raios é respondida por searchsorted, sem refiltrar a tabela
+class CurvaCaptacao:
+
+    def __init__(self, distancias: np.ndarray, valores: Dict[str, np.ndarray], excluir: Optional[np.ndarray] = None):
+        # distancias (pontos, candidatos); sem distância (NaN) ou excluídos nunca entram em nenhum raio
+        distancias = np.where(np.isnan(distancias), np.inf, distancias)
+        if excluir is not None:
+            distancias = np.where(excluir, np.inf, distancias)
+        self.ordem = np.argsort(distancias, axis=0, kind='stable')
+        self.distancias = np.take_along_axis(distancias, self.ordem, axis=0)
+        # Valor ausente (NaN) soma 0 e fica fora do denominador das médias, sem contaminar os raios seguintes
+        zeros = np.zeros((1, distancias.shape[1]))
+        self.acumulados, self.validos = {}, {}
+        for nome, v in valores.items():
+            v = np.asarray(v, dtype=float)[self.ordem]
+            self.acumulados[nome] = np.vstack([zeros, np.cumsum(np.nan_to_num(v, nan=0.0), axis=0)])
+            self.validos[nome] = np.vstack([zeros, np.cumsum(~np.isnan(v), axis=0)])
+
+    #Pontos dentro de cada raio (distância <= raio): (raios, candidatos)
+    def contagem(self, raios) -> np.ndarray:
+        raios = np.asarray(raios, dtype=float)
+        return np.column_stack([np.searchsorted(coluna, raios, side='right') for coluna in self.distancias.T])
+
+    def soma(self, nome: str, raios) -> np.ndarray:
+        return np.take_along_axis(self.acumulados[nome], self.contagem(raios), axis=0)
+
+    def media(self, nome: str, raios) -> np.ndarray:
+        contagem = self.contagem(raios)
+        soma = np.take_along_axis(self.acumulados[nome], contagem, axis=0)
+        validos = np.take_along_axis(self.validos[nome], contagem, axis=0)
+        return np.divide(soma, validos, out=np.zeros(contagem.shape), where=validos > 0)
+
+    #Índices (ordem original) dos pontos dentro do raio para o candidato n
+    def incluidos(self, raio: float, n: int) -> np.ndarray:
+        return np.sort(self.ordem[:np.searchsorted(self.distancias[:, n], raio, side='right'), n])
+
+#Predição do ensemble para as features base (linhas): média das predições ponderada pelo R² de CV
+def prever_ensemble(modelos, scaler, scores_cv: Dict[str, float], base: np.ndarray):
+    X_scaled = scaler.transform(base)
+    matriz = np.array([modelo.predict(X_scaled) for modelo in modelos.values()])  # modelos × linhas
+    pesos_cv = np.array([max(0, scores_cv[nome]) for nome in modelos])
+    if pesos_cv.sum() > 0:
+        return pesos_cv @ matriz / pesos_cv.sum(), matriz
+    #Fallback para média simples se todos scores CV forem negativos
+    return matriz.mean(axis=0), matriz
+
+#Ensemble de modelos otimizados: classe do scikit-learn e hiperparâmetros (construídos sob demanda)
+MODELOS_ENSEMBLE = {
+    'neural': ('sklearn.neural_network.MLPRegressor', {
+        'hidden_layer_sizes': (15, 10),
+        'activation': 'relu',
+        'alpha': 0.1,  # Maior regularização
+        'max_iter': 1500,
+        'early_stopping': True,
+        'validation_fraction': 0.2,
+        'random_state': 42
+    }),
+    'arvore': ('sklearn.tree.DecisionTreeRegressor', {
+        'max_depth': 3,
+        'min_samples_split': 10,
+        'min_samples_leaf': 5,
+        'random_state': 42
+    }),
+    'random_forest': ('sklearn.ensemble.RandomForestRegressor', {
+        'n_estimators': 30,
+        'max_depth': 4,
+        'min_samples_split': 10,
+        'random_state': 42
+    }),
+    'gradient_boost': ('sklearn.ensemble.GradientBoostingRegressor', {
+        'n_estimators': 30,
+        'max_depth': 3,
+        'learning_rate': 0.1,
+        'subsample': 0.8,
+        'random_state': 42
+    })
+}
+
+#Instancia um modelo a partir do caminho da classe; n_jobs só para quem o aceita (random forest)
+def construir_modelo(classe: str, parametros: Dict[str, Any], n_jobs: Optional[int] = None):
+    modulo, nome = classe.rsplit('.', 1)
+    modelo = getattr(importlib.import_module(modulo), nome)(**parametros)
+    if 'n_jobs' in modelo.get_params():
+        modelo.set_params(n_jobs=n_jobs)
+    return modelo
+
+#Ajusta uma cópia do modelo (executado nos workers do joblib): com índices de teste devolve o R² do fold,
+#sem eles treina no conjunto completo e devolve o modelo ajustado
+def _ajustar_modelo(modelo, X, y, treino=None, teste=None):
+    from sklearn.base import clone
+    from sklearn.metrics import r2_score
+    modelo = clone(modelo)
+    if teste is None:
+        return modelo.fit(X, y)
+    modelo.fit(X[treino], y[treino])
+    return r2_score(y[teste], modelo.predict(X[teste]))
+
+CACHE_MODELOS_DIR = "cache_modelos"
+CACHE_ETAPAS_DIR = "cache_etapas"
+PERFIL_DIR = "perfil_etapas"
+LIMITES_PESOS = (0.15, 0.40)  # mínimo/máximo por categoria (antes da normalização)
+ROTULOS_CATEGORIAS = {'Custos_Economia': 'Custos e economia', 'Logistica_Fuzzy': 'Eficiência logística',
+                      'Mercado_Regional': 'Mercado regional', 'ML_Ensemble': 'Ensemble de ML'}
+
+#Objetivo da otimização de pesos avaliado em lote: pesos (K,) ou população (K, S) → -(vantagem do líder sobre o
+#segundo colocado - 0.5·desvio dos pesos normalizados). Classe de módulo para ser serializável com workers > 1
+class ObjetivoPesos:
+
+    def __init__(self, matriz: np.ndarray):
+        self.matriz = np.asarray(matriz, dtype=float)  # candidatos × categorias
+
+    def __call__(self, pesos: np.ndarray):
+        pesos = np.asarray(pesos, dtype=float)
+        populacao = pesos if pesos.ndim == 2 else pesos[:, None]
+        pesos_norm = populacao / populacao.sum(axis=0)
+        finais = self.matriz @ pesos_norm  # candidatos × soluções, um único produto matricial
+        segundo, lider = np.partition(finais, -2, axis=0)[-2:]
+        valor = -((lider - segundo) - np.std(pesos_norm, axis=0) * 0.5)
+        return valor if pesos.ndim == 2 else float(valor[0])
+
+#Ótimo exato dos pesos. Após a normalização os limites viram restrições lineares (Σw = 1, w_a ≤ razão·w_b), cujos
+#vértices têm só dois níveis de peso (razão e 1). Fixado o líder i, a vantagem min_j (s_i - s_j)·w é côncava e cada
+#ramo é um problema convexo (epígrafo t da vantagem; sem o termo de desvio seria um LP), resolvido por SLSQP a partir
+#do melhor vértice. Os vértices dão a solução incumbente e um limite superior por ramo, que descarta os ramos
+#que não podem superá-la.
+def otimizar_pesos_exato(matriz: np.ndarray, limites=LIMITES_PESOS, x0: Optional[np.ndarray] = None) -> np.ndarray:
+    from scipy.optimize import minimize
+    matriz = np.asarray(matriz, dtype=float)
+    n, k = matriz.shape
+    razao = limites[1] / limites[0]
+    objetivo = ObjetivoPesos(matriz)
+    
+    # Vértices do politopo viável (+ pesos iguais e ponto inicial informado)
+    niveis = np.array(np.meshgrid(*[[1.0, razao]] * k, indexing='ij')).reshape(k, -1).T if k <= 12 else np.ones((1, k))
+    vertices = [niveis / niveis.sum(axis=1, keepdims=True)]
+    if x0 is not None:
+        vertices.append(np.asarray(x0, dtype=float)[None, :] / np.sum(x0))
+    vertices = np.vstack(vertices)
+    valores = objetivo(vertices.T)
+    melhor, melhor_valor = vertices[np.argmin(valores)], valores.min()
+    
+    finais = matriz @ vertices.T  # candidatos × vértices
+    desvios = vertices.std(axis=1)
+    centro = np.eye(k) - 1 / k
+    pares = [(a, b) for a in range(k) for b in range(k) if a != b]
+    R = np.zeros((len(pares), k + 1))
+    for linha, (a, b) in enumerate(pares):
+        R[linha, a], R[linha, b] = razao, -1  # razão·w_a - w_b ≥ 0
+    ordem = np.argsort(-finais.max(axis=1))
+    for i in ordem:
+        adversarios = np.delete(finais, i, axis=0)
+        limite_superior = np.min(np.max(finais[i] - adversarios, axis=1))  # linear, ignora o desvio (≥ 0)
+        if -limite_superior >= melhor_valor:
+            continue
+        vantagens = np.delete(matriz[i] - matriz, i, axis=0)  # (s_i - s_j) por adversário
+        inicio = np.argmax(finais[i] - adversarios.max(axis=0) - 0.5 * desvios)
+        w0 = vertices[inicio]
+        
+        # Variáveis z = (w_1..w_k, t): maximizar t - 0.5·desvio(w) com (s_i - s_j)·w ≥ t
+        A = np.vstack([np.hstack([vantagens, -np.ones((n - 1, 1))]), R])
+        desvio = lambda z: np.sqrt(np.sum((centro @ z[:k]) ** 2) / k + 1e-18)
+        resultado = minimize(
+            lambda z: -(z[k] - 0.5 * desvio(z)),
+            np.append(w0, np.min(vantagens @ w0)),
+            jac=lambda z: np.append(0.5 * (centro @ z[:k]) / (k * desvio(z)), -1),
+            method='SLSQP',
+            bounds=[(0, 1)] * k + [(None, None)],
+            constraints=[
+                {'type': 'eq', 'fun': lambda z: np.sum(z[:k]) - 1, 'jac': lambda z: np.append(np.ones(k), 0)},
+                {'type': 'ineq', 'fun': lambda z: A @ z, 'jac': lambda z: A},
+            ],
+            options={'ftol': 1e-12, 'maxiter': 500}
+        )
+        pesos = np.clip(resultado.x[:k], 0, None)
+        valor = objetivo(pesos)  # reavaliado no objetivo original
+        if valor < melhor_valor:
+            melhor, melhor_valor = pesos / pesos.sum(), valor
+    return melhor
+
 @dataclass
 class ResultadoIA:
     cidade_recomendada: str
-    score_recife: float
-    score_salvador: float
+    score_recife: Optional[float]    # legado do caso Recife x Salvador: None quando a cidade não é candidata
+    score_salvador: Optional[float]
     vantagem_percentual: float
     fatores_decisivos: List[str]
     metodologias_utilizadas: List[str]
     confianca: float
     analise_detalhada: Dict[str, Any]
     validacao_dados: Dict[str, Any]
+    ranking: Dict[str, float] = field(default_factory=dict)  # cidade → score final, do melhor para o pior
+
+#Etapa do pipeline: entradas nomeadas (saídas de outras etapas), função (analisador, *entradas) → saída,
+#e o que versiona o resultado (código/constantes das quais depende e parâmetros do analisador)
+@dataclass
+class Etapa:
+    nome: str
+    entradas: List[str]
+    funcao: Callable[..., Any]
+    codigo: Tuple[Any, ...] = ()
+    parametros: Callable[[Any], Any] = lambda analisador: None
+
+    def chave(self, analisador, chaves_entradas: List[str]) -> str:
+        h = hashlib.sha1(self.nome.encode('utf-8'))
+        for objeto in (self.funcao, *self.codigo):
+            h.update(_versao_codigo(objeto).encode('utf-8'))
+        h.update(repr(self.parametros(analisador)).encode('utf-8'))
+        for chave in chaves_entradas:
+            h.update(chave.encode('utf-8'))
+        return h.hexdigest()
+
+#Versão de uma dependência: código-fonte de funções/classes, repr de constantes
+def _versao_codigo(objeto) -> str:
+    if inspect.isfunction(objeto) or inspect.isclass(objeto) or inspect.ismethod(objeto):
+        try:
+            return inspect.getsource(objeto)
+        except (OSError, TypeError):
+            return getattr(objeto, '__qualname__', repr(objeto))
+    return repr(objeto)
+
+#Ordem topológica das etapas (Kahn); erro se houver ciclo ou entrada inexistente
+def ordenar_etapas(etapas: List[Etapa], disponiveis=()) -> List[Etapa]:
+    pendentes, ordem, prontas = list(etapas), [], set(disponiveis)
+    while pendentes:
+        executaveis = [e for e in pendentes if all(entrada in prontas for entrada in e.entradas)]
+        if not executaveis:
+            faltantes = {entrada for e in pendentes for entrada in e.entradas if entrada not in prontas}
+            raise ValueError(f"DAG de etapas inválido (ciclo ou entrada ausente): {', '.join(sorted(faltantes))}")
+        for etapa in executaveis:
+            ordem.append(etapa)
+            prontas.add(etapa.nome)
+            pendentes.remove(etapa)
+    return ordem
+
+#Subconjunto do DAG necessário para produzir os alvos (alvos + ancestrais)
+def etapas_necessarias(etapas: List[Etapa], alvos: List[str]) -> List[Etapa]:
+    por_nome = {etapa.nome: etapa for etapa in etapas}
+    desconhecidas = [alvo for alvo in alvos if alvo not in por_nome]
+    if desconhecidas:
+        raise ValueError(f"Etapa(s) desconhecida(s): {', '.join(desconhecidas)}. Disponíveis: {', '.join(por_nome)}")
+    necessarias, pilha = set(), list(alvos)
+    while pilha:
+        nome = pilha.pop()
+        if nome in por_nome and nome not in necessarias:
+            necessarias.add(nome)
+            pilha.extend(por_nome[nome].entradas)
+    return [etapa for etapa in etapas if etapa.nome in necessarias]
+
+#Perfil por etapa: tempo de parede, CPU do processo e pico de memória (tracemalloc) acima do alocado no início
+#da etapa. Com diretorio_cprofile, cada etapa também grava <etapa>.prof (pstats/snakeviz)
+class PerfilEtapas:
+
+    def __init__(self, memoria: bool = False, diretorio_cprofile: Optional[str] = None):
+        self.memoria = memoria
+        self.diretorio_cprofile = diretorio_cprofile
+        self.etapas: Dict[str, Dict[str, Any]] = {}
+        self.pico_total_mb = 0.0
+        self._funcoes: Dict[str, List[Tuple[str, float]]] = {}  # etapa → (função, tempo próprio em s) do cProfile
+
+    @contextlib.contextmanager
+    def medir(self, nome: str):
+        registro: Dict[str, Any] = {}
+        iniciou_trace = self.memoria and not tracemalloc.is_tracing()
+        if iniciou_trace:
+            tracemalloc.start()
+        if self.memoria:
+            tracemalloc.reset_peak()
+            inicial = tracemalloc.get_traced_memory()[0]
+        perfil = None
+        if self.diretorio_cprofile:
+            import cProfile
+            perfil = cProfile.Profile()
+        parede, cpu = time.perf_counter(), time.process_time()
+        if perfil:
+            perfil.enable()
+        try:
+            yield registro
+        finally:
+            if perfil:
+                perfil.disable()
+            registro.update(tempo_s=round(time.perf_counter() - parede, 6), cpu_s=round(time.process_time() - cpu, 6))
+            if self.memoria:
+                pico = tracemalloc.get_traced_memory()[1]
+                registro['pico_memoria_mb'] = round((pico - inicial) / 1e6, 3)
+                self.pico_total_mb = max(self.pico_total_mb, pico / 1e6)
+                if iniciou_trace:
+                    tracemalloc.stop()
+            if perfil:
+                self._salvar_cprofile(nome, perfil)
+            self.etapas[nome] = registro
+
+    def _salvar_cprofile(self, nome: str, perfil) -> None:
+        import pstats
+        os.makedirs(self.diretorio_cprofile, exist_ok=True)
+        perfil.dump_stats(os.path.join(self.diretorio_cprofile, f"{nome}.prof"))
+        estatisticas = pstats.Stats(perfil).stats
+        self._funcoes[nome] = [(f"{os.path.basename(arquivo)}:{funcao}:{linha}", tempo_proprio)
+                               for (arquivo, linha, funcao), (_, _, tempo_proprio, _, _) in estatisticas.items()
+                               if tempo_proprio > 0]
+
+    #Seção 'perf' do resultado
+    def resumo(self) -> Dict[str, Any]:
+        resumo = {'tempo_total_s': round(sum(e['tempo_s'] for e in self.etapas.values()), 6),
+                  'cpu_total_s': round(sum(e['cpu_s'] for e in self.etapas.values()), 6)}
+        if self.memoria:
+            resumo['pico_memoria_mb'] = round(self.pico_total_mb, 3)
+        return {**resumo, 'etapas': self.etapas}
+
+    #Pilhas colapsadas (formato flamegraph.pl/speedscope) em microssegundos: analise;<etapa>[;<função>].
+    #Sem cProfile cada etapa é uma folha; com cProfile, as funções da etapa pelo tempo próprio
+    def gravar_pilhas(self, arquivo: str) -> None:
+        os.makedirs(os.path.dirname(arquivo) or '.', exist_ok=True)
+        with open(arquivo, 'w', encoding='utf-8') as f:
+            for nome, registro in self.etapas.items():
+                total = int(registro['tempo_s'] * 1e6)
+                for funcao, tempo_proprio in self._funcoes.get(nome, []):
+                    microssegundos = int(tempo_proprio * 1e6)
+                    if microssegundos:
+                        f.write(f"analise;{nome};{funcao.replace(';', ',').replace(' ', '_')} {microssegundos}\n")
+                        total -= microssegundos
+                if total > 0:
+                    f.write(f"analise;{nome} {total}\n")
+
+#Índices dos datasets de uma carga, construídos uma única vez no primeiro uso: custos por cidade, posições das
+#rotas por origem e seus agregados (groupby). As etapas consultam candidatos por chave em vez de varrer os frames
+class IndiceDatasets:
+
+    def __init__(self, datasets: Dict[str, pd.DataFrame]):
+        self.datasets = datasets
+
+    @cached_property
+    def chave(self) -> str:
+        return AnalisadorMagalu._hash_datasets(self.datasets)
+
+    @cached_property
+    def custos(self) -> pd.DataFrame:
+        return self.datasets['custos'].set_index('cidade')
+
+    @cached_property
+    def posicoes_rotas(self) -> Dict[str, np.ndarray]:
+        return self.datasets['rotas'].groupby('origem', observed=True, sort=False).indices
+
+    @cached_property
+    def agregados_rotas(self) -> pd.DataFrame:
+        rotas = self.datasets['rotas'].assign(
+            proximo_300km=lambda d: d['distancia_km'] <= 300,
+            proximo_500km=lambda d: d['distancia_km'] <= 500,
+        )
+        agregados = rotas.groupby('origem', observed=True).agg(
+            distancia_media=('distancia_km', 'mean'),
+            distancia_min=('distancia_km', 'min'),
+            distancia_std=('distancia_km', 'std'),
+            tempo_medio=('tempo_horas', 'mean'),
+            custo_logistica_medio=('custo_total_estimado', 'mean'),
+            num_rotas=('distancia_km', 'size'),
+            destinos_proximos_300km=('proximo_300km', 'sum'),
+            destinos_proximos_500km=('proximo_500km', 'sum'),
+        )
+        agregados.index = agregados.index.astype(object)
+        return agregados
+
+    #Matriz estado × estado das rotas (capitais mapeadas para seus estados), para candidatos sem Distancia_<Cidade>
+    @cached_property
+    def matriz_rotas(self):
+        return MatrizDistancias.do_dataframe(self.datasets['rotas'])
+
+    #Rotas com origem nas cidades informadas, na ordem original do dataset (custo proporcional às rotas delas)
+    def rotas_de(self, cidades: List[str]) -> pd.DataFrame:
+        posicoes = [self.posicoes_rotas[c] for c in cidades if c in self.posicoes_rotas]
+        posicoes = np.sort(np.concatenate(posicoes)) if posicoes else np.empty(0, dtype=np.intp)
+        return self.datasets['rotas'].iloc[posicoes]
 
 class AnalisadorMagalu:
     
-    def __init__(self):
-        self.scaler_features = StandardScaler()
-        self.scaler_minmax = MinMaxScaler()
-        self.scaler_robust = RobustScaler()  # Mais robusto a outliers
-        
-        # Ensemble de modelos otimizados
-        self.modelos = {
-            'neural': MLPRegressor(
-                hidden_layer_sizes=(15, 10),
-                activation='relu',
-                alpha=0.1,  # Maior regularização
-                max_iter=1500,
-                early_stopping=True,
-                validation_fraction=0.2,
-                random_state=42
-            ),
-            'arvore': DecisionTreeRegressor(
-                max_depth=3,
-                min_samples_split=10,
-                min_samples_leaf=5,
-                random_state=42
-            ),
-            'random_forest': RandomForestRegressor(
-                n_estimators=30,
-                max_depth=4,
-                min_samples_split=10,
-                random_state=42
-            ),
-            'gradient_boost': GradientBoostingRegressor(
-                n_estimators=30,
-                max_depth=3,
-                learning_rate=0.1,
-                subsample=0.8,
-                random_state=42
-            )
-        }
+    def __init__(self, n_jobs: Optional[int] = -1, n_amostras: int = 50, semente: int = 42,
+                 candidatos: Optional[List[str]] = None, otimizador: str = 'exato', workers_otimizador: int = 1,
+                 paciencia_otimizador: int = 25, cache_modelos: Optional[str] = CACHE_MODELOS_DIR,
+                 cache_etapas: Optional[str] = CACHE_ETAPAS_DIR, medir_memoria: bool = False,
+                 diretorio_cprofile: Optional[str] = None):
+        # Cidades candidatas (linhas da matriz de scores); chaves dos resultados em minúsculas ('recife', ...)
+        self.candidatos = list(candidatos or CIDADES)
+        if len(self.candidatos) < 2:
+            raise ValueError("A análise requer ao menos 2 cidades candidatas")
+        # n_jobs no padrão do scikit-learn/joblib: -1 = todos os núcleos, None/1 = sequencial
+        self.n_jobs = n_jobs
+        self.n_amostras = n_amostras  # amostras sintéticas por cidade no data augmentation
+        self.semente = semente
+        # Otimização de pesos: 'exato' (ramos convexos) ou 'evolucao' (differential evolution vetorizado)
+        if otimizador not in ('exato', 'evolucao'):
+            raise ValueError(f"Otimizador desconhecido: {otimizador}")
+        self.otimizador = otimizador
+        self.workers_otimizador = workers_otimizador
+        self.paciencia_otimizador = paciencia_otimizador
+        # Warm start entre otimizações do mesmo analisador (só em memória, não persiste entre processos: a saída
+        # em cache da etapa 'otimizacao' depende apenas da chave, que inclui este valor)
+        self._pesos_anteriores: Optional[np.ndarray] = None
+        
+        # Ensemble (MODELOS_ENSEMBLE), scaler e motor fuzzy são construídos no primeiro uso
+        self._modelos: Optional[Dict[str, Any]] = None
+        self._scaler_robust = None
+        self._cache_ensemble: Optional[str] = None  # saída da etapa 'ensemble' ainda não lida do disco
+        self._motor_fuzzy: Optional[MotorFuzzy] = None
+        
+        # Datasets da última análise (reaproveitados pela sensibilidade Monte Carlo)
+        self.datasets: Dict[str, pd.DataFrame] = {}
         
         # Armazenar dados para validação
         self.dados_validacao = {}
+        
+        # Caches em disco do ensemble treinado e das saídas de cada etapa (None desativa)
+        self.cache_modelos = cache_modelos
+        self.cache_etapas = cache_etapas
+        self.chaves_etapas: Dict[str, str] = {}
+        self.etapas_executadas: List[str] = []
+        
+        # Perfil de tempo/CPU por etapa, exportado na seção 'perf' do resultado; memória (tracemalloc) e cProfile
+        # são opcionais por encarecerem as etapas (o tracemalloc chega a triplicar o treino do ensemble)
+        self.medir_memoria = medir_memoria
+        self.diretorio_cprofile = diretorio_cprofile
+        self.perf = PerfilEtapas(medir_memoria, diretorio_cprofile)
+        
+        # Feature store por hash dos datasets
+        self._features: Dict[str, pd.DataFrame] = {}
+        self._indice: Optional[IndiceDatasets] = None
     
-    def carregar_e_validar_datasets(self) -> Dict[str, pd.DataFrame]:
-        """Carrega e valida os 3 datasets"""
+    #Modelos e scaler do cache da etapa 'ensemble', quando a análise a reaproveitou sem ler
+    def _restaurar_ensemble(self) -> None:
+        arquivo, self._cache_ensemble = self._cache_ensemble, None
+        saida = _carregar_joblib(arquivo) if arquivo else None
+        if saida is not None:
+            self._modelos, self._scaler_robust = saida['modelos'], saida['scaler']
+
+    @property
+    def modelos(self) -> Dict[str, Any]:
+        if self._modelos is None and self._cache_ensemble:
+            self._restaurar_ensemble()
+        if self._modelos is None:
+            self._modelos = {nome: construir_modelo(classe, parametros, self.n_jobs)
+                             for nome, (classe, parametros) in MODELOS_ENSEMBLE.items()}
+        return self._modelos
+
+    @modelos.setter
+    def modelos(self, valor: Dict[str, Any]):
+        self._modelos = valor
+
+    @property
+    def scaler_robust(self):
+        if self._scaler_robust is None and self._cache_ensemble:
+            self._restaurar_ensemble()
+        if self._scaler_robust is None:
+            from sklearn.preprocessing import RobustScaler
+            self._scaler_robust = RobustScaler()  # Mais robusto a outliers
+        return self._scaler_robust
+
+    @scaler_robust.setter
+    def scaler_robust(self, valor):
+        self._scaler_robust = valor
+
+    # Sistema fuzzy logístico compilado
+    @property
+    def motor_fuzzy(self) -> 'MotorFuzzy':
+        if self._motor_fuzzy is None:
+            self._motor_fuzzy = MotorFuzzy()
+        return self._motor_fuzzy
+
+    def carregar_e_validar_datasets(self, diretorios: Tuple[str, ...] = ('.', 'datasets_gerados')) -> Dict[str, pd.DataFrame]:
+        """Carrega e valida os 3 datasets (primeiro diretório que contiver cada um)"""
         print("\nCarregando e validando datasets...")
         datasets = {}
         
-        arquivos = {
-            'custos': 'dataset_custos_imobiliario.csv',
-            'demografia': 'dataset_demografica_vizinhos_recife_salvador.csv', 
-            'rotas': 'dataset_rotas_nordeste.csv'
-        }
+        from armazenamento_datasets import carregar_dataset, localizar_dataset
         
-        for nome, arquivo in arquivos.items():
-            paths_to_try = [
-                Path(arquivo),
-                Path('datasets_gerados') / arquivo,
-                Path('.') / arquivo
-            ]
+        # Parquet tipado (memory map) quando disponível; CSV como fallback
+        for nome in ('custos', 'demografia', 'rotas'):
+            df = carregar_dataset(nome, diretorios, calculo=True)
+            if df is None:
+                continue
+            datasets[nome] = df
+            
+            # Validações básicas
+            formato = Path(localizar_dataset(nome, diretorios)).suffix[1:]
+            print(f"   ✓ {nome}: {len(df)} registros, {len(df.columns)} colunas ({formato})")
             
-            for path in paths_to_try:
-                if path.exists():
-                    df = pd.read_csv(path)
-                    datasets[nome] = df
-                    
-                    # Validações básicas
-                    print(f"   ✓ {nome}: {len(df)} registros, {len(df.columns)} colunas")
-                    
-                    # Verificar valores nulos críticos
-                    if nome == 'custos':
-                        colunas_criticas = ['custo_construcao', 'preco_venda', 'populacao', 'pib_per_capita']
-                        for col in colunas_criticas:
-                            if df[col].isna().any():
-                                print(f"Aviso: Valores nulos em {col}")
-                    
-                    break
+            # Verificar valores nulos críticos
+            if nome == 'custos':
+                colunas_criticas = ['custo_construcao', 'preco_venda', 'populacao', 'pib_per_capita']
+                for col in colunas_criticas:
+                    if df[col].isna().any():
+                        print(f"Aviso: Valores nulos em {col}")
         
         if len(datasets) != 3:
             raise ValueError("Não foi possível carregar todos os datasets necessários")
@@ -130,491 +691,339 @@ class AnalisadorMagalu:
         
         return datasets
     
+    @staticmethod
+    def _hash_datasets(datasets: Dict[str, pd.DataFrame]) -> str:
+        h = hashlib.sha1()
+        for nome in sorted(datasets):
+            df = datasets[nome]
+            h.update(f"{nome}:{list(df.columns)}".encode('utf-8'))
+            h.update(pd.util.hash_pandas_object(df, index=True).to_numpy().tobytes())
+        return h.hexdigest()
+
+    @staticmethod
+    def _chave(cidade: str) -> str:
+        return cidade.lower()
+
+    #Candidatos exibidos nos prints: todos até 10, senão os 10 melhores pelo score informado
+    def _exibidos(self, scores: Optional[np.ndarray] = None) -> List[int]:
+        n = len(self.candidatos)
+        if n <= 10 or scores is None:
+            return list(range(min(n, 10)))
+        return list(np.argsort(-np.asarray(scores), kind='stable')[:10])
+
+    #Índice da carga atual de datasets (reconstruído só quando os frames mudam)
+    def indice(self, datasets: Dict[str, pd.DataFrame]) -> IndiceDatasets:
+        atual = self._indice
+        if atual is None or atual.datasets.keys() != datasets.keys() or \
+                any(atual.datasets[nome] is not df for nome, df in datasets.items()):
+            self._indice = IndiceDatasets(dict(datasets))
+        return self._indice
+
+    #Feature store: todas as features por cidade candidata, por consulta aos índices (agregados de rotas por origem)
+    def construir_features(self, datasets: Dict[str, pd.DataFrame]) -> pd.DataFrame:
+        indice = self.indice(datasets)
+        chave = indice.chave + '|' + '|'.join(self.candidatos)
+        if chave in self._features:
+            return self._features[chave]
+        
+        custos = indice.custos
+        faltantes = [c for c in self.candidatos if c not in custos.index]
+        if faltantes:
+            raise ValueError(f"Candidatos sem dados de custos: {', '.join(faltantes)}")
+        
+        colunas_custos = ['uf', 'custo_construcao', 'preco_venda', 'pib_per_capita', 'populacao',
+                          'mercado_potencial_anual', 'densidade_demografica']
+        features = custos.loc[self.candidatos, colunas_custos].join(indice.agregados_rotas.reindex(self.candidatos))
+        features['estado_sede'] = features['uf'].map(ESTADO_POR_UF)
+        features.index.name = 'cidade'
+        
+        # Mercado em 500km excluindo o estado sede
+        demo = datasets['demografia']
+        distancias = self._matriz_distancias(datasets)
+        mascara = (distancias <= 500) & (demo['Estado'].to_numpy()[:, None] != features['estado_sede'].to_numpy()[None, :])
+        features['populacao_500km'] = np.nan_to_num(demo['Populacao'].to_numpy(dtype=float)) @ mascara
+        features['consumo_500km'] = np.nan_to_num(demo['Consumo_Bilhoes'].to_numpy(dtype=float)) @ mascara
+        
+        self._features[chave] = features
+        return features
+
+    #Distâncias estado × candidato: colunas Distancia_<Cidade> da demografia e, para candidatos sem a coluna,
+    #as rotas do candidato na MatrizDistancias; candidato sem nenhuma distância interrompe a análise
+    def _matriz_distancias(self, datasets: Dict[str, pd.DataFrame]) -> np.ndarray:
+        demo = datasets['demografia']
+        distancias = demo.reindex(columns=[f'Distancia_{c}' for c in self.candidatos]).to_numpy(dtype=float)
+        
+        sem_coluna = [j for j, c in enumerate(self.candidatos) if f'Distancia_{c}' not in demo.columns]
+        if sem_coluna:
+            origens = [CAPITAIS_ESTADOS.get(self.candidatos[j], self.candidatos[j]) for j in sem_coluna]
+            recorte = self.indice(datasets).matriz_rotas.recorte(origens, demo['Estado'].astype(object).tolist())
+            distancias[:, sem_coluna] = recorte.to_numpy().T
+        
+        sem_distancias = [c for c, coluna in zip(self.candidatos, distancias.T) if np.isnan(coluna).all()]
+        if sem_distancias:
+            raise ValueError(f"Candidatos sem distâncias aos estados (coluna Distancia_<Cidade> na demografia "
+                             f"nem rotas): {', '.join(sem_distancias)}")
+        return distancias
+
 #Validações de sanidade nos dados
     def _validar_sanidade_dados(self, datasets: Dict[str, pd.DataFrame]):
         print("\nExecutando validações de sanidade...")
         
-        # Validar custos
-        df_custos = datasets['custos']
-        recife = df_custos[df_custos['cidade'] == 'Recife'].iloc[0]
-        salvador = df_custos[df_custos['cidade'] == 'Salvador'].iloc[0]
+        features = self.construir_features(datasets)
+        exibidos = [self.candidatos[i] for i in self._exibidos()]
         
+        # Validar custos
         self.dados_validacao['custos'] = {
-            'custo_construcao_recife': recife['custo_construcao'],
-            'custo_construcao_salvador': salvador['custo_construcao'],
-            'populacao_recife': recife['populacao'],
-            'populacao_salvador': salvador['populacao']
+            f'{campo}_{self._chave(cidade)}': features.at[cidade, coluna]
+            for campo, coluna in [('custo_construcao', 'custo_construcao'), ('populacao', 'populacao')]
+            for cidade in self.candidatos
         }
         
-        print(f"   Custo construção - Recife: R$ {recife['custo_construcao']:.0f}/m²")
-        print(f"   Custo construção - Salvador: R$ {salvador['custo_construcao']:.0f}/m²")
+        for cidade in exibidos:
+            print(f"   Custo construção - {cidade}: R$ {features.at[cidade, 'custo_construcao']:.0f}/m²")
         
         # Validar rotas
-        df_rotas = datasets['rotas']
-        rotas_recife = df_rotas[df_rotas['origem'] == 'Recife']
-        rotas_salvador = df_rotas[df_rotas['origem'] == 'Salvador']
-        
         self.dados_validacao['rotas'] = {
-            'num_rotas_recife': len(rotas_recife),
-            'num_rotas_salvador': len(rotas_salvador),
-            'dist_media_recife': rotas_recife['distancia_km'].mean(),
-            'dist_media_salvador': rotas_salvador['distancia_km'].mean()
+            **{f'num_rotas_{self._chave(c)}': int(np.nan_to_num(features.at[c, 'num_rotas'])) for c in self.candidatos},
+            **{f'dist_media_{self._chave(c)}': features.at[c, 'distancia_media'] for c in self.candidatos},
         }
         
-        print(f"   Rotas de Recife: {len(rotas_recife)}, Dist média: {rotas_recife['distancia_km'].mean():.0f}km")
-        print(f"   Rotas de Salvador: {len(rotas_salvador)}, Dist média: {rotas_salvador['distancia_km'].mean():.0f}km")
+        for cidade in exibidos:
+            print(f"   Rotas de {cidade}: {int(np.nan_to_num(features.at[cidade, 'num_rotas']))}, "
+                  f"Dist média: {features.at[cidade, 'distancia_media']:.0f}km")
+        
+        sem_rotas = features.index[features['num_rotas'].isna()].tolist()
+        if sem_rotas:
+            print(f"Aviso: {len(sem_rotas)} candidato(s) sem rotas: {', '.join(sem_rotas[:5])}")
     
      #Análise detalhada de custos com normalização
-    def analisar_custos_economicos(self, df: pd.DataFrame) -> Dict[str, Any]:
+    def analisar_custos_economicos(self, features: pd.DataFrame) -> Dict[str, Any]:
         print("\nAnalisando Custos e Economia...")
         
-        recife = df[df['cidade'] == 'Recife'].iloc[0]
-        salvador = df[df['cidade'] == 'Salvador'].iloc[0]
-        
-        analise_detalhada = {}
-        componentes_scores = {'recife': {}, 'salvador': {}}
-        
-        #1 Custo de Construção (invertido - menor é melhor)
-        custo_recife = recife['custo_construcao']
-        custo_salvador = salvador['custo_construcao']
-        
-        # Normalização invertida
-        if custo_recife < custo_salvador:
-            score_custo_recife = 1.0
-            score_custo_salvador = custo_recife / custo_salvador
-        else:
-            score_custo_recife = custo_salvador / custo_recife
-            score_custo_salvador = 1.0
-        
-        componentes_scores['recife']['custo'] = score_custo_recife
-        componentes_scores['salvador']['custo'] = score_custo_salvador
-        
-        vantagem_custo_recife = ((custo_salvador - custo_recife) / custo_salvador) * 100
-        analise_detalhada['vantagem_custo_recife'] = vantagem_custo_recife
-        
-        #2 ROI (Return on Investment)
-        roi_recife = (recife['preco_venda'] * 1000) / custo_recife
-        roi_salvador = (salvador['preco_venda'] * 1000) / custo_salvador
-        
-        # Normalização do ROI
-        max_roi = max(roi_recife, roi_salvador)
-        score_roi_recife = roi_recife / max_roi if max_roi > 0 else 0.5
-        score_roi_salvador = roi_salvador / max_roi if max_roi > 0 else 0.5
-        
-        componentes_scores['recife']['roi'] = score_roi_recife
-        componentes_scores['salvador']['roi'] = score_roi_salvador
-        
-        analise_detalhada['roi'] = {
-            'recife': roi_recife,
-            'salvador': roi_salvador
-        }
-        
-        #3 PIB per capita
-        pib_recife = recife['pib_per_capita']
-        pib_salvador = salvador['pib_per_capita']
-        
-        max_pib = max(pib_recife, pib_salvador)
-        score_pib_recife = pib_recife / max_pib if max_pib > 0 else 0.5
-        score_pib_salvador = pib_salvador / max_pib if max_pib > 0 else 0.5
-        
-        componentes_scores['recife']['pib'] = score_pib_recife
-        componentes_scores['salvador']['pib'] = score_pib_salvador
-        
-        #4 Mercado Potencial
-        mercado_recife = recife['mercado_potencial_anual']
-        mercado_salvador = salvador['mercado_potencial_anual']
-        
-        max_mercado = max(mercado_recife, mercado_salvador)
-        score_mercado_recife = mercado_recife / max_mercado if max_mercado > 0 else 0.5
-        score_mercado_salvador = mercado_salvador / max_mercado if max_mercado > 0 else 0.5
-        
-        componentes_scores['recife']['mercado'] = score_mercado_recife
-        componentes_scores['salvador']['mercado'] = score_mercado_salvador
-        
-        #5 Densidade Demográfica (para eficiência de distribuição)
-        densidade_recife = recife['densidade_demografica']
-        densidade_salvador = salvador['densidade_demografica']
+        f = features.loc[self.candidatos]
+        custo = f['custo_construcao'].to_numpy(dtype=float)
         
-        #Densidade ótima não é nem muito alta nem muito baixa
-        densidade_otima = 2000  # pessoas/km²
-        score_densidade_recife = 1 - abs(densidade_recife - densidade_otima) / densidade_otima
-        score_densidade_salvador = 1 - abs(densidade_salvador - densidade_otima) / densidade_otima
-        
-        score_densidade_recife = max(0, min(1, score_densidade_recife))
-        score_densidade_salvador = max(0, min(1, score_densidade_salvador))
-        
-        componentes_scores['recife']['densidade'] = score_densidade_recife
-        componentes_scores['salvador']['densidade'] = score_densidade_salvador
+        #Matriz candidatos × componentes, normalizada por coluna
+        componentes, roi = componentes_custos(custo, f['preco_venda'], f['pib_per_capita'],
+                                              f['mercado_potencial_anual'], f['densidade_demografica'])
         
         #Score final ponderado
-        pesos = {
-            'custo': 0.30,
-            'roi': 0.25,
-            'pib': 0.15,
-            'mercado': 0.20,
-            'densidade': 0.10
-        }
-        
-        score_final_recife = sum(componentes_scores['recife'][k] * pesos[k] for k in pesos)
-        score_final_salvador = sum(componentes_scores['salvador'][k] * pesos[k] for k in pesos)
+        pesos = PESOS_CUSTOS
+        matriz = np.column_stack([componentes[k] for k in pesos])
+        score_final = matriz @ np.array(list(pesos.values()))
         
-        print(f"   Score Recife: {score_final_recife:.3f} (Custo: {score_custo_recife:.2f}, ROI: {score_roi_recife:.2f})")
-        print(f"   Score Salvador: {score_final_salvador:.3f} (Custo: {score_custo_salvador:.2f}, ROI: {score_roi_salvador:.2f})")
+        chaves = [self._chave(c) for c in self.candidatos]
+        for i in self._exibidos(score_final):
+            print(f"   Score {self.candidatos[i]}: {score_final[i]:.3f} (Custo: {componentes['custo'][i]:.2f}, ROI: {componentes['roi'][i]:.2f})")
         
         return {
-            'scores': {
-                'recife': score_final_recife,
-                'salvador': score_final_salvador
+            'scores': dict(zip(chaves, score_final)),
+            'detalhes': {
+                'custo_construcao': dict(zip(chaves, custo)),
+                'roi': dict(zip(chaves, roi))
             },
-            'detalhes': analise_detalhada,
-            'componentes': componentes_scores
+            'componentes': {chave: dict(zip(pesos, linha)) for chave, linha in zip(chaves, matriz)}
         }
     
             #Análise Fuzzy Logic para maior sensibilidade
-    def analisar_logistica_fuzzy_calibrado(self, df: pd.DataFrame) -> Dict[str, Any]:
+    def analisar_logistica_fuzzy_calibrado(self, features: pd.DataFrame, rotas: Optional[pd.DataFrame] = None) -> Dict[str, Any]:
         print("\nAplicando Fuzzy Logic Calibrado para Logística...")
         
-        #Separar rotas por origem
-        rotas_recife = df[df['origem'] == 'Recife']
-        rotas_salvador = df[df['origem'] == 'Salvador']
-        
-        #Calcular métricas
-        metricas_recife = {
-            'distancia_media': rotas_recife['distancia_km'].mean(),
-            'distancia_min': rotas_recife['distancia_km'].min(),
-            'distancia_std': rotas_recife['distancia_km'].std(),
-            'tempo_medio': rotas_recife['tempo_horas'].mean(),
-            'custo_medio': rotas_recife['custo_total_estimado'].mean(),
-            'num_destinos': len(rotas_recife),
-            'destinos_proximos_300km': len(rotas_recife[rotas_recife['distancia_km'] <= 300]),
-            'destinos_proximos_500km': len(rotas_recife[rotas_recife['distancia_km'] <= 500])
-        }
-        
-        metricas_salvador = {
-            'distancia_media': rotas_salvador['distancia_km'].mean(),
-            'distancia_min': rotas_salvador['distancia_km'].min(),
-            'distancia_std': rotas_salvador['distancia_km'].std(),
-            'tempo_medio': rotas_salvador['tempo_horas'].mean(),
-            'custo_medio': rotas_salvador['custo_total_estimado'].mean(),
-            'num_destinos': len(rotas_salvador),
-            'destinos_proximos_300km': len(rotas_salvador[rotas_salvador['distancia_km'] <= 300]),
-            'destinos_proximos_500km': len(rotas_salvador[rotas_salvador['distancia_km'] <= 500])
-        }
-        
-        #Sistema Fuzzy recalibrado
-        distancia = ctrl.Antecedent(np.arange(0, 1500, 1), 'distancia')
-        tempo = ctrl.Antecedent(np.arange(0, 25, 0.1), 'tempo')
-        custo = ctrl.Antecedent(np.arange(0, 1500, 1), 'custo')
-        eficiencia = ctrl.Consequent(np.arange(0, 101, 1), 'eficiencia')
-        
-        #Membership functions mais sensíveis
-        distancia['excelente'] = fuzz.trimf(distancia.universe, [0, 150, 350])
-        distancia['boa'] = fuzz.trimf(distancia.universe, [300, 500, 700])
-        distancia['regular'] = fuzz.trimf(distancia.universe, [650, 850, 1050])
-        distancia['ruim'] = fuzz.trimf(distancia.universe, [1000, 1250, 1500])
-        
-        tempo['muito_rapido'] = fuzz.trimf(tempo.universe, [0, 0, 4])
-        tempo['rapido'] = fuzz.trimf(tempo.universe, [3, 6, 9])
-        tempo['medio'] = fuzz.trimf(tempo.universe, [8, 12, 16])
-        tempo['lento'] = fuzz.trimf(tempo.universe, [15, 20, 25])
-        
-        custo['muito_baixo'] = fuzz.trimf(custo.universe, [0, 0, 250])
-        custo['baixo'] = fuzz.trimf(custo.universe, [200, 400, 600])
-        custo['medio'] = fuzz.trimf(custo.universe, [550, 750, 950])
-        custo['alto'] = fuzz.trimf(custo.universe, [900, 1200, 1500])
-        
-        eficiencia['muito_baixa'] = fuzz.trimf(eficiencia.universe, [0, 0, 20])
-        eficiencia['baixa'] = fuzz.trimf(eficiencia.universe, [15, 30, 45])
-        eficiencia['media'] = fuzz.trimf(eficiencia.universe, [40, 55, 70])
-        eficiencia['alta'] = fuzz.trimf(eficiencia.universe, [65, 80, 90])
-        eficiencia['muito_alta'] = fuzz.trimf(eficiencia.universe, [85, 100, 100])
-        
-        #Regras mais detalhadas
-        regras = [
-            ctrl.Rule(distancia['excelente'] & tempo['muito_rapido'] & custo['muito_baixo'], eficiencia['muito_alta']),
-            ctrl.Rule(distancia['excelente'] & tempo['rapido'] & custo['baixo'], eficiencia['alta']),
-            ctrl.Rule(distancia['excelente'] & custo['baixo'], eficiencia['alta']),
-            ctrl.Rule(distancia['boa'] & tempo['rapido'] & custo['baixo'], eficiencia['alta']),
-            ctrl.Rule(distancia['boa'] & tempo['medio'] & custo['medio'], eficiencia['media']),
-            ctrl.Rule(distancia['boa'] & custo['muito_baixo'], eficiencia['alta']),
-            ctrl.Rule(distancia['regular'] & tempo['medio'], eficiencia['media']),
-            ctrl.Rule(distancia['regular'] & custo['alto'], eficiencia['baixa']),
-            ctrl.Rule(distancia['ruim'] & tempo['lento'], eficiencia['muito_baixa']),
-            ctrl.Rule(distancia['ruim'] | custo['alto'], eficiencia['baixa']),
-            ctrl.Rule(tempo['lento'] & custo['alto'], eficiencia['muito_baixa']),
-            ctrl.Rule(distancia['excelente'], eficiencia['alta']),
-            ctrl.Rule(tempo['muito_rapido'], eficiencia['alta'])
-        ]
-        
-        sistema_ctrl = ctrl.ControlSystem(regras)
-        sistema = ctrl.ControlSystemSimulation(sistema_ctrl)
-        
-        #Avaliar Recife
-        sistema.input['distancia'] = metricas_recife['distancia_media']
-        sistema.input['tempo'] = metricas_recife['tempo_medio']
-        sistema.input['custo'] = metricas_recife['custo_medio']
-        sistema.compute()
-        eficiencia_recife = sistema.output['eficiencia']
+        f = features.loc[self.candidatos]
+        chaves = [self._chave(c) for c in self.candidatos]
+        
+        #Métricas por origem (feature store)
+        colunas = {'distancia_media': 'distancia_media', 'distancia_min': 'distancia_min', 'distancia_std': 'distancia_std',
+                   'tempo_medio': 'tempo_medio', 'custo_medio': 'custo_logistica_medio', 'num_destinos': 'num_rotas',
+                   'destinos_proximos_300km': 'destinos_proximos_300km', 'destinos_proximos_500km': 'destinos_proximos_500km'}
+        metricas = {chave: {nome: f.at[cidade, coluna] for nome, coluna in colunas.items()}
+                    for chave, cidade in zip(chaves, self.candidatos)}
+        
+        #Sistema Fuzzy calibrado (compilado uma vez) avaliado nas médias de cada origem. Médias em que nenhuma regra
+        #dispara (ex.: distância 0 com tempo 4h e custo 0) dão eficiência 0 em vez do erro do skfuzzy: a candidata
+        #fica só com o bônus de cobertura e perde a categoria logística, sem interromper a análise
+        eficiencia = self.motor_fuzzy.avaliar(
+            distancia=f['distancia_media'], tempo=f['tempo_medio'], custo=f['custo_logistica_medio']
+        )
         
-        #Avaliar Salvador
-        sistema.input['distancia'] = metricas_salvador['distancia_media']
-        sistema.input['tempo'] = metricas_salvador['tempo_medio']
-        sistema.input['custo'] = metricas_salvador['custo_medio']
-        sistema.compute()
-        eficiencia_salvador = sistema.output['eficiencia']
+        #Distribuição da eficiência rota a rota das candidatas (IndiceDatasets.rotas_de), numa única chamada vetorizada
+        distribuicao = {}
+        if rotas is not None:
+            eficiencia_rotas = pd.Series(self.motor_fuzzy.avaliar(
+                distancia=rotas['distancia_km'], tempo=rotas['tempo_horas'], custo=rotas['custo_total_estimado']
+            ), index=rotas.index)
+            resumo = eficiencia_rotas.groupby(rotas['origem'], observed=True).describe(percentiles=[0.1, 0.5, 0.9])
+            distribuicao = {
+                self._chave(cidade): {'media': resumo.at[cidade, 'mean'], 'p10': resumo.at[cidade, '10%'],
+                                      'p50': resumo.at[cidade, '50%'], 'p90': resumo.at[cidade, '90%'],
+                                      'min': resumo.at[cidade, 'min'], 'max': resumo.at[cidade, 'max']}
+                for cidade in self.candidatos if cidade in resumo.index
+            }
         
         #Adicionar bônus por cobertura próxima
-        bonus_recife = metricas_recife['destinos_proximos_500km'] * 2
-        bonus_salvador = metricas_salvador['destinos_proximos_500km'] * 2
+        bonus = np.nan_to_num(f['destinos_proximos_500km'].to_numpy(dtype=float)) * 2
+        eficiencia = np.minimum(100, eficiencia + bonus)
         
-        eficiencia_recife = min(100, eficiencia_recife + bonus_recife)
-        eficiencia_salvador = min(100, eficiencia_salvador + bonus_salvador)
-        
-        print(f"   Eficiência Recife: {eficiencia_recife:.1f}% (Dist média: {metricas_recife['distancia_media']:.0f}km)")
-        print(f"   Eficiência Salvador: {eficiencia_salvador:.1f}% (Dist média: {metricas_salvador['distancia_media']:.0f}km)")
+        for i in self._exibidos(eficiencia):
+            print(f"   Eficiência {self.candidatos[i]}: {eficiencia[i]:.1f}% (Dist média: {f['distancia_media'].iloc[i]:.0f}km)")
+        for i in self._exibidos(eficiencia):
+            d = distribuicao.get(chaves[i])
+            if d:
+                print(f"   Rotas {self.candidatos[i]}: mediana {d['p50']:.1f}% (p10 {d['p10']:.1f}% - p90 {d['p90']:.1f}%)")
         
         return {
-            'scores': {
-                'recife': eficiencia_recife / 100,
-                'salvador': eficiencia_salvador / 100
-            },
-            'metricas': {
-                'recife': metricas_recife,
-                'salvador': metricas_salvador
-            },
-            'eficiencia_fuzzy': {
-                'recife': eficiencia_recife,
-                'salvador': eficiencia_salvador
-            }
+            'scores': dict(zip(chaves, eficiencia / 100)),
+            'metricas': metricas,
+            'eficiencia_fuzzy': dict(zip(chaves, eficiencia)),
+            'distribuicao_rotas': distribuicao
         }
 
-    def analisar_demografia_mercado_corrigido(self, df: pd.DataFrame) -> Dict[str, Any]:
+    def analisar_demografia_mercado_corrigido(self, features: pd.DataFrame, df: pd.DataFrame,
+                                              distancias: np.ndarray) -> Dict[str, Any]:
         print("\nAnalisando Demografia e Mercado Regional (Corrigido)...")
         
-        # Identificar estados sede
-        pernambuco = df[df['Estado'] == 'Pernambuco'].iloc[0] if not df[df['Estado'] == 'Pernambuco'].empty else None
-        bahia = df[df['Estado'] == 'Bahia'].iloc[0] if not df[df['Estado'] == 'Bahia'].empty else None
-        
-        raios = [300, 500, 800, 1200]
-        analise_recife = {}
-        analise_salvador = {}
-        
-        for raio in raios:
-            estados_recife = df[(df['Distancia_Recife'] <= raio) & (df['Estado'] != 'Pernambuco')]
-            estados_salvador = df[(df['Distancia_Salvador'] <= raio) & (df['Estado'] != 'Bahia')]
-            
-            analise_recife[f'raio_{raio}km'] = {
-                'populacao_total': estados_recife['Populacao'].sum(),
-                'consumo_total': estados_recife['Consumo_Bilhoes'].sum(),
-                'renda_media': estados_recife['Renda_Mensal'].mean() if not estados_recife.empty else 0,
-                'pib_per_capita_medio': estados_recife['PIB_Per_Capita'].mean() if not estados_recife.empty else 0,
-                'num_estados': len(estados_recife),
-                'estados_incluidos': list(estados_recife['Estado'].values),
-                'score_atratividade_medio': estados_recife['Score_Atratividade'].mean() if not estados_recife.empty else 0
-            }
-            
-            analise_salvador[f'raio_{raio}km'] = {
-                'populacao_total': estados_salvador['Populacao'].sum(),
-                'consumo_total': estados_salvador['Consumo_Bilhoes'].sum(),
-                'renda_media': estados_salvador['Renda_Mensal'].mean() if not estados_salvador.empty else 0,
-                'pib_per_capita_medio': estados_salvador['PIB_Per_Capita'].mean() if not estados_salvador.empty else 0,
-                'num_estados': len(estados_salvador),
-                'estados_incluidos': list(estados_salvador['Estado'].values),
-                'score_atratividade_medio': estados_salvador['Score_Atratividade'].mean() if not estados_salvador.empty else 0
+        chaves = [self._chave(c) for c in self.candidatos]
+        estados = df['Estado'].to_numpy()
+        sede = features.loc[self.candidatos, 'estado_sede'].to_numpy()
+        
+        # Estados ordenados por distância a cada candidato (excluindo o estado sede) com somas acumuladas
+        colunas = {'populacao': 'Populacao', 'consumo': 'Consumo_Bilhoes', 'renda': 'Renda_Mensal',
+                   'pib': 'PIB_Per_Capita', 'atratividade': 'Score_Atratividade'}
+        curva = CurvaCaptacao(distancias, {nome: df[coluna].to_numpy(dtype=float) for nome, coluna in colunas.items()},
+                              excluir=estados[:, None] == sede[None, :])
+        
+        # Calcular scores com pesos ajustados: raios × candidatos
+        raios = np.array(list(PESOS_RAIO))
+        num_estados = curva.contagem(raios)
+        populacao, consumo = curva.soma('populacao', raios), curva.soma('consumo', raios)
+        renda, pib, atratividade = curva.media('renda', raios), curva.media('pib', raios), curva.media('atratividade', raios)
+        
+        analise = {
+            chave: {
+                f'raio_{raio}km': {
+                    'populacao_total': populacao[r, n],
+                    'consumo_total': consumo[r, n],
+                    'renda_media': renda[r, n],
+                    'pib_per_capita_medio': pib[r, n],
+                    'num_estados': int(num_estados[r, n]),
+                    'estados_incluidos': list(estados[curva.incluidos(raio, n)]),
+                    'score_atratividade_medio': atratividade[r, n]
+                }
+                for r, raio in enumerate(raios)
             }
+            for n, chave in enumerate(chaves)
+        }
         
-        # Imprimir detalhes para transparência
-        print(f"   População 500km de Recife (excl. PE): {analise_recife['raio_500km']['populacao_total']/1e6:.1f}M")
-        print(f"   População 500km de Salvador (excl. BA): {analise_salvador['raio_500km']['populacao_total']/1e6:.1f}M")
-        print(f"   Estados em 500km de Recife: {analise_recife['raio_500km']['num_estados']}")
-        print(f"   Estados em 500km de Salvador: {analise_salvador['raio_500km']['num_estados']}")
-        
-        # Calcular scores com pesos ajustados
-        pesos_raio = {300: 0.35, 500: 0.35, 800: 0.20, 1200: 0.10}
-        
-        score_recife = 0
-        score_salvador = 0
-        
-        for raio, peso in pesos_raio.items():
-            key = f'raio_{raio}km'
-            
-            # Métricas combinadas
-            pop_recife = analise_recife[key]['populacao_total']
-            pop_salvador = analise_salvador[key]['populacao_total']
-            
-            consumo_recife = analise_recife[key]['consumo_total']
-            consumo_salvador = analise_salvador[key]['consumo_total']
-            
-            # Normalização relativa
-            if pop_recife + pop_salvador > 0:
-                score_pop_recife = pop_recife / (pop_recife + pop_salvador)
-                score_pop_salvador = pop_salvador / (pop_recife + pop_salvador)
-            else:
-                score_pop_recife = score_pop_salvador = 0.5
-            
-            if consumo_recife + consumo_salvador > 0:
-                score_consumo_recife = consumo_recife / (consumo_recife + consumo_salvador)
-                score_consumo_salvador = consumo_salvador / (consumo_recife + consumo_salvador)
-            else:
-                score_consumo_recife = score_consumo_salvador = 0.5
-            
-            # Combinação população (40%) + consumo (60%)
-            score_raio_recife = score_pop_recife * 0.4 + score_consumo_recife * 0.6
-            score_raio_salvador = score_pop_salvador * 0.4 + score_consumo_salvador * 0.6
-            
-            score_recife += score_raio_recife * peso
-            score_salvador += score_raio_salvador * peso
+        score = score_mercado(populacao.T, consumo.T)
         
-        print(f"   Score Final Mercado - Recife: {score_recife:.3f}")
-        print(f"   Score Final Mercado - Salvador: {score_salvador:.3f}")
+        # Imprimir detalhes para transparência
+        exibidos = self._exibidos(score)
+        uf = features.loc[self.candidatos, 'uf'].to_numpy()
+        for i in exibidos:
+            print(f"   População 500km de {self.candidatos[i]} (excl. {uf[i]}): {populacao[1, i]/1e6:.1f}M")
+        for i in exibidos:
+            print(f"   Estados em 500km de {self.candidatos[i]}: {num_estados[1, i]}")
+        for i in exibidos:
+            print(f"   Score Final Mercado - {self.candidatos[i]}: {score[i]:.3f}")
+        
+        # Curva de captação contínua (população, consumo e renda média acumulados a cada raio da grade)
+        grade = GRADE_CAPTACAO_KM
+        pop_curva, consumo_curva, renda_curva = curva.soma('populacao', grade), curva.soma('consumo', grade), curva.media('renda', grade)
         
         return {
-            'scores': {
-                'recife': score_recife,
-                'salvador': score_salvador
-            },
-            'analise_por_raio': {
-                'recife': analise_recife,
-                'salvador': analise_salvador
+            'scores': dict(zip(chaves, score)),
+            'analise_por_raio': analise,
+            'curva_captacao': {
+                chave: {'raios_km': grade, 'populacao': pop_curva[:, n], 'consumo': consumo_curva[:, n],
+                        'renda_media': renda_curva[:, n]}
+                for n, chave in enumerate(chaves)
             }
         }
 
-    #Ensemble com validação cruzada e métricas de confiabilidade
-    def treinar_ensemble_calibrado(self, datasets: Dict[str, pd.DataFrame]) -> Dict[str, float]:
-        print("\nTreinando Ensemble Calibrado...")
-        
-        df_custos = datasets['custos']
-        df_rotas = datasets['rotas']
-        df_demo = datasets['demografia']
-        
-        # Criar features base
-        features_list = []
-        targets = []
-        
-        for cidade in ['Recife', 'Salvador']:
-            custos = df_custos[df_custos['cidade'] == cidade].iloc[0]
-            rotas_cidade = df_rotas[df_rotas['origem'] == cidade]
-            
-            # Features base
-            features_base = {
-                'custo_construcao': custos['custo_construcao'],
-                'pib_per_capita': custos['pib_per_capita'],
-                'populacao_local': custos['populacao'],
-                'mercado_potencial': custos['mercado_potencial_anual'],
-                'densidade': custos['densidade_demografica'],
-                'distancia_media': rotas_cidade['distancia_km'].mean(),
-                'distancia_std': rotas_cidade['distancia_km'].std(),
-                'tempo_medio': rotas_cidade['tempo_horas'].mean(),
-                'custo_logistica_medio': rotas_cidade['custo_total_estimado'].mean(),
-                'num_rotas': len(rotas_cidade)
-            }
-            
-            # Features demográficas corrigidas
-            if cidade == 'Recife':
-                estados_500km = df_demo[(df_demo['Distancia_Recife'] <= 500) & (df_demo['Estado'] != 'Pernambuco')]
-            else:
-                estados_500km = df_demo[(df_demo['Distancia_Salvador'] <= 500) & (df_demo['Estado'] != 'Bahia')]
-            
-            features_base['populacao_500km'] = estados_500km['Populacao'].sum()
-            features_base['consumo_500km'] = estados_500km['Consumo_Bilhoes'].sum()
-            
-            # Data augmentation controlada
-            for i in range(50):  # Reduzido para evitar overfitting
-                features_aug = features_base.copy()
-                
-                # Adicionar ruído gaussiano pequeno e realista
-                for key in features_aug:
-                    noise_factor = np.random.normal(1, 0.02)  # ±2% de variação
-                    features_aug[key] *= noise_factor
-                
-                features_list.append(list(features_aug.values()))
-                
-                # Target baseado em scoring heurístico
-                target = 0.5
-                
-                # Componentes do score
-                target += (900000 - features_aug['custo_construcao']) / 1800000 * 0.3
-                target += features_aug['pib_per_capita'] / 150000 * 0.2
-                target += (1000 - features_aug['distancia_media']) / 2000 * 0.25
-                target += features_aug['consumo_500km'] / 300 * 0.25
-                
-                target = np.clip(target, 0, 1)
-                targets.append(target)
-        
-        X = np.array(features_list)
-        y = np.array(targets)
+    #Treina o ensemble sobre as features base (augmentation + CV + ajuste final); atualiza modelos e scaler
+    def _treinar_modelos(self, base: np.ndarray) -> Dict[str, float]:
+        # Data augmentation controlada, em lote: ruído gaussiano ±2% por (cidade, amostra, feature)
+        rng = np.random.default_rng(self.semente)
+        ruido = rng.normal(1, 0.02, size=(len(base), self.n_amostras, len(FEATURES_ML)))
+        X = (base[:, None, :] * ruido).reshape(-1, len(FEATURES_ML))
+        f = dict(zip(FEATURES_ML, X.T))
+        
+        # Target baseado em scoring heurístico
+        y = np.clip(0.5
+                    + (900000 - f['custo_construcao']) / 1800000 * 0.3
+                    + f['pib_per_capita'] / 150000 * 0.2
+                    + (1000 - f['distancia_media']) / 2000 * 0.25
+                    + f['consumo_500km'] / 300 * 0.25, 0, 1)
         
         # Normalização robusta
         X_scaled = self.scaler_robust.fit_transform(X)
         
-        # Treinar e validar cada modelo
-        scores_cv = {}
-        predictions = {}
+        from joblib import Parallel, delayed
+        from sklearn.model_selection import KFold
+        
+        # Treinar e validar cada modelo: folds de CV e ajustes finais dos 4 modelos numa única fila paralela
+        # (mesmos folds do cross_val_score(cv=5) e random_state fixo → resultado independe de n_jobs)
+        folds = list(KFold(n_splits=5).split(X_scaled)) + [(None, None)]
+        resultados = Parallel(n_jobs=self.n_jobs)(
+            delayed(_ajustar_modelo)(modelo, X_scaled, y, treino, teste)
+            for modelo in self.modelos.values() for treino, teste in folds
+        )
         
+        scores_cv = {}
+        for i, nome in enumerate(list(self.modelos)):
+            saidas = resultados[i * len(folds):(i + 1) * len(folds)]
+            scores_cv[nome] = np.mean(saidas[:-1])
+            self.modelos[nome] = saidas[-1]  # modelo treinado no conjunto completo
+        return scores_cv
+
+    #Impressão digital do treino: features base, augmentation e hiperparâmetros (n_jobs não altera o resultado)
+    def _chave_cache_modelos(self, base: np.ndarray) -> str:
+        h = hashlib.sha1()
+        h.update(np.ascontiguousarray(base, dtype=float).tobytes())
+        h.update(repr((FEATURES_ML, self.n_amostras, self.semente, metadata.version('scikit-learn'))).encode('utf-8'))
         for nome, modelo in self.modelos.items():
-            # Validação cruzada
-            cv_scores = cross_val_score(modelo, X_scaled, y, cv=5, scoring='r2')
-            scores_cv[nome] = cv_scores.mean()
-            
-            # Treinar modelo
-            modelo.fit(X_scaled, y)
-            
-            # Preparar dados reais para predição
-            X_real = []
-            for cidade in ['Recife', 'Salvador']:
-                custos = df_custos[df_custos['cidade'] == cidade].iloc[0]
-                rotas_cidade = df_rotas[df_rotas['origem'] == cidade]
-                
-                if cidade == 'Recife':
-                    estados_500km = df_demo[(df_demo['Distancia_Recife'] <= 500) & (df_demo['Estado'] != 'Pernambuco')]
-                else:
-                    estados_500km = df_demo[(df_demo['Distancia_Salvador'] <= 500) & (df_demo['Estado'] != 'Bahia')]
-                
-                X_real.append([
-                    custos['custo_construcao'],
-                    custos['pib_per_capita'],
-                    custos['populacao'],
-                    custos['mercado_potencial_anual'],
-                    custos['densidade_demografica'],
-                    rotas_cidade['distancia_km'].mean(),
-                    rotas_cidade['distancia_km'].std(),
-                    rotas_cidade['tempo_horas'].mean(),
-                    rotas_cidade['custo_total_estimado'].mean(),
-                    len(rotas_cidade),
-                    estados_500km['Populacao'].sum(),
-                    estados_500km['Consumo_Bilhoes'].sum()
-                ])
-            
-            X_real_scaled = self.scaler_robust.transform(X_real)
-            
-            pred_recife = modelo.predict([X_real_scaled[0]])[0]
-            pred_salvador = modelo.predict([X_real_scaled[1]])[0]
-            
-            predictions[nome] = {
-                'recife': pred_recife,
-                'salvador': pred_salvador,
-                'cv_score': scores_cv[nome]
-            }
+            parametros = {k: v for k, v in sorted(modelo.get_params().items()) if k != 'n_jobs'}
+            h.update(f"{nome}:{type(modelo).__name__}:{parametros}".encode('utf-8'))
+        return h.hexdigest()
+
+    def _carregar_cache_modelos(self, chave: str) -> Optional[Dict[str, Any]]:
+        if not self.cache_modelos:
+            return None
+        return _carregar_joblib(os.path.join(self.cache_modelos, f"ensemble_{chave}.joblib"))
+
+    def _salvar_cache_modelos(self, chave: str, scores_cv: Dict[str, float]) -> None:
+        if self.cache_modelos:
+            _gravar_joblib(os.path.join(self.cache_modelos, f"ensemble_{chave}.joblib"),
+                           {'modelos': self.modelos, 'scaler': self.scaler_robust, 'scores_cv': scores_cv})
+
+    #Ensemble com validação cruzada e métricas de confiabilidade
+    def treinar_ensemble_calibrado(self, features: pd.DataFrame) -> Dict[str, float]:
+        print("\nTreinando Ensemble Calibrado...")
         
-        #Media ponderada do ensemble baseada na performance CV
-        total_score = sum(max(0, scores_cv[m]) for m in predictions)
+        # Features base (feature store); lacunas imputadas pela mediana entre candidatos
+        base = features.loc[self.candidatos, FEATURES_ML].astype(float)
+        base = base.fillna(base.median()).to_numpy()
         
-        if total_score > 0:
-            score_recife = sum(predictions[m]['recife'] * max(0, scores_cv[m]) / total_score 
-                             for m in predictions)
-            score_salvador = sum(predictions[m]['salvador'] * max(0, scores_cv[m]) / total_score 
-                               for m in predictions)
+        # Modelos já treinados com as mesmas features e hiperparâmetros são reaproveitados do cache
+        chave_cache = self._chave_cache_modelos(base)
+        cache = self._carregar_cache_modelos(chave_cache)
+        if cache is not None:
+            self.modelos, self.scaler_robust, scores_cv = cache['modelos'], cache['scaler'], cache['scores_cv']
+            print(f"   Modelos carregados do cache ({chave_cache[:12]})")
         else:
-            #Fallback para média simples se todos scores CV forem negativos
-            score_recife = np.mean([p['recife'] for p in predictions.values()])
-            score_salvador = np.mean([p['salvador'] for p in predictions.values()])
+            scores_cv = self._treinar_modelos(base)
+            self._salvar_cache_modelos(chave_cache, scores_cv)
+        
+        chaves = [self._chave(c) for c in self.candidatos]
+        scores, matriz = prever_ensemble(self.modelos, self.scaler_robust, scores_cv, base)
+        predictions = {nome: {**dict(zip(chaves, linha)), 'cv_score': scores_cv[nome]}
+                       for nome, linha in zip(self.modelos, matriz)}
         
         print(f"   Scores CV: {', '.join(f'{m}={s:.3f}' for m, s in scores_cv.items())}")
-        print(f"   Ensemble - Recife: {score_recife:.3f}, Salvador: {score_salvador:.3f}")
+        print(f"   Ensemble - {', '.join(f'{self.candidatos[i]}: {scores[i]:.3f}' for i in self._exibidos(scores))}")
         
         return {
-            'recife': score_recife,
-            'salvador': score_salvador,
+            **dict(zip(chaves, scores)),
             'predictions_by_model': predictions,
             'cv_scores': scores_cv
         }
@@ -623,49 +1032,60 @@ class AnalisadorMagalu:
     def otimizar_pesos_balanceado(self, scores_todas: Dict[str, Dict[str, float]]) -> Dict[str, Any]:
         print("\nOtimizando pesos com balanceamento...")
         
-        def objetivo(pesos):
-            pesos_norm = pesos / pesos.sum()
+        # Matriz de scores: candidatos × categorias
+        chaves = [self._chave(c) for c in self.candidatos]
+        matriz = np.array([[scores_todas[cat][chave] for cat in scores_todas] for chave in chaves])
+        
+        objetivo = ObjetivoPesos(matriz)
+        
+        if self.otimizador == 'exato':
+            # Ótimo global exato por ramos convexos (milissegundos), partindo da solução anterior
+            pesos_otimos = otimizar_pesos_exato(matriz, LIMITES_PESOS, self._pesos_anteriores)
+        else:
+            #Limites: mínimo 15%, máximo 40% por categoria
+            bounds = [LIMITES_PESOS] * len(scores_todas)
             
-            score_recife = sum(scores_todas[cat]['recife'] * peso 
-                             for cat, peso in zip(scores_todas.keys(), pesos_norm))
-            score_salvador = sum(scores_todas[cat]['salvador'] * peso 
-                               for cat, peso in zip(scores_todas.keys(), pesos_norm))
+            # Warm start: solução anterior reescalada para dentro dos limites (maior peso = 40%)
+            x0 = None
+            if self._pesos_anteriores is not None and len(self._pesos_anteriores) == len(bounds):
+                x0 = np.clip(self._pesos_anteriores * LIMITES_PESOS[1] / self._pesos_anteriores.max(), *LIMITES_PESOS)
             
-            # Maximizar diferença e penalizar pesos extremos
-            diferenca = abs(score_recife - score_salvador)
-            penalidade_desbalanco = np.std(pesos_norm) * 0.5
+            # Parada antecipada: encerra após `paciencia_otimizador` gerações sem melhora do melhor indivíduo
+            historico = []
+            def parada_antecipada(xk, convergence=None):
+                historico.append(objetivo(xk))
+                return (len(historico) > self.paciencia_otimizador
+                        and historico[-self.paciencia_otimizador - 1] - historico[-1] < 1e-9)
             
-            return -(diferenca - penalidade_desbalanco)
-        
-        #Limites: mínimo 15%, máximo 40% por categoria
-        bounds = [(0.15, 0.40)] * len(scores_todas)
-        
-        resultado = differential_evolution(
-            objetivo,
-            bounds,
-            seed=42,
-            maxiter=200,
-            popsize=20,
-            atol=1e-6
-        )
+            from scipy.optimize import differential_evolution
+            
+            # População inteira avaliada num produto matricial; com workers != 1 o scipy distribui por processos
+            resultado = differential_evolution(
+                objetivo,
+                bounds,
+                seed=42,
+                maxiter=200,
+                popsize=20,
+                atol=1e-6,
+                x0=x0,
+                callback=parada_antecipada,
+                vectorized=self.workers_otimizador == 1,
+                workers=self.workers_otimizador,
+                updating='deferred'
+            )
+            pesos_otimos = resultado.x / resultado.x.sum()
         
-        pesos_otimos = resultado.x / resultado.x.sum()
+        self._pesos_anteriores = pesos_otimos
         
         #Calcular scores finais
-        score_final_recife = sum(scores_todas[cat]['recife'] * peso 
-                                for cat, peso in zip(scores_todas.keys(), pesos_otimos))
-        score_final_salvador = sum(scores_todas[cat]['salvador'] * peso 
-                                  for cat, peso in zip(scores_todas.keys(), pesos_otimos))
+        scores_finais = matriz @ pesos_otimos
         
         print("   Pesos balanceados:")
         for cat, peso in zip(scores_todas.keys(), pesos_otimos):
             print(f"      {cat}: {peso:.1%}")
         
         return {
-            'scores_finais': {
-                'recife': score_final_recife,
-                'salvador': score_final_salvador
-            },
+            'scores_finais': dict(zip(chaves, scores_finais)),
             'pesos_otimos': dict(zip(scores_todas.keys(), pesos_otimos))
         }
     
@@ -678,93 +1098,20 @@ class AnalisadorMagalu:
         print("="*70)
         
         try:
-            #1 Carregar e validar datasets
-            datasets = self.carregar_e_validar_datasets()
+            #1 Carregar e validar datasets (raiz do DAG, identificada pelo hash do conteúdo)
+            self.perf = PerfilEtapas(self.medir_memoria, self.diretorio_cprofile)
+            with self.perf.medir('carga'):
+                datasets = self.datasets = self.carregar_e_validar_datasets()
             
-            #2 Análise de Custos
-            analise_custos = self.analisar_custos_economicos(datasets['custos'])
-            
-            #3 Analise Logística com Fuzzy calibrado
-            analise_logistica = self.analisar_logistica_fuzzy_calibrado(datasets['rotas'])
-            
-            #4 Analise Demográfica corrigida
-            analise_mercado = self.analisar_demografia_mercado_corrigido(datasets['demografia'])
-            
-            #5 Ensemble calibrado
-            scores_ensemble = self.treinar_ensemble_calibrado(datasets)
-            
-            #6 Consolidar scores
-            todos_scores = {
-                'Custos_Economia': analise_custos['scores'],
-                'Logistica_Fuzzy': analise_logistica['scores'],
-                'Mercado_Regional': analise_mercado['scores'],
-                'ML_Ensemble': {
-                    'recife': scores_ensemble['recife'],
-                    'salvador': scores_ensemble['salvador']
-                }
-            }
-            
-            # 7. Otimização balanceada
-            resultado_otimizado = self.otimizar_pesos_balanceado(todos_scores)
-            
-            # 8. Decisão final
-            score_final_recife = resultado_otimizado['scores_finais']['recife']
-            score_final_salvador = resultado_otimizado['scores_finais']['salvador']
-            
-            diferenca = abs(score_final_recife - score_final_salvador)
-            vantagem_pct = diferenca * 100
-            
-            # Determinar recomendação
-            if diferenca < 0.03:  # 3% de margem para empate
-                cidade_recomendada = "EMPATE TÉCNICO"
-                confianca = 0.3
-            elif score_final_recife > score_final_salvador:
-                cidade_recomendada = "RECIFE"
-                confianca = min(0.5 + diferenca * 2, 0.95)
+            #2-8 Etapas memoizadas: custos, logística, mercado, ensemble, consolidação, otimização e decisão
+            saidas = self.executar_etapas(datasets)
+            if 'ensemble' in saidas:
+                self.modelos, self.scaler_robust = saidas['ensemble']['modelos'], saidas['ensemble']['scaler']
             else:
-                cidade_recomendada = "SALVADOR"
-                confianca = min(0.5 + diferenca * 2, 0.95)
-            
-            # Identificar fatores decisivos
-            fatores = self._identificar_fatores_principais(
-                todos_scores,
-                analise_custos,
-                analise_logistica,
-                analise_mercado,
-                cidade_recomendada,
-                resultado_otimizado['pesos_otimos']
-            )
-            
-            # Metodologias utilizadas
-            metodologias = [
-                "Fuzzy Logic calibrado para análise logística",
-                "Ensemble de 4 modelos ML com validação cruzada",
-                "Algoritmo Genético com balanceamento de pesos",
-                "Análise de 23 variáveis econômicas",
-                "Análise demográfica",
-                "Normalização robusta (RobustScaler)",
-                "Data Augmentation controlada (±2% de variação)"
-            ]
-            
-            # Compilar resultado
-            resultado = ResultadoIA(
-                cidade_recomendada=cidade_recomendada,
-                score_recife=score_final_recife,
-                score_salvador=score_final_salvador,
-                vantagem_percentual=vantagem_pct,
-                fatores_decisivos=fatores,
-                metodologias_utilizadas=metodologias,
-                confianca=confianca,
-                analise_detalhada={
-                    'scores_por_categoria': todos_scores,
-                    'pesos_otimizados': resultado_otimizado['pesos_otimos'],
-                    'analise_custos': analise_custos,
-                    'analise_logistica': analise_logistica,
-                    'analise_mercado': analise_mercado,
-                    'ensemble_details': scores_ensemble
-                },
-                validacao_dados=self.dados_validacao
-            )
+                # Ensemble reaproveitado sem leitura: modelos e scaler saem do cache da etapa no primeiro uso
+                self._modelos, self._scaler_robust = None, None
+                self._cache_ensemble = self._arquivo_etapa('ensemble')
+            resultado = ResultadoIA(**saidas['decisao'])
             
             # Apresentar resultados
             self._apresentar_resultados_finais(resultado)
@@ -774,10 +1121,145 @@ class AnalisadorMagalu:
         except Exception as e:
             print(f"\n❌ Erro durante análise: {e}")
             raise
+
+    #Executa o DAG de etapas em ordem topológica. Cada saída é memoizada em disco pela chave
+    #(código da etapa + parâmetros do analisador + chaves das entradas), então uma mudança só reexecuta
+    #a própria etapa e as que dependem dela. As chaves saem todas antes de qualquer leitura, e uma saída em cache
+    #só é lida quando é alvo (padrão: etapas finais do DAG) ou entrada de uma etapa que precisa executar
+    def executar_etapas(self, datasets: Dict[str, pd.DataFrame], etapas: Optional[List['Etapa']] = None,
+                        alvos: Optional[List[str]] = None) -> Dict[str, Any]:
+        saidas: Dict[str, Any] = {'datasets': datasets}
+        self.chaves_etapas = {'datasets': self.indice(datasets).chave}
+        self.etapas_executadas: List[str] = []
+        etapas = etapas or ETAPAS_ANALISE
+        if alvos:
+            etapas = etapas_necessarias(etapas, alvos)  # só os alvos e as etapas das quais dependem
+        
+        ordem = ordenar_etapas(etapas, disponiveis=saidas)
+        por_nome = {etapa.nome: etapa for etapa in ordem}
+        for etapa in ordem:
+            self.chaves_etapas[etapa.nome] = etapa.chave(self, [self.chaves_etapas[e] for e in etapa.entradas])
+        
+        #Saída da etapa: lida do cache ou executada (entradas obtidas antes, fora da medição da etapa)
+        def obter(nome: str) -> Any:
+            if nome in saidas:
+                return saidas[nome]
+            etapa, arquivo = por_nome[nome], self._arquivo_etapa(nome)
+            saida = None
+            if arquivo and os.path.exists(arquivo):
+                with self.perf.medir(nome) as registro:
+                    saida = _carregar_joblib(arquivo)
+                    registro['origem'] = 'cache'
+            if saida is None:
+                entradas = [obter(e) for e in etapa.entradas]
+                with self.perf.medir(nome) as registro:
+                    saida = etapa.funcao(self, *entradas)
+                    registro['origem'] = 'executada'
+                self.etapas_executadas.append(nome)
+                if arquivo:
+                    _gravar_joblib(arquivo, saida)
+            saidas[nome] = saida
+            return saida
+        
+        # De trás para frente: alvos e, de cada etapa necessária sem cache, as entradas
+        necessarias = set(alvos or [e.nome for e in ordem if not any(e.nome in outra.entradas for outra in ordem)])
+        for etapa in reversed(ordem):
+            arquivo = self._arquivo_etapa(etapa.nome)
+            if etapa.nome in necessarias and not (arquivo and os.path.exists(arquivo)):
+                necessarias.update(etapa.entradas)
+        for etapa in ordem:
+            if etapa.nome in necessarias:
+                obter(etapa.nome)
+        
+        reaproveitadas = [nome for nome in self.chaves_etapas if nome not in self.etapas_executadas and nome != 'datasets']
+        if reaproveitadas:
+            print(f"\n↺ Etapas reaproveitadas do cache: {', '.join(reaproveitadas)}")
+        return saidas
+
+    #Arquivo do cache da etapa para a chave atual (None sem cache de etapas)
+    def _arquivo_etapa(self, nome: str) -> Optional[str]:
+        if not self.cache_etapas or nome not in self.chaves_etapas:
+            return None
+        return os.path.join(self.cache_etapas, f"{nome}_{self.chaves_etapas[nome]}.joblib")
+
+    #Consolida os scores das quatro categorias (candidatos → score)
+    def consolidar_scores(self, analise_custos, analise_logistica, analise_mercado, scores_ensemble) -> Dict[str, Dict[str, float]]:
+        chaves = [self._chave(c) for c in self.candidatos]
+        return {
+            'Custos_Economia': analise_custos['scores'],
+            'Logistica_Fuzzy': analise_logistica['scores'],
+            'Mercado_Regional': analise_mercado['scores'],
+            'ML_Ensemble': {chave: scores_ensemble[chave] for chave in chaves}
+        }
+
+    #Decisão final: líder x segundo colocado, fatores decisivos e resultado compilado
+    def decidir(self, todos_scores, resultado_otimizado, analise_custos, analise_logistica, analise_mercado,
+                scores_ensemble) -> ResultadoIA:
+        chaves = [self._chave(c) for c in self.candidatos]
+        scores_finais = resultado_otimizado['scores_finais']
+        ranking = sorted(zip(self.candidatos, (scores_finais[c] for c in chaves)), key=lambda x: x[1], reverse=True)
+        (lider, score_lider), (_, score_segundo) = ranking[0], ranking[1]
+        
+        diferenca = score_lider - score_segundo
+        vantagem_pct = diferenca * 100
+        
+        # Determinar recomendação
+        if diferenca < 0.03:  # 3% de margem para empate
+            cidade_recomendada = "EMPATE TÉCNICO"
+            confianca = 0.3
+        else:
+            cidade_recomendada = lider.upper()
+            confianca = min(0.5 + diferenca * 2, 0.95)
+        
+        # Identificar fatores decisivos
+        fatores = self._identificar_fatores_principais(
+            todos_scores,
+            analise_custos,
+            analise_logistica,
+            analise_mercado,
+            cidade_recomendada,
+            resultado_otimizado['pesos_otimos'],
+            [nome for nome, _ in ranking]
+        )
+        
+        # Metodologias utilizadas
+        metodologias = [
+            "Fuzzy Logic calibrado para análise logística",
+            "Ensemble de 4 modelos ML com validação cruzada",
+            "Algoritmo Genético com balanceamento de pesos",
+            "Análise de 23 variáveis econômicas",
+            "Análise demográfica",
+            "Normalização robusta (RobustScaler)",
+            "Data Augmentation controlada (±2% de variação)"
+        ]
+        
+        # Compilar resultado
+        return ResultadoIA(
+            cidade_recomendada=cidade_recomendada,
+            score_recife=scores_finais.get('recife'),
+            score_salvador=scores_finais.get('salvador'),
+            vantagem_percentual=vantagem_pct,
+            fatores_decisivos=fatores,
+            metodologias_utilizadas=metodologias,
+            confianca=confianca,
+            analise_detalhada={
+                'scores_por_categoria': todos_scores,
+                'pesos_otimizados': resultado_otimizado['pesos_otimos'],
+                'analise_custos': analise_custos,
+                'analise_logistica': analise_logistica,
+                'analise_mercado': analise_mercado,
+                'ensemble_details': scores_ensemble
+            },
+            validacao_dados=self.dados_validacao,
+            ranking=dict(ranking)
+        )
     
-    def _identificar_fatores_principais(self, scores, custos, logistica, mercado, cidade, pesos):
-        """Identifica fatores mais relevantes com base nos pesos e diferenças"""
+    def _identificar_fatores_principais(self, scores, custos, logistica, mercado, cidade, pesos, ranking):
+        """Identifica fatores mais relevantes com base nos pesos e diferenças entre líder e segundo colocado"""
         fatores = []
+        lider, segundo = ranking[0], ranking[1]
+        l, s = self._chave(lider), self._chave(segundo)
+        lider_recomendado = cidade == lider.upper()
         
         # Ordenar categorias por peso
         categorias_ordenadas = sorted(pesos.items(), key=lambda x: x[1], reverse=True)
@@ -785,48 +1267,43 @@ class AnalisadorMagalu:
         # Analisar cada categoria por ordem de importância
         for categoria, peso in categorias_ordenadas[:3]:
             if categoria == 'Custos_Economia':
-                if custos['detalhes'].get('vantagem_custo_recife', 0) > 5:
-                    fatores.append(f"Custo de construção {custos['detalhes']['vantagem_custo_recife']:.1f}% menor em Recife (peso: {peso:.1%})")
+                custo_l, custo_s = custos['detalhes']['custo_construcao'][l], custos['detalhes']['custo_construcao'][s]
+                vantagem_custo = (custo_s - custo_l) / custo_s * 100
+                if vantagem_custo > 5:
+                    fatores.append(f"Custo de construção {vantagem_custo:.1f}% menor em {lider} (peso: {peso:.1%})")
                 
-                roi_r = custos['detalhes']['roi']['recife']
-                roi_s = custos['detalhes']['roi']['salvador']
-                if roi_r > roi_s and cidade == "RECIFE":
-                    fatores.append(f"ROI {(roi_r/roi_s - 1)*100:.1f}% superior em Recife")
-                elif roi_s > roi_r and cidade == "SALVADOR":
-                    fatores.append(f"ROI {(roi_s/roi_r - 1)*100:.1f}% superior em Salvador")
+                roi_l, roi_s = custos['detalhes']['roi'][l], custos['detalhes']['roi'][s]
+                if roi_l > roi_s and lider_recomendado:
+                    fatores.append(f"ROI {(roi_l/roi_s - 1)*100:.1f}% superior em {lider}")
             
             elif categoria == 'Logistica_Fuzzy':
-                ef_r = logistica['eficiencia_fuzzy']['recife']
-                ef_s = logistica['eficiencia_fuzzy']['salvador']
-                dist_r = logistica['metricas']['recife']['distancia_media']
-                dist_s = logistica['metricas']['salvador']['distancia_media']
+                ef_l, ef_s = logistica['eficiencia_fuzzy'][l], logistica['eficiencia_fuzzy'][s]
+                dist_l = logistica['metricas'][l]['distancia_media']
+                dist_s = logistica['metricas'][s]['distancia_media']
                 
-                if ef_r > ef_s and cidade == "RECIFE":
-                    fatores.append(f"Eficiência logística {ef_r-ef_s:.1f}% superior em Recife")
-                elif ef_s > ef_r and cidade == "SALVADOR":
-                    fatores.append(f"Eficiência logística {ef_s-ef_r:.1f}% superior em Salvador")
+                if ef_l > ef_s and lider_recomendado:
+                    fatores.append(f"Eficiência logística {ef_l-ef_s:.1f}% superior em {lider}")
                 
-                if abs(dist_r - dist_s) > 50:
-                    if dist_r < dist_s:
-                        fatores.append(f"Distância média {dist_s-dist_r:.0f}km menor de Recife")
+                if abs(dist_l - dist_s) > 50:
+                    if dist_l < dist_s:
+                        fatores.append(f"Distância média {dist_s-dist_l:.0f}km menor de {lider}")
                     else:
-                        fatores.append(f"Distância média {dist_r-dist_s:.0f}km menor de Salvador")
+                        fatores.append(f"Distância média {dist_l-dist_s:.0f}km menor de {segundo}")
             
             elif categoria == 'Mercado_Regional':
-                pop_500_r = mercado['analise_por_raio']['recife']['raio_500km']['populacao_total']
-                pop_500_s = mercado['analise_por_raio']['salvador']['raio_500km']['populacao_total']
+                pop_500_l = mercado['analise_por_raio'][l]['raio_500km']['populacao_total']
+                pop_500_s = mercado['analise_por_raio'][s]['raio_500km']['populacao_total']
                 
-                if pop_500_r > pop_500_s and cidade == "RECIFE":
-                    fatores.append(f"População {pop_500_r/1e6:.1f}M em 500km de Recife vs {pop_500_s/1e6:.1f}M de Salvador")
-                elif pop_500_s > pop_500_r and cidade == "SALVADOR":
-                    fatores.append(f"População {pop_500_s/1e6:.1f}M em 500km de Salvador vs {pop_500_r/1e6:.1f}M de Recife")
+                if pop_500_l > pop_500_s and lider_recomendado:
+                    fatores.append(f"População {pop_500_l/1e6:.1f}M em 500km de {lider} vs {pop_500_s/1e6:.1f}M de {segundo}")
         
-        # Adicionar fatores gerais se lista estiver vazia
+        # Sem fator específico: categorias em que o líder mais supera o segundo (diferença de score × peso)
         if not fatores:
-            if cidade == "RECIFE":
-                fatores = ["Melhor posição geográfica central", "Custos operacionais mais baixos"]
-            elif cidade == "SALVADOR":
-                fatores = ["Maior mercado local", "Melhor infraestrutura"]
+            if lider_recomendado:
+                vantagens = sorted(((peso * (scores[c][l] - scores[c][s]), c) for c, peso in pesos.items()), reverse=True)
+                fatores = [f"{ROTULOS_CATEGORIAS.get(c, c)}: score {scores[c][l]:.2f} em {lider} vs {scores[c][s]:.2f} em {segundo}"
+                           for vantagem, c in vantagens if vantagem > 0][:2]
+                fatores = fatores or ["Melhor equilíbrio entre custos, logística e mercado regional"]
             else:
                 fatores = ["Diferença marginal entre as opções"]
         
@@ -845,9 +1322,13 @@ class AnalisadorMagalu:
             print(f"\nRESULTADO: {resultado.cidade_recomendada}")
             print("   Diferença menor que 3% - decisão requer análise qualitativa")
         
+        ranking = list(resultado.ranking.items())
         print(f"\nSCORES FINAIS:")
-        print(f"   Recife:   {resultado.score_recife:.3f} {'⭐' if resultado.score_recife > resultado.score_salvador else ''}")
-        print(f"   Salvador: {resultado.score_salvador:.3f} {'⭐' if resultado.score_salvador > resultado.score_recife else ''}")
+        for i, (cidade, score) in enumerate(ranking[:10]):
+            destaque = '⭐' if i == 0 and score > ranking[1][1] else ''
+            print(f"   {cidade + ':':<9} {score:.3f} {destaque}")
+        if len(ranking) > 10:
+            print(f"   ... (+{len(ranking) - 10} candidatos)")
         
         print(f"\nConfiança na Decisão: {resultado.confianca*100:.1f}%")
         
@@ -860,35 +1341,165 @@ class AnalisadorMagalu:
             print(f"   {cat}: {peso:.1%}")
 
 
+#Parâmetros do ensemble que alteram o treino (especificação dos modelos, sem construí-los nem importar o sklearn)
+def _parametros_ensemble(analisador):
+    return (analisador.candidatos, analisador.n_amostras, analisador.semente, metadata.version('scikit-learn'),
+            MODELOS_ENSEMBLE)
+
+#Saída do ensemble inclui modelos e scaler ajustados, restaurados no analisador quando vêm do cache
+def _etapa_ensemble(analisador, features):
+    scores = analisador.treinar_ensemble_calibrado(features)
+    return {'scores': scores, 'modelos': analisador.modelos, 'scaler': analisador.scaler_robust}
+
+A = AnalisadorMagalu
+ETAPAS_ANALISE = [
+    Etapa('features', ['datasets'], A.construir_features,
+          codigo=(IndiceDatasets, A._matriz_distancias, MatrizDistancias, CAPITAIS_ESTADOS, ESTADO_POR_UF),
+          parametros=lambda a: a.candidatos),
+    Etapa('custos', ['features'], A.analisar_custos_economicos,
+          codigo=(componentes_custos, normalizar_colunas, PESOS_CUSTOS), parametros=lambda a: a.candidatos),
+    Etapa('logistica', ['features', 'datasets'],
+          lambda a, features, datasets: a.analisar_logistica_fuzzy_calibrado(
+              features, a.indice(datasets).rotas_de(a.candidatos)),
+          codigo=(A.analisar_logistica_fuzzy_calibrado, MotorFuzzy, FUZZY_UNIVERSOS, FUZZY_TERMOS, FUZZY_REGRAS),
+          parametros=lambda a: a.candidatos),
+    Etapa('mercado', ['features', 'datasets'],
+          lambda a, features, datasets: a.analisar_demografia_mercado_corrigido(
+              features, datasets['demografia'], a._matriz_distancias(datasets)),
+          codigo=(A.analisar_demografia_mercado_corrigido, A._matriz_distancias, MatrizDistancias, CAPITAIS_ESTADOS, CurvaCaptacao,
+                  score_mercado, normalizar_colunas, PESOS_RAIO, GRADE_CAPTACAO_KM),
+          parametros=lambda a: a.candidatos),
+    Etapa('ensemble', ['features'], _etapa_ensemble,
+          codigo=(A.treinar_ensemble_calibrado, A._treinar_modelos, A._chave_cache_modelos, A._carregar_cache_modelos,
+                  A._salvar_cache_modelos, prever_ensemble, _ajustar_modelo, FEATURES_ML),
+          parametros=_parametros_ensemble),
+    Etapa('consolidacao', ['custos', 'logistica', 'mercado', 'ensemble'],
+          lambda a, custos, logistica, mercado, ensemble: a.consolidar_scores(custos, logistica, mercado, ensemble['scores']),
+          codigo=(A.consolidar_scores,), parametros=lambda a: a.candidatos),
+    Etapa('otimizacao', ['consolidacao'], A.otimizar_pesos_balanceado,
+          codigo=(ObjetivoPesos, otimizar_pesos_exato, LIMITES_PESOS),
+          # warm start (solução anterior no mesmo processo) entra na chave: altera o ponto de partida do otimizador
+          parametros=lambda a: (a.candidatos, a.otimizador, a.paciencia_otimizador,
+                                None if a._pesos_anteriores is None else a._pesos_anteriores.tolist())),
+    Etapa('decisao', ['consolidacao', 'otimizacao', 'custos', 'logistica', 'mercado', 'ensemble'],
+          # dict em vez do dataclass: o cache independe do módulo (__main__ ou ia_analise) que o gravou
+          lambda a, todos, otimizado, custos, logistica, mercado, ensemble:
+              asdict(a.decidir(todos, otimizado, custos, logistica, mercado, ensemble['scores'])),
+          codigo=(A.decidir, A._identificar_fatores_principais, ResultadoIA, ROTULOS_CATEGORIAS),
+          parametros=lambda a: (a.candidatos, a.dados_validacao)),
+]
+del A
+
+
 # ==================== EXECUÇÃO PRINCIPAL ====================
+#Resumo textual da saída de uma etapa (scores por candidato quando houver)
+def _resumo_etapa(nome: str, saida: Any) -> List[str]:
+    if isinstance(saida, pd.DataFrame):
+        return saida.to_string(max_cols=8).splitlines()
+    if nome == 'decisao':
+        return [f"Recomendação: {saida['cidade_recomendada']} (confiança {saida['confianca']:.1%})"]
+    if nome == 'consolidacao':
+        return [f"{categoria}: " + ", ".join(f"{c}={v:.3f}" for c, v in list(scores.items())[:10])
+                for categoria, scores in saida.items()]
+    if nome == 'ensemble':
+        saida = saida['scores']
+    scores = saida.get('scores_finais', saida.get('scores', saida)) if isinstance(saida, dict) else {}
+    scores = {c: v for c, v in scores.items() if isinstance(v, (int, float, np.floating))}
+    return [", ".join(f"{c}={v:.3f}" for c, v in sorted(scores.items(), key=lambda x: -x[1])[:10])]
+
+#Tabela do perfil por etapa (seção 'perf')
+def _apresentar_perf(perf: Dict[str, Any]) -> None:
+    print(f"\nPERFIL DE EXECUÇÃO ({perf['tempo_total_s']:.2f}s, CPU {perf['cpu_total_s']:.2f}s):")
+    for nome, etapa in perf['etapas'].items():
+        memoria = f" | pico {etapa['pico_memoria_mb']:.1f} MB" if 'pico_memoria_mb' in etapa else ""
+        origem = f" [{etapa['origem']}]" if 'origem' in etapa else ""
+        print(f"   {nome:<13} {etapa['tempo_s']:8.3f}s | CPU {etapa['cpu_s']:8.3f}s{memoria}{origem}")
+
+#Exibe um resultado salvo sem carregar a pilha de ML
+def apresentar_resultado_salvo(arquivo: str) -> None:
+    with open(arquivo, encoding='utf-8') as f:
+        resultado = json.load(f)
+    print(f"\nResultado salvo em {resultado.get('timestamp', '?')}")
+    print(f"CIDADE RECOMENDADA: {resultado['cidade_recomendada']} (vantagem {resultado['vantagem_percentual']:.1f}%, "
+          f"confiança {resultado['confianca']*100:.1f}%)")
+    ranking = resultado.get('ranking') or {'Recife': resultado['score_recife'], 'Salvador': resultado['score_salvador']}
+    for cidade, score in list(ranking.items())[:10]:
+        print(f"   {cidade + ':':<9} {score:.3f}")
+    for i, fator in enumerate(resultado['fatores_decisivos'], 1):
+        print(f"   {i}. {fator}")
+    if 'perf' in resultado:
+        _apresentar_perf(resultado['perf'])
+
+
 if __name__ == "__main__":
+    import argparse
+    parser = argparse.ArgumentParser(description="Análise com IA - Centro de Distribuição Magalu")
+    parser.add_argument("--etapas", help="executa só estas etapas (e as que elas dependem), separadas por vírgula: "
+                                         + ", ".join(etapa.nome for etapa in ETAPAS_ANALISE))
+    parser.add_argument("--resultado", action="store_true", help="apenas exibe o último resultado salvo")
+    parser.add_argument("--saida", default="resultado_analise_magalu.json")
+    parser.add_argument("--sem-cache", action="store_true", help="desativa os caches de modelos e de etapas")
+    parser.add_argument("--memoria", action="store_true", help="mede o pico de memória (tracemalloc) por etapa")
+    parser.add_argument("--cprofile", action="store_true", help=f"grava o cProfile de cada etapa em {PERFIL_DIR}/")
+    parser.add_argument("--candidatos", help=f"cidades candidatas separadas por vírgula (padrão: {', '.join(CIDADES)})")
+    args = parser.parse_args()
+    opcoes = {'cache_modelos': None, 'cache_etapas': None} if args.sem_cache else {}
+    if args.candidatos:
+        opcoes['candidatos'] = [cidade.strip() for cidade in args.candidatos.split(',') if cidade.strip()]
+    opcoes.update(medir_memoria=args.memoria, diretorio_cprofile=PERFIL_DIR if args.cprofile else None)
+    
+    if args.resultado:
+        apresentar_resultado_salvo(args.saida)
+        raise SystemExit(0)
+    
+    if args.etapas:
+        alvos = [etapa.strip() for etapa in args.etapas.split(',') if etapa.strip()]
+        analisador = AnalisadorMagalu(**opcoes)
+        saidas = analisador.executar_etapas(analisador.carregar_e_validar_datasets(), alvos=alvos)
+        for alvo in alvos:
+            print(f"\n[{alvo}]")
+            for linha in _resumo_etapa(alvo, saidas[alvo]):
+                print(f"   {linha}")
+        _apresentar_perf(analisador.perf.resumo())
+        raise SystemExit(0)
+    
     try:
         print("\nINICIANDO ANÁLISE COM IA")
         print("Caso: Centro de Distribuição Magalu - Nordeste")
-        print("Análise comparativa: Recife x Salvador")
         
         # Executar análise completa
-        analisador = AnalisadorMagalu()
+        analisador = AnalisadorMagalu(**opcoes)
+        candidatos = analisador.candidatos
+        extras = f" (+{len(candidatos) - 10} candidatos)" if len(candidatos) > 10 else ""
+        print(f"Análise comparativa: {' x '.join(candidatos[:10])}{extras}")
         resultado = analisador.executar_analise_completa()
         
         # Salvar resultados
         resultado_json = {
             'timestamp': datetime.now().isoformat(),
             'cidade_recomendada': resultado.cidade_recomendada,
-            'score_recife': float(resultado.score_recife),
-            'score_salvador': float(resultado.score_salvador),
+            'score_recife': None if resultado.score_recife is None else float(resultado.score_recife),
+            'score_salvador': None if resultado.score_salvador is None else float(resultado.score_salvador),
             'vantagem_percentual': float(resultado.vantagem_percentual),
             'confianca': float(resultado.confianca),
             'fatores_decisivos': resultado.fatores_decisivos,
             'metodologias': resultado.metodologias_utilizadas,
             'pesos_otimizados': resultado.analise_detalhada['pesos_otimizados'],
-            'validacao_dados': resultado.validacao_dados
+            'ranking': resultado.ranking,
+            'validacao_dados': resultado.validacao_dados,
+            'perf': analisador.perf.resumo()
         }
         
-        with open('resultado_analise_magalu.json', 'w', encoding='utf-8') as f:
+        with open(args.saida, 'w', encoding='utf-8') as f:
             json.dump(resultado_json, f, indent=2, ensure_ascii=False)
         
-        print(f"\nResultados salvos em 'resultado_analise_magalu.json'")
+        # Pilhas colapsadas por etapa para flame graph (flamegraph.pl, speedscope)
+        arquivo_pilhas = os.path.join(PERFIL_DIR, "etapas.collapsed")
+        analisador.perf.gravar_pilhas(arquivo_pilhas)
+        
+        print(f"\nResultados salvos em '{args.saida}'")
+        _apresentar_perf(resultado_json['perf'])
+        print(f"Flame graph: {arquivo_pilhas}")
         
         # Apresentar respostas para o case
         print("\n" + "="*70)
@@ -0,0 +1,125 @@
+"""
+MATRIZ DE DISTÂNCIAS - ESTADOS E CAPITAIS
+
+Estados analisados (código IBGE e distâncias de referência a Recife/Salvador), mapa capital -> estado e matriz
+origem-destino densa usada pela coleta demográfica e pela análise. Sem efeitos colaterais na importação
+(não cria diretórios nem carrega o cliente HTTP), para que `ia_analise.py` a importe sem a coleta.
+
+Autor: Lucas Abreu - lucasabreuzip
+GitBuh: https://github.com/lucasabreuzip
+Linkedin: https://www.linkedin.com/in/lucasabreuzip/
+Versão: 2.0
+Data: 09/2025
+"""
+
+import numpy as np
+import pandas as pd
+
+ESTADOS_VIZINHOS = {
+    "Pernambuco": {"codigo": 26, "capital": "Recife", "distancia_recife": 0, "distancia_salvador": 800},
+    "Bahia": {"codigo": 29, "capital": "Salvador", "distancia_recife": 800, "distancia_salvador": 0},
+    "Paraíba": {"codigo": 25, "capital": "João Pessoa", "distancia_recife": 120, "distancia_salvador": 920},
+    "Ceará": {"codigo": 23, "capital": "Fortaleza", "distancia_recife": 800, "distancia_salvador": 1400},
+    "Alagoas": {"codigo": 27, "capital": "Maceió", "distancia_recife": 285, "distancia_salvador": 632},
+    "Piauí": {"codigo": 22, "capital": "Teresina", "distancia_recife": 1050, "distancia_salvador": 1200},
+    "Sergipe": {"codigo": 28, "capital": "Aracaju", "distancia_recife": 632, "distancia_salvador": 356},
+    "Minas Gerais": {"codigo": 31, "capital": "Belo Horizonte", "distancia_recife": 1200, "distancia_salvador": 1372},
+    "Espírito Santo": {"codigo": 32, "capital": "Vitória", "distancia_recife": 1350, "distancia_salvador": 1200},
+    "Goiás": {"codigo": 52, "capital": "Goiânia", "distancia_recife": 1600, "distancia_salvador": 1450},
+    "Tocantins": {"codigo": 17, "capital": "Palmas", "distancia_recife": 1400, "distancia_salvador": 1100},
+    "Maranhão": {"codigo": 21, "capital": "São Luís", "distancia_recife": 1100, "distancia_salvador": 1050},
+    "Rio Grande do Norte": {"codigo": 24, "capital": "Natal", "distancia_recife": 300, "distancia_salvador": 1100},
+}
+
+#Mapeia capitais (nomes usados no dataset de rotas) para os estados
+CAPITAIS_ESTADOS = {"Salvador": "Bahia", "Recife": "Pernambuco", "Aracaju": "Sergipe",
+                    "Maceió": "Alagoas", "João Pessoa": "Paraíba", "Natal": "Rio Grande do Norte",
+                    "Fortaleza": "Ceará", "Teresina": "Piauí", "São Luís": "Maranhão",
+                    "Belo Horizonte": "Minas Gerais", "Vitória": "Espírito Santo",
+                    "Goiânia": "Goiás", "Palmas": "Tocantins"}
+
+#Matriz origem-destino densa (distância e tempo) indexada por estado e código IBGE
+class MatrizDistancias:
+
+    def __init__(self, estados, distancias, tempos):
+        self.estados = pd.Index(estados, name='estado')
+        self.codigos = pd.Index([ESTADOS_VIZINHOS.get(e, {}).get('codigo', -1) for e in self.estados], name='codigo_ibge')
+        # Busca por código só entre estados mapeados: vários -1 (estados fora de ESTADOS_VIZINHOS) tornariam o índice ambíguo
+        self._com_codigo = np.flatnonzero(np.asarray(self.codigos) >= 0)
+        self._indice_codigos = pd.Index(np.asarray(self.codigos)[self._com_codigo])
+        self.distancias = distancias  # np.ndarray (n, n) em km, NaN = sem rota
+        self.tempos = tempos          # np.ndarray (n, n) em horas, NaN = sem rota
+
+    @classmethod
+    def do_csv(cls, arquivo):
+        return cls.do_dataframe(pd.read_csv(arquivo))
+
+    #Monta a matriz a partir do dataset de rotas, simetrizando de forma vetorizada
+    @classmethod
+    def do_dataframe(cls, df):
+        origem = df['origem'].astype(object).map(CAPITAIS_ESTADOS).fillna(df['origem'].astype(object))
+        destino = df['destino'].astype(object).map(CAPITAIS_ESTADOS).fillna(df['destino'].astype(object))
+        estados = pd.Index(pd.unique(pd.concat([origem, destino], ignore_index=True)))
+        
+        i = estados.get_indexer(origem)
+        j = estados.get_indexer(destino)
+        
+        # Ida e volta intercaladas: a última rota do CSV para o par prevalece nos dois sentidos
+        pares = pd.DataFrame({
+            'i': np.column_stack([i, j]).ravel(),
+            'j': np.column_stack([j, i]).ravel(),
+            'distancia': np.repeat(df['distancia_km'].to_numpy(dtype=float), 2),
+            'tempo': np.repeat(df['tempo_horas'].to_numpy(dtype=float), 2),
+        }).drop_duplicates(subset=['i', 'j'], keep='last')
+        
+        n = len(estados)
+        distancias = np.full((n, n), np.nan)
+        tempos = np.full((n, n), np.nan)
+        distancias[pares['i'].to_numpy(), pares['j'].to_numpy()] = pares['distancia'].to_numpy()
+        tempos[pares['i'].to_numpy(), pares['j'].to_numpy()] = pares['tempo'].to_numpy()
+        return cls(estados, distancias, tempos)
+
+    @classmethod
+    def vazia(cls):
+        return cls([], np.empty((0, 0)), np.empty((0, 0)))
+
+    def __len__(self):
+        return len(self.estados)
+
+    def _posicoes(self, chaves, por_codigo=False):
+        chaves = pd.Index(np.atleast_1d(chaves))
+        if not por_codigo:
+            return self.estados.get_indexer(chaves)
+        posicoes = self._indice_codigos.get_indexer(chaves)
+        return np.where(posicoes >= 0, self._com_codigo[posicoes], -1)
+
+    #Recorte (origens x destinos) da matriz; chaves ausentes viram NaN
+    def recorte(self, origens, destinos=None, campo='distancias', por_codigo=False):
+        matriz = getattr(self, campo)
+        linhas = self._posicoes(origens, por_codigo)
+        colunas = self._posicoes(destinos, por_codigo) if destinos is not None else np.arange(len(self))
+        
+        valores = np.full((len(linhas), len(colunas)), np.nan)
+        validas_l, validas_c = linhas >= 0, colunas >= 0
+        valores[np.ix_(validas_l, validas_c)] = matriz[np.ix_(linhas[validas_l], colunas[validas_c])]
+        
+        indice = self.codigos if por_codigo else self.estados
+        rotulos_c = pd.Index(np.atleast_1d(destinos)) if destinos is not None else indice
+        return pd.DataFrame(valores, index=pd.Index(np.atleast_1d(origens)), columns=rotulos_c)
+
+    #Distâncias (ou tempos) elemento a elemento para pares origem/destino
+    def consultar(self, origens, destinos, campo='distancias', por_codigo=False):
+        matriz = getattr(self, campo)
+        i, j = np.broadcast_arrays(self._posicoes(origens, por_codigo), self._posicoes(destinos, por_codigo))
+        validos = (i >= 0) & (j >= 0)
+        valores = np.full(i.shape, np.nan)
+        valores[validos] = matriz[i[validos], j[validos]]
+        return valores
+
+    #Formato longo (origem, destino, distancia_km, tempo_horas) apenas com rotas existentes
+    def para_dataframe(self):
+        i, j = np.nonzero(~np.isnan(self.distancias))
+        return pd.DataFrame({
+            'origem': self.estados[i], 'destino': self.estados[j],
+            'distancia_km': self.distancias[i, j], 'tempo_horas': self.tempos[i, j]
+        })
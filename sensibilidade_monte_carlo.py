@@ -0,0 +1,256 @@
+"""
+SENSIBILIDADE MONTE CARLO - RECOMENDAÇÃO DO CENTRO DE DISTRIBUIÇÃO
+
+Mede a robustez da recomendação do AnalisadorMagalu perturbando custos, distâncias, números do IBGE e pesos das
+categorias em milhares de cenários. Cada lote de cenários é avaliado de forma vetorizada (custos, fuzzy logístico,
+mercado por raio e ensemble já treinado) em um pool de processos; os arrays de entrada ficam em memória
+compartilhada e os workers apenas se anexam a ela. Reporta a probabilidade de vitória e a distribuição dos scores
+de cada candidata.
+
+Autor: Lucas Abreu - lucasabreuzip
+GitBuh: https://github.com/lucasabreuzip
+Linkedin: https://www.linkedin.com/in/lucasabreuzip/
+Versão: 2.0
+Data: 09/2025
+"""
+
+import os
+import json
+import time
+import argparse
+from datetime import datetime
+from concurrent.futures import ProcessPoolExecutor
+from multiprocessing import shared_memory
+from typing import Any, Dict, Optional
+
+import numpy as np
+
+import ia_analise as ia
+
+# Desvio relativo (gaussiano multiplicativo) de cada grupo de entradas
+RUIDO_PADRAO = {'custos': 0.05, 'distancias': 0.05, 'ibge': 0.03, 'pesos': 0.10}
+CATEGORIAS = ['Custos_Economia', 'Logistica_Fuzzy', 'Mercado_Regional', 'ML_Ensemble']
+MARGEM_EMPATE = 0.03  # mesma margem de empate técnico da análise principal
+
+# Estado de cada worker: arrays anexados à memória compartilhada, modelos e motor fuzzy
+_ESTADO: Dict[str, Any] = {}
+
+#Bloco único de memória compartilhada com vários arrays (layout: nome → offset, shape, dtype)
+def _criar_bloco(arrays: Dict[str, np.ndarray]):
+    layout, offset = {}, 0
+    for nome, array in arrays.items():
+        array = np.ascontiguousarray(array)
+        layout[nome] = (offset, array.shape, array.dtype.str)
+        offset += -(-array.nbytes // 64) * 64  # alinhado em 64 bytes
+    bloco = shared_memory.SharedMemory(create=True, size=max(offset, 1))
+    for nome, array in arrays.items():
+        _visao(bloco, layout[nome])[...] = array
+    return bloco, layout
+
+def _visao(bloco, item) -> np.ndarray:
+    offset, shape, dtype = item
+    return np.ndarray(shape, dtype=np.dtype(dtype), buffer=bloco.buf, offset=offset)
+
+def _anexar_bloco(nome: str):
+    try:
+        return shared_memory.SharedMemory(name=nome, track=False)  # Python 3.13+: não registrar no resource tracker
+    except TypeError:
+        return shared_memory.SharedMemory(name=nome)
+
+#Inicializador dos workers: anexa o bloco (sem cópia) e recebe uma única vez modelos, scaler e parâmetros
+def _inicializar_worker(nome_bloco: str, layout, modelos, scaler, scores_cv, ruido, semente):
+    bloco = _anexar_bloco(nome_bloco)
+    for modelo in modelos.values():
+        if 'n_jobs' in modelo.get_params():
+            modelo.set_params(n_jobs=1)  # paralelismo fica no pool de processos
+    _ESTADO.update({
+        'bloco': bloco,
+        'arrays': {nome: _visao(bloco, item) for nome, item in layout.items()},
+        'modelos': modelos, 'scaler': scaler, 'scores_cv': scores_cv,
+        'ruido': ruido, 'semente': semente,
+        'motor': ia.MotorFuzzy(),
+    })
+
+def _ruido(rng, sigma: float, shape) -> np.ndarray:
+    if sigma <= 0:
+        return np.ones(shape)
+    return np.clip(rng.normal(1, sigma, size=shape), 0.05, None)
+
+#Avalia um lote de cenários; o gerador deriva de (semente, índice do lote), então o resultado independe dos workers
+def _avaliar_lote(indice: int, tamanho: int) -> np.ndarray:
+    a, ruido = _ESTADO['arrays'], _ESTADO['ruido']
+    rng = np.random.default_rng(np.random.SeedSequence(_ESTADO['semente'], spawn_key=(indice,)))
+    n, s = len(a['custo']), tamanho
+
+    # Perturbações multiplicativas por candidato/rota/estado e cenário
+    custo = a['custo'][:, None] * _ruido(rng, ruido['custos'], (n, s))
+    preco_venda = a['preco_venda'][:, None] * _ruido(rng, ruido['custos'], (n, s))
+    pib, mercado, densidade, populacao = (a[c][:, None] * _ruido(rng, ruido['ibge'], (n, s))
+                                          for c in ('pib', 'mercado', 'densidade', 'populacao'))
+    fator_rotas = _ruido(rng, ruido['distancias'], (len(a['rota_distancia']), s))
+    pop_estados, consumo_estados = (a[c][:, None] * _ruido(rng, ruido['ibge'], (len(a[c]), s))
+                                    for c in ('estado_populacao', 'estado_consumo'))
+    dist_estados = a['estado_distancias'][:, :, None] * _ruido(rng, ruido['distancias'], a['estado_distancias'].shape + (s,))
+    pesos = a['pesos'][:, None] * _ruido(rng, ruido['pesos'], (len(a['pesos']), s))
+    pesos /= pesos.sum(axis=0)
+
+    # Custos
+    componentes, _ = ia.componentes_custos(custo, preco_venda, pib, mercado, densidade)
+    score_custos = sum(componentes[k] * p for k, p in ia.PESOS_CUSTOS.items())
+
+    # Logística: agregados por origem como produto da matriz de pertinência (candidatos × rotas)
+    grupos, contagem = a['rota_grupos'], a['rota_grupos'].sum(axis=1)[:, None]
+    with np.errstate(invalid='ignore', divide='ignore'):
+        distancia = a['rota_distancia'][:, None] * fator_rotas
+        dist_media = grupos @ distancia / contagem
+        tempo_medio = grupos @ (a['rota_tempo'][:, None] * fator_rotas) / contagem
+        custo_medio = grupos @ (a['rota_custo'][:, None] * fator_rotas) / contagem
+        dist_std = np.sqrt(np.clip(grupos @ (distancia - grupos.T @ np.nan_to_num(dist_media)) ** 2 / (contagem - 1), 0, None))
+    proximos = grupos @ (distancia <= 500)
+    eficiencia = _ESTADO['motor'].avaliar(distancia=dist_media.ravel(), tempo=tempo_medio.ravel(),
+                                          custo=custo_medio.ravel()).reshape(n, s)
+    score_logistica = np.minimum(100, eficiencia + proximos * 2) / 100
+
+    # Mercado: estados dentro de cada raio e fora do estado sede (raios × estados × candidatos × cenários)
+    raios = np.array(list(ia.PESOS_RAIO))
+    mascara = (dist_estados[None] <= raios[:, None, None, None]) & a['estado_fora_sede'][None, :, :, None]
+    pop_raio = np.einsum('rens,es->nrs', mascara, pop_estados)
+    consumo_raio = np.einsum('rens,es->nrs', mascara, consumo_estados)
+    score_mercado = ia.score_mercado(pop_raio, consumo_raio)
+
+    # Ensemble treinado sobre as features perturbadas (lacunas → valores imputados da análise)
+    colunas = {'custo_construcao': custo, 'pib_per_capita': pib, 'populacao': populacao,
+               'mercado_potencial_anual': mercado, 'densidade_demografica': densidade,
+               'distancia_media': dist_media, 'distancia_std': dist_std, 'tempo_medio': tempo_medio,
+               'custo_logistica_medio': custo_medio, 'populacao_500km': pop_raio[:, 1], 'consumo_500km': consumo_raio[:, 1]}
+    base = np.broadcast_to(a['base_ml'][:, None, :], (n, s, len(ia.FEATURES_ML))).copy()
+    for j, coluna in enumerate(ia.FEATURES_ML):
+        if coluna in colunas:
+            base[:, :, j] = np.where(np.isnan(colunas[coluna]), base[:, :, j], colunas[coluna])
+    score_ml, _ = ia.prever_ensemble(_ESTADO['modelos'], _ESTADO['scaler'], _ESTADO['scores_cv'],
+                                     base.reshape(-1, len(ia.FEATURES_ML)))
+
+    categorias = np.stack([score_custos, score_logistica, score_mercado, score_ml.reshape(n, s)])
+    return np.einsum('kns,ks->sn', categorias, pesos)  # cenários × candidatos
+
+#Arrays de entrada do Monte Carlo a partir de uma análise já executada (features e modelos prontos)
+def preparar_entradas(analisador: ia.AnalisadorMagalu, resultado: ia.ResultadoIA) -> Dict[str, np.ndarray]:
+    datasets = analisador.datasets
+    features = analisador.construir_features(datasets).loc[analisador.candidatos]
+    rotas = analisador.indice(datasets).rotas_de(analisador.candidatos)
+    demo = datasets['demografia']
+    base = features[ia.FEATURES_ML].astype(float)
+    pesos = resultado.analise_detalhada['pesos_otimizados']
+    return {
+        'custo': features['custo_construcao'].to_numpy(dtype=float),
+        'preco_venda': features['preco_venda'].to_numpy(dtype=float),
+        'pib': features['pib_per_capita'].to_numpy(dtype=float),
+        'mercado': features['mercado_potencial_anual'].to_numpy(dtype=float),
+        'densidade': features['densidade_demografica'].to_numpy(dtype=float),
+        'populacao': features['populacao'].to_numpy(dtype=float),
+        'base_ml': base.fillna(base.median()).to_numpy(),
+        'rota_grupos': (rotas['origem'].to_numpy()[None, :] == np.array(analisador.candidatos)[:, None]).astype(float),
+        'rota_distancia': rotas['distancia_km'].to_numpy(dtype=float),
+        'rota_tempo': rotas['tempo_horas'].to_numpy(dtype=float),
+        'rota_custo': rotas['custo_total_estimado'].to_numpy(dtype=float),
+        'estado_populacao': np.nan_to_num(demo['Populacao'].to_numpy(dtype=float)),
+        'estado_consumo': np.nan_to_num(demo['Consumo_Bilhoes'].to_numpy(dtype=float)),
+        'estado_distancias': analisador._matriz_distancias(datasets),
+        'estado_fora_sede': demo['Estado'].to_numpy()[:, None] != features['estado_sede'].to_numpy()[None, :],
+        'pesos': np.array([pesos[c] for c in CATEGORIAS]),
+    }
+
+def executar_monte_carlo(analisador: ia.AnalisadorMagalu, resultado: ia.ResultadoIA, n_cenarios: int = 10000,
+                         tamanho_lote: int = 250, workers: Optional[int] = None, semente: int = 42,
+                         ruido: Optional[Dict[str, float]] = None) -> Dict[str, Any]:
+    """Probabilidade de vitória e distribuição dos scores por candidata em `n_cenarios` cenários perturbados"""
+    ruido = {**RUIDO_PADRAO, **(ruido or {})}
+    workers = workers or os.cpu_count() or 1
+    lotes = [(i, min(tamanho_lote, n_cenarios - inicio)) for i, inicio in enumerate(range(0, n_cenarios, tamanho_lote))]
+
+    inicio = time.perf_counter()
+    bloco, layout = _criar_bloco(preparar_entradas(analisador, resultado))
+    try:
+        args = (bloco.name, layout, analisador.modelos, analisador.scaler_robust,
+                resultado.analise_detalhada['ensemble_details']['cv_scores'], ruido, semente)
+        if workers == 1:
+            _inicializar_worker(*args)
+            scores = [_avaliar_lote(i, tamanho) for i, tamanho in lotes]
+            _ESTADO.clear()
+        else:
+            with ProcessPoolExecutor(max_workers=workers, initializer=_inicializar_worker, initargs=args) as pool:
+                scores = list(pool.map(_avaliar_lote, *zip(*lotes)))
+    finally:
+        bloco.close()
+        bloco.unlink()
+    scores = np.vstack(scores)
+    duracao = time.perf_counter() - inicio
+
+    # Vencedor e margem sobre o segundo colocado em cada cenário
+    ordenados = np.sort(scores, axis=1)
+    margens = ordenados[:, -1] - ordenados[:, -2]
+    vitorias = np.bincount(scores.argmax(axis=1), minlength=scores.shape[1]) / len(scores)
+    percentis = np.percentile(scores, [5, 50, 95], axis=0)
+    ordem = np.lexsort((-scores.mean(axis=0), -vitorias))  # mais vitórias primeiro, depois maior score médio
+
+    candidatas = {
+        cidade: {
+            'prob_vitoria': float(vitorias[i]),
+            'score_medio': float(scores[:, i].mean()),
+            'score_desvio': float(scores[:, i].std()),
+            'score_p5': float(percentis[0, i]),
+            'score_p50': float(percentis[1, i]),
+            'score_p95': float(percentis[2, i]),
+        }
+        for i, cidade in ((i, analisador.candidatos[i]) for i in ordem)
+    }
+    return {
+        'n_cenarios': int(len(scores)),
+        'ruido': ruido,
+        'semente': semente,
+        'workers': workers,
+        'tempo_s': round(duracao, 3),
+        'candidatas': candidatas,
+        'margem': {'media': float(margens.mean()), 'p5': float(np.percentile(margens, 5)),
+                   'p50': float(np.median(margens)), 'p95': float(np.percentile(margens, 95))},
+        'prob_empate_tecnico': float((margens < MARGEM_EMPATE).mean()),
+    }
+
+def apresentar(resumo: Dict[str, Any]) -> None:
+    print("\n" + "=" * 70)
+    print(f"SENSIBILIDADE MONTE CARLO ({resumo['n_cenarios']} cenários, {resumo['tempo_s']:.1f}s, "
+          f"{resumo['workers']} worker(s))")
+    print("=" * 70)
+    print(f"   Ruído: {', '.join(f'{k} ±{v:.0%}' for k, v in resumo['ruido'].items())}")
+    for i, (cidade, c) in enumerate(resumo['candidatas'].items()):
+        if i == 10:
+            print(f"   ... (+{len(resumo['candidatas']) - 10} candidatos)")
+            break
+        print(f"   {cidade + ':':<9} vitória {c['prob_vitoria']:6.1%} | score {c['score_medio']:.3f} "
+              f"(p5 {c['score_p5']:.3f} - p95 {c['score_p95']:.3f})")
+    m = resumo['margem']
+    print(f"   Margem do líder: mediana {m['p50']:.3f} (p5 {m['p5']:.3f} - p95 {m['p95']:.3f})")
+    print(f"   Cenários em empate técnico (< {MARGEM_EMPATE:.0%}): {resumo['prob_empate_tecnico']:.1%}")
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Sensibilidade Monte Carlo da recomendação do centro de distribuição")
+    parser.add_argument("--cenarios", type=int, default=10000)
+    parser.add_argument("--tamanho-lote", type=int, default=250)
+    parser.add_argument("--workers", type=int, default=None, help="processos (padrão: núcleos disponíveis)")
+    parser.add_argument("--semente", type=int, default=42)
+    for grupo, sigma in RUIDO_PADRAO.items():
+        parser.add_argument(f"--ruido-{grupo}", type=float, default=sigma, help=f"desvio relativo ({sigma:.0%})")
+    parser.add_argument("--saida", default="resultado_monte_carlo.json")
+    args = parser.parse_args()
+
+    analisador = ia.AnalisadorMagalu()
+    resultado = analisador.executar_analise_completa()
+    resumo = executar_monte_carlo(analisador, resultado, args.cenarios, args.tamanho_lote, args.workers, args.semente,
+                                  {grupo: getattr(args, f"ruido_{grupo}") for grupo in RUIDO_PADRAO})
+    apresentar(resumo)
+
+    with open(args.saida, 'w', encoding='utf-8') as f:
+        json.dump({'timestamp': datetime.now().isoformat(), 'cidade_recomendada': resultado.cidade_recomendada,
+                   'confianca_heuristica': float(resultado.confianca), **resumo}, f, indent=2, ensure_ascii=False)
+    print(f"\nResultados salvos em '{args.saida}'")
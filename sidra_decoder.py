@@ -0,0 +1,91 @@
+"""
+DECODIFICADOR SIDRA - RESPOSTAS IBGE EM DATAFRAME
+
+Converte respostas das APIs do IBGE em um DataFrame tipado (territorio, variavel, periodo, valor) em uma única
+passada vetorizada. Atende o formato `/values` do apisidra (com ou sem cabeçalho) e o formato de agregados v3 do
+servicodados (`resultados` → `series` → `serie`). Marcadores de ausência ('...', '..', '-', 'X') viram NaN.
+Usado pelos dois coletores e pelo histórico incremental.
+
+Autor: Lucas Abreu - lucasabreuzip
+GitBuh: https://github.com/lucasabreuzip
+Linkedin: https://www.linkedin.com/in/lucasabreuzip/
+Versão: 2.0
+Data: 09/2025
+"""
+
+from typing import Any, Optional, Tuple
+
+import pandas as pd
+
+# Esquema de saída: códigos como texto (preservam zeros e 'last 1'), valor numérico
+ESQUEMA = {'territorio': 'str', 'variavel': 'str', 'periodo': 'str', 'valor': 'float64'}
+COLUNAS = list(ESQUEMA)
+DIMENSOES_PERIODO = {'Ano', 'Mês', 'Trimestre', 'Trimestre Móvel', 'Semestre'}
+
+def vazio() -> pd.DataFrame:
+    return pd.DataFrame({coluna: pd.Series(dtype=tipo) for coluna, tipo in ESQUEMA.items()})
+
+def _tipar(territorio, variavel, periodo, valor) -> pd.DataFrame:
+    return pd.DataFrame({
+        'territorio': pd.Series(territorio).to_numpy().astype(str),
+        'variavel': pd.Series(variavel).to_numpy().astype(str),
+        'periodo': pd.Series(periodo).to_numpy().astype(str),
+        'valor': pd.to_numeric(pd.Series(valor), errors='coerce').to_numpy(dtype='float64'),  # marcadores → NaN
+    })
+
+#Formato /values: dimensões resolvidas pelo cabeçalho (território = dimensão com o nome do nível NN)
+def decodificar_values(data: list) -> pd.DataFrame:
+    cabecalho = data[0] if isinstance(data[0], dict) and data[0].get('V') == 'Valor' else None
+    linhas = data[1:] if cabecalho else data
+    if not linhas:
+        return vazio()
+
+    dims = {'territorio': 'D1C', 'variavel': 'D2C', 'periodo': 'D3C'}  # padrão do SIDRA sem cabeçalho (/h/n)
+    if cabecalho:
+        nivel = linhas[0].get('NN')
+        for chave, nome in cabecalho.items():
+            if chave.startswith('D') and chave.endswith('N'):
+                if nome == 'Variável':
+                    dims['variavel'] = chave[:-1] + 'C'
+                elif nome in DIMENSOES_PERIODO:
+                    dims['periodo'] = chave[:-1] + 'C'
+                elif nome == nivel:
+                    dims['territorio'] = chave[:-1] + 'C'
+
+    df = pd.DataFrame(linhas)
+    return _tipar(df[dims['territorio']], df[dims['variavel']], df[dims['periodo']], df['V'])
+
+#Formato agregados v3 (servicodados): variável → resultados → séries por localidade → {período: valor}
+def decodificar_agregados(data: list) -> pd.DataFrame:
+    registros = [(serie.get('localidade', {}).get('id', ''), item.get('id', ''), periodo, valor)
+                 for item in data if isinstance(item, dict)
+                 for resultado in item.get('resultados', [])
+                 for serie in resultado.get('series', [])
+                 for periodo, valor in serie.get('serie', {}).items()]
+    if not registros:
+        return vazio()
+    return _tipar(*zip(*registros))
+
+def decodificar(data: Any) -> pd.DataFrame:
+    """Qualquer resposta IBGE suportada → DataFrame (territorio, variavel, periodo, valor); vazio se irreconhecível"""
+    if not isinstance(data, list) or not data or not isinstance(data[0], dict):
+        return vazio()
+    if 'resultados' in data[0]:
+        return decodificar_agregados(data)
+    if 'V' in data[0]:
+        return decodificar_values(data)
+    return vazio()
+
+#Valor válido mais recente, opcionalmente filtrado por variável/território: (periodo, valor) ou None
+def ultimo_valido(df: pd.DataFrame, variavel: Optional[Any] = None,
+                  territorio: Optional[Any] = None) -> Optional[Tuple[str, float]]:
+    filtro = df['valor'].notna()
+    if variavel is not None:
+        filtro &= df['variavel'] == str(variavel)
+    if territorio is not None:
+        filtro &= df['territorio'] == str(territorio)
+    validos = df[filtro]
+    if validos.empty:
+        return None
+    linha = validos.loc[validos['periodo'].idxmax()]
+    return linha['periodo'], float(linha['valor'])
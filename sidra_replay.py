@@ -0,0 +1,244 @@
+"""
+SERVIDOR DE GRAVAÇÃO/REPLAY - APIs IBGE
+
+Servidor HTTP local que substitui apisidra.ibge.gov.br e servicodados.ibge.gov.br. No modo **gravar** funciona como
+proxy e salva cada resposta real em fixtures JSON; no modo **reproduzir** devolve as fixtures com latência e falhas
+injetáveis, permitindo exercitar e medir os coletores sem rede.
+
+Autor: Lucas Abreu - lucasabreuzip
+GitBuh: https://github.com/lucasabreuzip
+Linkedin: https://www.linkedin.com/in/lucasabreuzip/
+Versão: 2.0
+Data: 09/2025
+"""
+
+import os
+import re
+import json
+import time
+import random
+import hashlib
+import argparse
+import threading
+from urllib.parse import unquote
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from typing import Any, Dict, Optional
+
+import requests
+
+FIXTURES_DIR = "fixtures_sidra"
+
+# Prefixo do caminho → API IBGE de origem
+UPSTREAMS = {
+    '/values/': 'https://apisidra.ibge.gov.br',
+    '/api/': 'https://servicodados.ibge.gov.br',
+}
+
+NIVEIS_SIDRA = {'1': 'Brasil', '2': 'Grande Região', '3': 'Unidade da Federação',
+                '6': 'Município', '7': 'Região Metropolitana'}
+
+# ==============================================================
+# FIXTURES
+# ==============================================================
+
+#Nome de arquivo estável para um caminho+query (tabela no prefixo facilita inspeção)
+def nome_fixture(caminho: str) -> str:
+    tabela = re.search(r'/t/(\d+)/', caminho)
+    prefixo = f"t{tabela.group(1)}" if tabela else 'ibge'
+    return f"{prefixo}_{hashlib.sha1(caminho.encode('utf-8')).hexdigest()[:16]}.json"
+
+def carregar_fixture(diretorio: str, caminho: str) -> Optional[Dict[str, Any]]:
+    arquivo = os.path.join(diretorio, nome_fixture(caminho))
+    if not os.path.exists(arquivo):
+        return None
+    with open(arquivo, 'r', encoding='utf-8') as f:
+        return json.load(f)
+
+def salvar_fixture(diretorio: str, caminho: str, status: int, corpo: Any) -> None:
+    os.makedirs(diretorio, exist_ok=True)
+    arquivo = os.path.join(diretorio, nome_fixture(caminho))
+    with open(arquivo, 'w', encoding='utf-8') as f:
+        json.dump({'caminho': caminho, 'status': status, 'corpo': corpo}, f, ensure_ascii=False)
+
+#Resposta SIDRA sintética e determinística para caminhos sem fixture gravada
+def resposta_sintetica(caminho: str) -> Optional[Any]:
+    caminho = unquote(caminho)
+
+    municipios = re.match(r'/api/v1/localidades/estados/(\d+)/municipios', caminho)
+    if municipios:
+        uf = int(municipios.group(1))
+        return [{'id': uf * 100000 + i * 10, 'nome': f"Município {uf}-{i}"} for i in range(1, 51)]
+
+    periodos_tabela = re.match(r'/api/v3/agregados/(\d+)/periodos', caminho)
+    if periodos_tabela:
+        return [{'id': str(ano), 'literals': [str(ano)], 'modificacao': '01/01/2024'} for ano in range(2019, 2024)]
+
+    sidra = re.match(r'/values/t/(\d+)/n(\d+)/([^/]+)/v/([^/]+)/p/([^/]+)', caminho)
+    if not sidra:
+        return None
+
+    tabela, nivel, territorios, variaveis, periodos = sidra.groups()
+    territorios = territorios.split(',') if territorios != 'all' else ['1']
+    if periodos.startswith('last'):
+        n = int(periodos.split()[-1]) if ' ' in periodos else 1
+        periodos = [str(2023 - k) for k in range(n)][::-1]
+    elif periodos == 'all':
+        periodos = [str(ano) for ano in range(2019, 2024)]
+    else:
+        periodos = periodos.split(',')
+
+    nome_nivel = NIVEIS_SIDRA.get(nivel, 'Território')
+    nome_periodo = 'Mês' if len(periodos[0]) == 6 else 'Ano'
+    linhas = [{
+        'NC': 'Nível Territorial (Código)', 'NN': 'Nível Territorial', 'MC': 'Unidade de Medida (Código)',
+        'MN': 'Unidade de Medida', 'V': 'Valor',
+        'D1C': f'{nome_nivel} (Código)', 'D1N': nome_nivel,
+        'D2C': 'Variável (Código)', 'D2N': 'Variável',
+        'D3C': f'{nome_periodo} (Código)', 'D3N': nome_periodo,
+    }]
+    for territorio in territorios:
+        for variavel in variaveis.split(','):
+            for periodo in periodos:
+                semente = hashlib.sha1(f"{tabela}/{territorio}/{variavel}/{periodo}".encode()).digest()
+                valor = 1000 + int.from_bytes(semente[:4], 'big') % 9_000_000
+                linhas.append({
+                    'NC': nivel, 'NN': nome_nivel, 'MC': '0', 'MN': 'Unidade', 'V': str(valor),
+                    'D1C': territorio, 'D1N': territorio, 'D2C': variavel, 'D2N': variavel,
+                    'D3C': periodo, 'D3N': periodo,
+                })
+    return linhas
+
+# ==============================================================
+# SERVIDOR
+# ==============================================================
+
+class ServidorSidra:
+
+    def __init__(self, modo: str = 'reproduzir', diretorio: str = FIXTURES_DIR, porta: int = 0,
+                 latencia: float = 0.0, taxa_falhas: float = 0.0, sintetico: bool = False, semente: int = 42):
+        if modo not in ('gravar', 'reproduzir'):
+            raise ValueError(f"Modo inválido: {modo}")
+        self.modo = modo
+        self.diretorio = diretorio
+        self.latencia = latencia
+        self.taxa_falhas = taxa_falhas
+        self.sintetico = sintetico
+        self._rng = random.Random(semente)
+        self._lock = threading.Lock()
+        self.estatisticas = {'requisicoes': 0, 'fixtures': 0, 'sinteticas': 0, 'gravadas': 0,
+                             'falhas_injetadas': 0, 'nao_encontradas': 0, 'bytes': 0}
+        self._httpd = ThreadingHTTPServer(('127.0.0.1', porta), self._criar_handler())
+        self._httpd.daemon_threads = True
+        self._thread = None
+
+    @property
+    def url(self) -> str:
+        host, porta = self._httpd.server_address[:2]
+        return f"http://{host}:{porta}"
+
+    def _contar(self, chave: str, n: int = 1) -> None:
+        with self._lock:
+            self.estatisticas[chave] += n
+
+    def zerar_estatisticas(self) -> None:
+        with self._lock:
+            for chave in self.estatisticas:
+                self.estatisticas[chave] = 0
+
+    #Resolve (status, corpo) para um caminho conforme o modo
+    def responder(self, caminho: str):
+        self._contar('requisicoes')
+
+        if self.latencia:
+            time.sleep(self.latencia)
+
+        if self.taxa_falhas:
+            with self._lock:
+                falhar = self._rng.random() < self.taxa_falhas
+            if falhar:
+                self._contar('falhas_injetadas')
+                return 503, {'erro': 'falha injetada'}
+
+        fixture = carregar_fixture(self.diretorio, caminho)
+        if fixture is not None:
+            self._contar('fixtures')
+            return fixture['status'], fixture['corpo']
+
+        if self.modo == 'gravar':
+            upstream = next((base for prefixo, base in UPSTREAMS.items() if caminho.startswith(prefixo)), None)
+            if upstream is None:
+                return 404, {'erro': 'caminho desconhecido'}
+            resp = requests.get(upstream + caminho, timeout=30)
+            try:
+                corpo = resp.json()
+            except ValueError:
+                corpo = resp.text
+            if resp.status_code < 500:  # erros transitórios não viram fixture
+                salvar_fixture(self.diretorio, caminho, resp.status_code, corpo)
+                self._contar('gravadas')
+            return resp.status_code, corpo
+
+        if self.sintetico:
+            corpo = resposta_sintetica(caminho)
+            if corpo is not None:
+                self._contar('sinteticas')
+                return 200, corpo
+
+        self._contar('nao_encontradas')
+        return 404, {'erro': 'fixture não encontrada', 'caminho': caminho}
+
+    def _criar_handler(self):
+        servidor = self
+
+        class Handler(BaseHTTPRequestHandler):
+            def do_GET(self):
+                try:
+                    status, corpo = servidor.responder(self.path)
+                except Exception as e:
+                    status, corpo = 502, {'erro': str(e)}
+                dados = json.dumps(corpo, ensure_ascii=False).encode('utf-8')
+                servidor._contar('bytes', len(dados))
+                self.send_response(status)
+                self.send_header('Content-Type', 'application/json; charset=utf-8')
+                self.send_header('Content-Length', str(len(dados)))
+                self.end_headers()
+                self.wfile.write(dados)
+
+            def log_message(self, formato, *args):  # silencioso
+                pass
+
+        return Handler
+
+    def iniciar(self) -> 'ServidorSidra':
+        self._thread = threading.Thread(target=self._httpd.serve_forever, daemon=True)
+        self._thread.start()
+        return self
+
+    def parar(self) -> None:
+        self._httpd.shutdown()
+        self._httpd.server_close()
+
+    def __enter__(self):
+        return self.iniciar()
+
+    def __exit__(self, *exc):
+        self.parar()
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Servidor local de gravação/replay das APIs IBGE")
+    parser.add_argument("modo", choices=['gravar', 'reproduzir'])
+    parser.add_argument("--porta", type=int, default=8765)
+    parser.add_argument("--fixtures", default=FIXTURES_DIR)
+    parser.add_argument("--latencia", type=float, default=0.0, help="segundos adicionados a cada resposta")
+    parser.add_argument("--taxa-falhas", type=float, default=0.0, help="fração de respostas 503 injetadas")
+    parser.add_argument("--sintetico", action="store_true", help="gera respostas sintéticas quando faltar fixture")
+    args = parser.parse_args()
+
+    servidor = ServidorSidra(args.modo, args.fixtures, args.porta, args.latencia, args.taxa_falhas, args.sintetico)
+    print(f"🛰️ Servidor IBGE ({args.modo}) em {servidor.url} | fixtures: {args.fixtures}")
+    print(f"   Use: SIDRA_URL={servidor.url} IBGE_SERVICOS_URL={servidor.url} python <coletor>.py")
+    try:
+        servidor._httpd.serve_forever()
+    except KeyboardInterrupt:
+        print(f"\n🛑 Encerrado | {servidor.estatisticas}")
@@ -0,0 +1,39 @@
+import pandas as pd
+
+from armazenamento_datasets import carregar_dataset, gravar_dataset, localizar_dataset
+
+
+def _rotas():
+    return pd.DataFrame({
+        'origem': ['Recife', 'Salvador'], 'destino': ['Natal', 'Aracaju'], 'distancia_km': [286.5, 327.25],
+        'tempo_horas': [3.9, 4.4], 'velocidade_media_kmh': [73.46, 74.38], 'custo_combustivel': [131.3, 149.98],
+        'custo_pedagio': [42.98, 49.09], 'custo_total_estimado': [174.28, 199.07],
+    })
+
+
+def test_gravacao_padrao_localiza_parquet(tmp_path):
+    # CSV exportado depois do Parquet (mtime mais novo) não pode ganhar a leitura
+    gravar_dataset('rotas', _rotas(), str(tmp_path), exportar_csv=True)
+    assert (tmp_path / 'dataset_rotas_nordeste.csv').exists()
+    assert localizar_dataset('rotas', (str(tmp_path),)).endswith('.parquet')
+
+
+def test_csv_sem_parquet_e_fallback(tmp_path):
+    _rotas().to_csv(tmp_path / 'dataset_rotas_nordeste.csv', index=False)
+    assert localizar_dataset('rotas', (str(tmp_path),)).endswith('.csv')
+    df = carregar_dataset('rotas', (str(tmp_path),), calculo=True)
+    assert df['distancia_km'].tolist() == _rotas()['distancia_km'].tolist()
+
+
+def test_inteiros_nao_truncam(tmp_path):
+    demografia = pd.DataFrame({'Estado': ['Alagoas', 'Sergipe'], 'Codigo_IBGE': [27.0, 28.0],
+                               'Populacao': [3127683, 2210004], 'Distancia_Recife': [285.0, 300.7]})
+    gravar_dataset('demografia', demografia, str(tmp_path), exportar_csv=False)
+    df = carregar_dataset('demografia', (str(tmp_path),))
+    assert df['Codigo_IBGE'].dtype == 'int32'
+    assert df['Distancia_Recife'].tolist() == [285.0, 300.7]
+
+    # Fora do intervalo do int32: mantém float64 em vez de estourar
+    demografia['Codigo_IBGE'] = [27.0, 2.0 ** 40]
+    gravar_dataset('demografia', demografia, str(tmp_path), exportar_csv=False)
+    assert carregar_dataset('demografia', (str(tmp_path),))['Codigo_IBGE'].dtype == 'float64'
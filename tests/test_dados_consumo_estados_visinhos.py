@@ -0,0 +1,102 @@
+import contextlib
+import io
+
+import numpy as np
+import pandas as pd
+import pytest
+
+import dados_consumo_estados_visinhos as consumo
+
+# Saídas da versão escalar original (if/elif por faixa), fixadas para a versão vetorizada
+RENDAS = [((2800, 29, 'Bahia', 21000.0), 2214.7999999999997), ((2800, 26, 'Pernambuco', 65000.0), 2732.7999999999997),
+          ((2800, 35, 'São Paulo', 52000.0), 2441.5999999999995), ((2800, 22, 'Piauí', 18000.0), 1713.6)]
+CONSUMOS = [((4500, 14e6, 80000.0), 810.36648), ((3800.0, 5e6, 45000.0), 289.4166),  # perfil A
+            ((3000, 9e6, 30000.0), 411.05394), ((2000, 3e6, 15000.0), 108.48578400000001)]  # perfis B e C
+# populacao 4 mi (12,5) + renda 2480 (20) + classe (10) + proximidade; limites superiores das faixas inclusivos
+SCORES_DISTANCIA = [(0, 57.5), (300, 57.5), (300.5, 54.5), (600, 54.5), (601, 50.5), (1000, 50.5),
+                    (1000.01, 46.5), (1400, 46.5), (1401, 43.5), (np.nan, 50.5)]
+
+
+@pytest.mark.parametrize('argumentos, esperado', RENDAS)
+def test_renda_regional(argumentos, esperado):
+    with contextlib.redirect_stdout(io.StringIO()):
+        assert consumo.calcular_renda_regional(*argumentos) == esperado
+    renda_nacional, codigo, _, pib = argumentos
+    assert consumo.calcular_renda_regional_vetorizado(renda_nacional, [codigo], [pib])[0] == esperado
+
+
+@pytest.mark.parametrize('argumentos, esperado', CONSUMOS)
+def test_consumo_classes(argumentos, esperado):
+    assert consumo.calcular_consumo_classes(*argumentos) == esperado
+
+
+def test_consumo_classes_vetorizado():
+    renda, populacao, pib = zip(*(argumentos for argumentos, _ in CONSUMOS))
+    np.testing.assert_array_equal(consumo.calcular_consumo_classes_vetorizado(renda, populacao, pib),
+                                  [esperado for _, esperado in CONSUMOS])
+
+
+def test_score_atratividade_nas_bordas_das_faixas():
+    distancias = [d for d, _ in SCORES_DISTANCIA]
+    esperados = [s for _, s in SCORES_DISTANCIA]
+    obtidos = consumo.calcular_score_atratividade_vetorizado(np.full(len(distancias), 4e6),
+                                                             np.full(len(distancias), 2480), distancias)
+    np.testing.assert_array_equal(obtidos, esperados)
+    assert [consumo.calcular_score_atratividade({'populacao': 4e6, 'renda_mensal': 2480, 'distancia_recife': d})
+            for d in distancias[:-1]] == esperados[:-1]
+    assert consumo.calcular_score_atratividade({'populacao': 4e6, 'renda_mensal': 2480}) == 50.5  # sem distância
+
+
+def test_pontuar_dataframe_igual_as_funcoes_escalares():
+    df = pd.DataFrame({'codigo_ibge': [29, 26, 35, 22], 'populacao': [14e6, 9e6, 4e6, 3e6],
+                       'pib_total': [14e6 * 21000, 9e6 * 65000, 4e6 * 52000, 3e6 * 18000],
+                       'distancia_recife': [800, 0, 1400, 1000.5]})
+    pontuado = consumo.pontuar_dataframe(df, 2800)
+
+    with contextlib.redirect_stdout(io.StringIO()):
+        for linha in pontuado.itertuples():
+            renda = consumo.calcular_renda_regional(2800, linha.codigo_ibge, '', linha.pib_per_capita)
+            assert linha.renda_mensal == renda
+            assert linha.consumo_bilhoes == consumo.calcular_consumo_classes(renda, linha.populacao, linha.pib_per_capita)
+            assert linha.score_atratividade == consumo.calcular_score_atratividade(
+                {'populacao': linha.populacao, 'renda_mensal': renda, 'distancia_recife': linha.distancia_recife})
+    assert pontuado['renda_mensal'].tolist() == [esperado for _, esperado in RENDAS]
+
+
+class ApiMunicipiosFalsa:
+    """Dez municípios de Alagoas; lotes contendo algum código de `falhar` não retornam população (requisição falhou)."""
+
+    def __init__(self, falhar=()):
+        self.falhar = set(falhar)
+        self.requisitados = []
+
+    def listar_municipios(self, codigo_estado):
+        return pd.DataFrame({'codigo_municipio': np.arange(2700001, 2700011), 'municipio': [f'M{i}' for i in range(10)]})
+
+    def get_populacao_municipios(self, codigos):
+        self.requisitados.extend(codigos)
+        if self.falhar & set(codigos):
+            return None
+        return pd.Series({c: 1000.0 + c % 100 for c in codigos})
+
+    def get_pib_municipios(self, codigos):
+        return pd.Series({c: 5e6 for c in codigos})
+
+
+def test_municipios_retomam_so_os_codigos_faltantes(tmp_path, monkeypatch):
+    monkeypatch.setattr(consumo, 'MUNICIPIOS_DIR', str(tmp_path))
+    monkeypatch.setattr(consumo.time, 'sleep', lambda segundos: None)
+    config = consumo.ESTADOS_VIZINHOS['Alagoas']
+
+    with contextlib.redirect_stdout(io.StringIO()):
+        parcial = consumo.processar_municipios_estado('Alagoas', config, ApiMunicipiosFalsa(falhar={2700005}), 2000.0,
+                                                      tamanho_lote=3)
+        assert parcial == 7  # lote 2700004-2700006 falhou
+        retomada = ApiMunicipiosFalsa()
+        assert consumo.processar_municipios_estado('Alagoas', config, retomada, 2000.0, tamanho_lote=4) == 3
+
+    assert retomada.requisitados == [2700004, 2700005, 2700006]
+    municipios = consumo.carregar_municipios()
+    assert sorted(municipios['codigo_municipio']) == list(range(2700001, 2700011))
+    assert municipios['distancia_aproximada'].all()
+    assert (municipios['distancia_recife'] == config['distancia_recife']).all()
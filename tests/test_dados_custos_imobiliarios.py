@@ -0,0 +1,81 @@
+import os
+import re
+
+import pytest
+
+import dados_custos_imobiliarios as custos
+
+CANDIDATOS = {
+    f'Cidade{i}': {'municipio': 2927400 + i, 'estado': 29, 'uf': 'BA', 'rm': '2901', 'coords': (-12.9, -38.5)}
+    for i in range(4)
+}
+
+
+class SidraFalso:
+    """SIDRA em memória; com `interromper_apos` levanta erro a partir dessa requisição de dados (processo morto)."""
+
+    def __init__(self, interromper_apos=None):
+        self.interromper_apos = interromper_apos
+        self.requisicoes = []
+
+    def __call__(self, url):
+        if url.endswith('/periodos'):
+            return [{'id': '2021'}, {'id': '2022'}]
+        if self.interromper_apos is not None and len(self.requisicoes) >= self.interromper_apos:
+            raise RuntimeError("coleta interrompida")
+        self.requisicoes.append(url)
+        territorios, variaveis, periodos = re.search(r'/n\d+/([^/]+)/v/([^/]+)/p/([^/]+)$', url).groups()
+        return [{'D1C': t, 'D2C': v, 'D3C': p, 'V': '1000'}
+                for t in territorios.split(',') for v in variaveis.split(',') for p in periodos.split(',')]
+
+
+def test_lotes_retomam_sem_repetir_requisicoes(tmp_path, monkeypatch):
+    monkeypatch.setattr(custos, 'DATASETS_DIR', str(tmp_path))
+    monkeypatch.setattr(custos.time, 'sleep', lambda segundos: None)
+
+    interrompido = SidraFalso(interromper_apos=5)
+    monkeypatch.setattr(custos.ColetorUltraOtimizado, 'fetch_api', lambda coletor, url: interrompido(url))
+    with pytest.raises(RuntimeError):
+        custos.executar_coleta(candidatos=CANDIDATOS, lote=True, tamanho_lote=2)
+    assert len(interrompido.requisicoes) == 5
+    assert os.path.exists(tmp_path / 'checkpoint_custos_lotes.jsonl')
+
+    retomado = SidraFalso()
+    monkeypatch.setattr(custos.ColetorUltraOtimizado, 'fetch_api', lambda coletor, url: retomado(url))
+    arquivo = custos.executar_coleta(candidatos=CANDIDATOS, lote=True, tamanho_lote=2)
+
+    assert not set(retomado.requisicoes) & set(interrompido.requisicoes)
+    assert retomado.requisicoes
+    assert not os.path.exists(tmp_path / 'checkpoint_custos_lotes.jsonl')  # coleta completa
+    df = custos.pd.read_parquet(arquivo)
+    assert df['populacao'].notna().all() and df['custo_construcao'].notna().all()
+
+
+def test_lote_nao_altera_entrada_da_analise(tmp_path, monkeypatch):
+    from armazenamento_datasets import carregar_dataset, gravar_dataset, localizar_dataset
+
+    monkeypatch.setattr(custos, 'DATASETS_DIR', str(tmp_path))
+    monkeypatch.setattr(custos.time, 'sleep', lambda segundos: None)
+    monkeypatch.setattr(custos.ColetorUltraOtimizado, 'fetch_api', lambda coletor, url: SidraFalso()(url))
+
+    analise = custos.pd.DataFrame({'cidade': ['Salvador', 'Recife'], 'regiao_metropolitana': ['2901', '2601'],
+                                   'custo_construcao': [1700.5, 1650.25]})
+    gravar_dataset('custos', analise, str(tmp_path), exportar_csv=True)
+    entrada = localizar_dataset('custos', (str(tmp_path),))
+    with open(entrada, 'rb') as f:
+        conteudo = f.read()
+
+    arquivo = custos.executar_coleta(candidatos=CANDIDATOS, lote=True)
+
+    assert arquivo == str(tmp_path / 'dataset_custos_lotes.parquet')
+    assert localizar_dataset('custos', (str(tmp_path),)) == entrada
+    with open(entrada, 'rb') as f:
+        assert f.read() == conteudo
+    assert len(carregar_dataset('custos_lotes', (str(tmp_path),))) == len(CANDIDATOS)
+
+    # Código de região metropolitana (texto na coleta) com o mesmo tipo no Parquet e na releitura do CSV
+    parquet = custos.pd.read_parquet(entrada)['regiao_metropolitana']
+    os.remove(entrada)
+    csv = carregar_dataset('custos', (str(tmp_path),))['regiao_metropolitana']
+    assert parquet.dtype == csv.dtype == 'int32'
+    assert carregar_dataset('custos_lotes', (str(tmp_path),))['regiao_metropolitana'].dtype == 'int32'
@@ -0,0 +1,47 @@
+import re
+
+from historico_ibge import HistoricoSidra
+
+
+class SidraFalso:
+    """Responde /periodos e /values; o território '9999' nunca tem valor publicado ('...')."""
+
+    def __init__(self, periodos):
+        self.periodos = list(periodos)
+        self.requisicoes = []
+
+    def __call__(self, url):
+        if url.endswith('/periodos'):
+            return [{'id': p} for p in self.periodos]
+        self.requisicoes.append(url)
+        territorios, variaveis, periodos = re.search(r'/n\d+/([^/]+)/v/([^/]+)/p/([^/]+)$', url).groups()
+        return [{'D1C': t, 'D2C': v, 'D3C': p, 'V': '...' if t == '9999' else '10'}
+                for t in territorios.split(',') for v in variaveis.split(',') for p in periodos.split(',')]
+
+
+def test_territorio_sem_valor_nao_rebaixa_historico(tmp_path):
+    sidra = SidraFalso(['2020', '2021'])
+    historico = HistoricoSidra(str(tmp_path), buscar=sidra)
+    historico.atualizar('5938', '6', ['2927408', '9999'], ['37'])
+    assert len(sidra.requisicoes) == 1
+
+    sidra.requisicoes.clear()
+    historico = HistoricoSidra(str(tmp_path), buscar=sidra)
+    assert historico.atualizar('5938', '6', ['2927408', '9999'], ['37']) == 0
+    assert sidra.requisicoes == []
+
+    # Período novo: só ele é pedido
+    sidra.periodos.append('2022')
+    historico = HistoricoSidra(str(tmp_path), buscar=sidra)
+    historico.atualizar('5938', '6', ['2927408', '9999'], ['37'])
+    assert [url.rsplit('/p/', 1)[1] for url in sidra.requisicoes] == ['2022']
+
+
+def test_territorio_novo_pede_so_o_proprio_historico(tmp_path):
+    sidra = SidraFalso(['2020', '2021'])
+    HistoricoSidra(str(tmp_path), buscar=sidra).atualizar('5938', '6', ['2927408'], ['37'])
+
+    sidra.requisicoes.clear()
+    HistoricoSidra(str(tmp_path), buscar=sidra).atualizar('5938', '6', ['2927408', '2611606'], ['37'])
+    assert sidra.requisicoes == [sidra.requisicoes[0]]
+    assert '/n6/2611606/v/37/p/2020,2021' in sidra.requisicoes[0]
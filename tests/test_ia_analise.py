@@ -0,0 +1,129 @@
+import json
+
+import numpy as np
+import pytest
+
+import ia_analise
+from ia_analise import CurvaCaptacao
+from matriz_distancias import CAPITAIS_ESTADOS, MatrizDistancias
+
+
+def test_curva_captacao_ignora_valores_ausentes():
+    # 3 pontos x 1 candidato; o ponto mais próximo não tem população e o do meio não tem distância
+    distancias = np.array([[100.0], [np.nan], [400.0]])
+    curva = CurvaCaptacao(distancias, {'populacao': np.array([np.nan, 5e5, 2e6]),
+                                       'renda': np.array([np.nan, 1800.0, 2400.0])})
+    raios = [50, 150, 500]
+
+    np.testing.assert_array_equal(curva.contagem(raios)[:, 0], [0, 1, 2])
+    np.testing.assert_array_equal(curva.soma('populacao', raios)[:, 0], [0, 0, 2e6])
+    np.testing.assert_array_equal(curva.media('renda', raios)[:, 0], [0, 0, 2400.0])
+
+
+def _chaves_etapas(analisador):
+    chaves = {'datasets': 'datasets'}
+    for etapa in ia_analise.ordenar_etapas(ia_analise.ETAPAS_ANALISE, disponiveis={'datasets'}):
+        chaves[etapa.nome] = etapa.chave(analisador, [chaves[e] for e in etapa.entradas])
+    return chaves
+
+
+@pytest.mark.parametrize('dependencia, invalidadas', [
+    (MatrizDistancias, {'features', 'custos', 'logistica', 'mercado', 'ensemble', 'consolidacao', 'otimizacao', 'decisao'}),
+    (CAPITAIS_ESTADOS, {'features', 'custos', 'logistica', 'mercado', 'ensemble', 'consolidacao', 'otimizacao', 'decisao'}),
+    (ia_analise.CurvaCaptacao, {'mercado', 'consolidacao', 'otimizacao', 'decisao'}),
+    (ia_analise.AnalisadorMagalu._carregar_cache_modelos, {'ensemble', 'consolidacao', 'otimizacao', 'decisao'}),
+    (ia_analise.AnalisadorMagalu._chave_cache_modelos, {'ensemble', 'consolidacao', 'otimizacao', 'decisao'}),
+])
+def test_dependencia_alterada_invalida_so_a_etapa_e_as_seguintes(monkeypatch, dependencia, invalidadas):
+    analisador = ia_analise.AnalisadorMagalu(cache_modelos=None, cache_etapas=None)
+    antes = _chaves_etapas(analisador)
+
+    versao = ia_analise._versao_codigo
+    monkeypatch.setattr(ia_analise, '_versao_codigo',
+                        lambda objeto: versao(objeto) + ('# alterado' if objeto is dependencia else ''))
+    depois = _chaves_etapas(analisador)
+
+    assert {nome for nome in antes if antes[nome] != depois[nome]} == invalidadas
+
+
+def _simulacao_skfuzzy():
+    import skfuzzy as fuzz
+    from skfuzzy import control as ctrl
+
+    variaveis = {}
+    for var, termos in ia_analise.FUZZY_TERMOS.items():
+        tipo = ctrl.Consequent if var == 'eficiencia' else ctrl.Antecedent
+        variaveis[var] = tipo(ia_analise.FUZZY_UNIVERSOS[var], var)
+        for termo, abc in termos.items():
+            variaveis[var][termo] = fuzz.trimf(variaveis[var].universe, abc)
+    regras = []
+    for operador, antecedentes, consequente in ia_analise.FUZZY_REGRAS:
+        expressao = variaveis[antecedentes[0][0]][antecedentes[0][1]]
+        for var, termo in antecedentes[1:]:
+            expressao = expressao & variaveis[var][termo] if operador == 'e' else expressao | variaveis[var][termo]
+        regras.append(ctrl.Rule(expressao, variaveis['eficiencia'][consequente]))
+    return ctrl.ControlSystemSimulation(ctrl.ControlSystem(regras))
+
+
+#Saída do skfuzzy, ou None quando nenhuma regra dispara (erro ou saída ausente, conforme a versão)
+def _saida_skfuzzy(simulacao, distancia, tempo, custo):
+    simulacao.input['distancia'], simulacao.input['tempo'], simulacao.input['custo'] = distancia, tempo, custo
+    try:
+        simulacao.compute()
+        return simulacao.output['eficiencia']
+    except (KeyError, ValueError, AssertionError):
+        return None
+
+
+@pytest.mark.filterwarnings('ignore::DeprecationWarning')  # interno do skfuzzy (np.maximum com 3 args)
+def test_motor_fuzzy_reproduz_skfuzzy():
+    simulacao = _simulacao_skfuzzy()
+    rng = np.random.default_rng(7)
+    # Inclui valores fora dos universos (limitados às bordas nos dois sistemas)
+    distancia, tempo, custo = rng.uniform(-50, 1600, 300), rng.uniform(0, 27, 300), rng.uniform(0, 1600, 300)
+
+    esperado = np.array([_saida_skfuzzy(simulacao, d, t, c) for d, t, c in zip(distancia, tempo, custo)], dtype=float)
+    obtido = ia_analise.MotorFuzzy().avaliar(distancia=distancia, tempo=tempo, custo=custo)
+
+    disparou = ~np.isnan(esperado)
+    assert disparou.sum() > 250
+    np.testing.assert_allclose(obtido[disparou], esperado[disparou], atol=1e-9)
+    np.testing.assert_array_equal(obtido[~disparou], 0)
+
+
+@pytest.mark.filterwarnings('ignore::DeprecationWarning')  # interno do skfuzzy (np.maximum com 3 args)
+def test_motor_fuzzy_sem_regra_ativa_retorna_zero():
+    assert _saida_skfuzzy(_simulacao_skfuzzy(), 0, 4, 0) is None
+    assert ia_analise.MotorFuzzy().avaliar(distancia=[0], tempo=[4], custo=[0])[0] == 0
+
+
+def _pesos_otimizados(otimizador, matriz):
+    analisador = ia_analise.AnalisadorMagalu(otimizador=otimizador, cache_modelos=None, cache_etapas=None)
+    analisador.candidatos = [f'C{i}' for i in range(len(matriz))]
+    categorias = ['Custos_Economia', 'Logistica_Fuzzy', 'Mercado_Regional', 'ML_Ensemble']
+    scores = {cat: {analisador._chave(c): matriz[i, j] for i, c in enumerate(analisador.candidatos)}
+              for j, cat in enumerate(categorias)}
+    return np.array(list(analisador.otimizar_pesos_balanceado(scores)['pesos_otimos'].values()))
+
+
+@pytest.mark.parametrize('semente', range(5))
+def test_otimizador_exato_nao_perde_para_evolucao_diferencial(semente):
+    matriz = np.random.default_rng(semente).uniform(0.2, 1.0, (3, 4))
+    objetivo = ia_analise.ObjetivoPesos(matriz)
+
+    exato = _pesos_otimizados('exato', matriz)
+    evolucao = _pesos_otimizados('evolucao', matriz)
+
+    assert objetivo(exato) <= objetivo(evolucao) + 1e-9  # minimização: vantagem exata ≥ a da evolução diferencial
+    assert exato.sum() == pytest.approx(1)
+    minimo, maximo = ia_analise.LIMITES_PESOS
+    assert exato.max() / exato.min() <= maximo / minimo + 1e-9  # reescalável para dentro de [15%, 40%]
+
+
+def test_otimizadores_mantem_a_decisao_entre_as_duas_cidades(tmp_path):
+    decisoes = set()
+    for otimizador in ('exato', 'evolucao'):
+        analisador = ia_analise.AnalisadorMagalu(otimizador=otimizador, cache_modelos=str(tmp_path), cache_etapas=None)
+        decisoes.add(analisador.executar_analise_completa().cidade_recomendada)
+    with open('resultado_analise_magalu.json', encoding='utf-8') as f:
+        assert decisoes == {json.load(f)['cidade_recomendada']}  # resultado versionado no repositório
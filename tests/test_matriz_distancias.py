@@ -0,0 +1,20 @@
+import numpy as np
+import pandas as pd
+
+from matriz_distancias import MatrizDistancias
+
+
+def test_matriz_com_origens_fora_do_mapa_consulta_por_codigo():
+    # Rio de Janeiro e São Paulo não estão em ESTADOS_VIZINHOS (código -1)
+    rotas = pd.DataFrame({
+        'origem': ['Recife', 'Rio de Janeiro', 'São Paulo', 'Salvador'],
+        'destino': ['Salvador', 'Salvador', 'Recife', 'Aracaju'],
+        'distancia_km': [800.0, 1650.0, 2660.0, 356.0],
+        'tempo_horas': [11.0, 22.0, 35.0, 5.0],
+    })
+    matriz = MatrizDistancias.do_dataframe(rotas)
+
+    recorte = matriz.recorte([26, 29], [29, 28, 33], por_codigo=True)
+    np.testing.assert_array_equal(recorte.to_numpy(), [[800.0, np.nan, np.nan], [np.nan, 356.0, np.nan]])
+    np.testing.assert_array_equal(matriz.consultar([26, 28, -1], [29, 29, 29], por_codigo=True), [800.0, 356.0, np.nan])
+    assert matriz.consultar(['Rio de Janeiro'], ['Bahia'])[0] == 1650.0
@@ -0,0 +1,32 @@
+import numpy as np
+import pytest
+
+import ia_analise as ia
+import sensibilidade_monte_carlo as mc
+
+
+@pytest.fixture(scope='module')
+def analise():
+    analisador = ia.AnalisadorMagalu(cache_modelos=None, cache_etapas=None)
+    return analisador, analisador.executar_analise_completa()
+
+
+def test_sem_ruido_reproduz_scores_da_analise(analise):
+    analisador, resultado = analise
+    resumo = mc.executar_monte_carlo(analisador, resultado, 40, tamanho_lote=16, workers=1,
+                                     ruido={grupo: 0 for grupo in mc.RUIDO_PADRAO})
+
+    for cidade, score in resultado.ranking.items():
+        candidata = resumo['candidatas'][cidade]
+        np.testing.assert_allclose([candidata['score_medio'], candidata['score_p5'], candidata['score_p95']],
+                                   score, rtol=1e-12)
+    assert resumo['candidatas'][max(resultado.ranking, key=resultado.ranking.get)]['prob_vitoria'] == 1.0
+
+
+def test_resultado_independe_dos_workers(analise):
+    analisador, resultado = analise
+    um, dois = (mc.executar_monte_carlo(analisador, resultado, 60, tamanho_lote=16, workers=workers)
+                for workers in (1, 2))
+
+    assert um['candidatas'] == dois['candidatas']
+    assert um['margem'] == dois['margem']